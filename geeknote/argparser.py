@@ -28,6 +28,22 @@ COMMANDS_DICT = {
             "--editor": {"help": "Set the editor, which use to edit and create notes.", "emptyValue": '#GET#'},
         }
     },
+    "diagnostics": {
+        "help": "Show whether the C accelerated Thrift protocol is active and how fast it is.",
+    },
+    "stats": {
+        "help": "Show calls, time, traffic and errors per Evernote API method.",
+        "flags": {
+            "--reset": {"help": "Forget the collected statistics.", "value": True, "default": False},
+        }
+    },
+    "mirror": {
+        "help": "Create or update a local copy of notebooks, tags and notes that other commands read from.",
+        "flags": {
+            "--content": {"help": "Also keep the content of the notes.", "value": True, "default": False},
+            "--remove": {"help": "Delete the local copy.", "value": True, "default": False},
+        }
+    },
 
     # Notes
     "create": {
@@ -81,6 +97,7 @@ COMMANDS_DICT = {
             "--with-url":       {"altName": "-wu", "help": "Add direct url of each note in results to Evernote web-version.", "value": True, "default": False},
             "--exact-entry":    {"altName": "-ee", "help": "Search for exact entry of the request.", "value": True, "default": False},
             "--content-search": {"altName": "-cs", "help": "Search by content, not by title.", "value": True, "default": False},
+            "--local":          {"altName": "-l",  "help": "Search the local mirror, without connecting to Evernote.", "value": True, "default": False},
         }
     },
 
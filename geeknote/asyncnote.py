@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import Queue
+
+from geeknote import GeekNote
+from background import Future
+import rpcstats
+import ratelimit
+import evernote.edam.notestore.NoteStore as NoteStore
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+
+
+class NoteStorePool(object):
+    """
+    Keeps several NoteStore requests in flight at once.
+
+    Every worker thread owns a NoteStore.Client on its own THttpClient, the
+    clients share one keep-alive pool sized to the number of workers.
+    submit() queues a call and returns a Future, map() runs one call per
+    argument tuple and returns the results in input order. With a
+    ratelimit.RateLimiter the workers pace their calls through it.
+    """
+
+    def __init__(self, noteStoreUrl, workers=4, protocolFactory=None, rateLimiter=None):
+        self.noteStoreUrl = noteStoreUrl
+        self.workers = workers
+        self.httpPool = THttpClient.THttpConnectionPool(maxsize=workers)
+        self.protocolFactory = protocolFactory
+        self.rateLimiter = rateLimiter
+
+        self.queue = Queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def getClient(self):
+        if self.protocolFactory:
+            protocol = self.protocolFactory(self.noteStoreUrl, self.httpPool)
+        else:
+            transport = THttpClient.THttpClient(self.noteStoreUrl, pool=self.httpPool)
+            protocol = TBinaryProtocol.TBinaryProtocol(transport)
+        client = rpcstats.instrument(NoteStore.Client(protocol))
+        if self.rateLimiter:
+            client = ratelimit.schedule(client, self.rateLimiter)
+        return client
+
+    def submit(self, method, *args):
+        """ queue NoteStore.Client.<method>(*args), return a Future """
+        self._start()
+        future = Future()
+        self.queue.put((future, method, args))
+        return future
+
+    def map(self, method, argsList):
+        futures = [self.submit(method, *args) for args in argsList]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self.lock:
+            threads, self.threads = self.threads, []
+        for thread in threads:
+            self.queue.put(None)
+        for thread in threads:
+            thread.join()
+        self.httpPool.clear()
+
+    def _start(self):
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def _work(self):
+        client = None
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            future, method, args = item
+            try:
+                # made with the first call, which fails if it can't be
+                client = client or self.getClient()
+            except Exception:
+                future.setException(sys.exc_info())
+                continue
+            future.call(getattr(client, method), *args)
+
+
+class AsyncGeekNote(object):
+    """
+    Concurrent facade over GeekNote for bulk operations.
+    Calls return Futures instead of blocking, errors are raised from
+    future.result() instead of being reported and swallowed.
+    """
+
+    def __init__(self, geeknote=None, workers=4):
+        self.geeknote = geeknote or GeekNote()
+        self.pool = NoteStorePool(self.geeknote.getNoteStoreUrl(), workers,
+                                  self.geeknote.getProtocol, self.geeknote.getRateLimiter())
+
+    @property
+    def authToken(self):
+        return self.geeknote.authToken
+
+    def getNote(self, guid, with_content=False):
+        return self.pool.submit('getNote', self.authToken, guid, with_content, False, False, False)
+
+    def getNoteContent(self, guid):
+        return self.pool.submit('getNoteContent', self.authToken, guid)
+
+    def createNote(self, note):
+        return self.pool.submit('createNote', self.authToken, note)
+
+    def updateNote(self, note):
+        return self.pool.submit('updateNote', self.authToken, note)
+
+    def getNotes(self, guids, with_content=False):
+        """ fetch many notes concurrently, in the order of guids """
+        return self.pool.map('getNote', [(self.authToken, guid, with_content, False, False, False)
+                                         for guid in guids])
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+
+
+class Future(object):
+    """ Result of a call running on another thread """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._excInfo = None
+
+    def setResult(self, result):
+        self._result = result
+        self._done.set()
+
+    def setException(self, excInfo):
+        self._excInfo = excInfo
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def exception(self, timeout=None):
+        self.wait(timeout)
+        return self._excInfo[1] if self._excInfo else None
+
+    def result(self, timeout=None):
+        """ wait for the call, re-raise its exception if it failed """
+        self.wait(timeout)
+        if self._excInfo:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]
+        return self._result
+
+    def wait(self, timeout=None):
+        # Event.wait() without a timeout blocks KeyboardInterrupt on Python 2
+        while not self._done.wait(timeout if timeout is not None else 1):
+            if timeout is not None:
+                raise RuntimeError("call did not finish in %s seconds" % timeout)
+
+    def call(self, func, *args):
+        """ set the result or the exception of func(*args) """
+        try:
+            self.setResult(func(*args))
+        except Exception:
+            self.setException(sys.exc_info())
+
+
+def run(func, *args):
+    """ func(*args) on a daemon thread, return its Future """
+    future = Future()
+    thread = threading.Thread(target=future.call, args=(func,) + args)
+    # an abandoned call must not keep geeknote from exiting
+    thread.daemon = True
+    thread.start()
+    return future
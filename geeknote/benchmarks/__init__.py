@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+import os, sys
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append( os.path.join(PROJECT_ROOT, 'lib') )
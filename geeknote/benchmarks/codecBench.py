@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled codec benchmark: the generated read/write code against the
+codecs compiled by thrift.protocol.TCodec, both on the pure Python
+TBinaryProtocol, with fastbinary as a reference when it is built.
+Then eager against lazy decoding of Note content, resources and attributes.
+
+    python -m geeknote.benchmarks.codecBench --notes 10000
+"""
+
+import argparse
+
+import edamData
+from serializationBench import measure, timeit, PROTOCOLS
+
+import thrift.protocol
+from thrift.protocol import TCodec
+from thrift import TSerialization
+import evernote.edam.type.ttypes as Types
+import evernote.edam.notestore.NoteStore as NoteStore
+
+LAZY_FIELDS = ('content', 'resources', 'attributes')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=10000, help='Notes in the NoteList')
+    parser.add_argument('--content-kb', type=int, default=8, help='Note content size for the lazy decoding run')
+    parser.add_argument('--min-time', type=float, default=1.0, help='Seconds to spend on each measurement')
+    args = parser.parse_args()
+
+    factories = dict(PROTOCOLS)
+    noteList = edamData.noteList(args.notes)
+
+    rows = []
+    TCodec.enabled = False
+    rows.append(('generated',) + measure(noteList, factories['binary'], args.min_time))
+    TCodec.enabled = True
+    rows.append(('compiled',) + measure(noteList, factories['binary'], args.min_time))
+    if thrift.protocol.fastbinary is not None:
+        rows.append(('fastbinary',) + measure(noteList, factories['accelerated'], args.min_time))
+
+    print "NoteList of %d notes" % args.notes
+    print "%-12s %10s %12s %12s" % ('codec', 'bytes', 'encode ms', 'decode ms')
+    for name, size, encode, decode in rows:
+        print "%-12s %10d %12.1f %12.1f" % (name, size, encode * 1000, decode * 1000)
+    print "compiled speedup: encode %.1fx, decode %.1fx" % (rows[0][2] / rows[1][2], rows[0][3] / rows[1][3])
+
+    factory = factories['binary']
+    notes = [edamData.note(i, contentSize=args.content_kb * 1024, resources=1)
+             for i in range(args.notes // 10)]
+    data = TSerialization.serialize(NoteStore.NoteList(notes=notes), factory)
+
+    def listing():
+        result = TSerialization.deserialize(NoteStore.NoteList(), data, factory)
+        return [(note.guid, note.title, note.created) for note in result.notes]
+
+    print
+    print "NoteList of %d notes with %d KB content and a resource, %d bytes" % (
+        len(notes), args.content_kb, len(data))
+    print "%-12s %12s" % ('decode', 'listing ms')
+    timings = []
+    for name, fields in (('eager', ()), ('lazy', LAZY_FIELDS)):
+        TCodec.lazy(Types.Note, fields)
+        timings.append(timeit(listing, args.min_time))
+        print "%-12s %12.1f" % (name, timings[-1] * 1000)
+    print "lazy speedup: %.1fx" % (timings[0] / timings[1])
+
+if __name__ == "__main__":
+    main()
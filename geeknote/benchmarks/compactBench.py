@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Binary against compact protocol on the structs geeknote keeps in local
+caches: notes with content, notebooks and tags. Each struct is serialized
+on its own, the way NoteCache stores them. Rows with the generated
+read/write code show what the compiled codecs of thrift.protocol.TCodec add.
+
+    python -m geeknote.benchmarks.compactBench --count 1000
+"""
+
+import argparse
+
+import edamData
+from serializationBench import timeit
+
+import thrift.protocol
+from thrift.protocol import TCodec
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift import TSerialization
+
+ROWS = (
+    ('binary', TBinaryProtocol.TBinaryProtocolFactory(), False),
+    ('binary/codec', TBinaryProtocol.TBinaryProtocolFactory(), True),
+    ('accelerated', TBinaryProtocol.TBinaryProtocolAcceleratedFactory(), True),
+    ('compact', TCompactProtocol.TCompactProtocolFactory(), False),
+    ('compact/codec', TCompactProtocol.TCompactProtocolFactory(), True),
+)
+
+
+def corpora(count, contentSize):
+    return (
+        ('Note', [edamData.note(i, contentSize=contentSize, resources=i % 3)
+                  for i in range(count)]),
+        ('Notebook', [edamData.notebook(i) for i in range(count)]),
+        ('Tag', [edamData.tag(i) for i in range(count)]),
+    )
+
+
+def measureCorpus(objs, factory, minTime):
+    """ return (total encoded size, encode seconds, decode seconds) for all objs """
+    data = [TSerialization.serialize(obj, factory) for obj in objs]
+    encode = timeit(lambda: [TSerialization.serialize(obj, factory) for obj in objs], minTime)
+    decode = timeit(lambda: [TSerialization.deserialize(obj.__class__(), chunk, factory)
+                             for obj, chunk in zip(objs, data)], minTime)
+    return sum(len(chunk) for chunk in data), encode, decode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000, help='Structs in each corpus')
+    parser.add_argument('--content-kb', type=int, default=2, help='Note content size')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to spend on each measurement')
+    args = parser.parse_args()
+
+    if thrift.protocol.fastbinary is None:
+        print "fastbinary is not available (%s), accelerated uses pure Python" % thrift.protocol.fastbinary_error
+
+    print "%-10s %-14s %10s %8s %12s %12s" % ('corpus', 'protocol', 'bytes', 'size', 'encode ms', 'decode ms')
+    for name, objs in corpora(args.count, args.content_kb * 1024):
+        results = {}
+        for protocol, factory, compiled in ROWS:
+            TCodec.enabled = compiled
+            results[protocol] = measureCorpus(objs, factory, args.min_time)
+        TCodec.enabled = True
+
+        binarySize = results['binary'][0]
+        for protocol, factory, compiled in ROWS:
+            size, encode, decode = results[protocol]
+            print "%-10s %-14s %10d %7.0f%% %12.2f %12.2f" % (
+                name, protocol, size, 100.0 * size / binarySize, encode * 1000, decode * 1000)
+        print "%-10s %-14s %10s %8s %11.1fx %11.1fx" % (
+            name, 'codec speedup', '', '',
+            results['compact'][1] / results['compact/codec'][1],
+            results['compact'][2] / results['compact/codec'][2])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic EDAM objects shaped like real account data, for benchmarks.
+"""
+
+import hashlib
+
+import evernote.edam.type.ttypes as Types
+import evernote.edam.notestore.NoteStore as NoteStore
+
+PARAGRAPH = ("<div>Lorem ipsum dolor sit amet, consectetur adipiscing elit, "
+             "sed do eiusmod tempor incididunt ut labore et dolore magna aliqua.</div>")
+
+
+def guid(kind, i):
+    return "%08x-0000-4000-8000-%012x" % (hash(kind) & 0xffffffff, i)
+
+
+def enml(size):
+    body = PARAGRAPH * (size // len(PARAGRAPH) + 1)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">\n'
+            '<en-note>%s</en-note>' % body[:size])
+
+
+def resource(i, size=1024):
+    body = ("%08d" % i) * (size // 8)
+    return Types.Resource(
+        guid=guid('resource', i),
+        noteGuid=guid('note', i),
+        data=Types.Data(bodyHash=hashlib.md5(body).digest(), size=len(body), body=body),
+        mime="image/png",
+        width=640,
+        height=480,
+        active=True,
+        updateSequenceNum=i,
+        attributes=Types.ResourceAttributes(fileName="image-%d.png" % i, attachment=False))
+
+
+def note(i, contentSize=2048, resources=0, resourceSize=1024):
+    content = enml(contentSize) if contentSize else None
+    return Types.Note(
+        guid=guid('note', i),
+        title="Synthetic note number %d" % i,
+        content=content,
+        contentHash=hashlib.md5(content).digest() if content else None,
+        contentLength=len(content) if content else None,
+        created=1300000000000 + i * 1000,
+        updated=1300000000000 + i * 2000,
+        active=True,
+        updateSequenceNum=1000 + i,
+        notebookGuid=guid('notebook', i % 10),
+        tagGuids=[guid('tag', i % 25), guid('tag', i % 7)],
+        resources=[resource(i * 10 + r, resourceSize) for r in range(resources)] or None,
+        attributes=Types.NoteAttributes(
+            subjectDate=1300000000000 + i,
+            latitude=55.75, longitude=37.62, altitude=150.0,
+            author="geeknote", source="benchmark",
+            sourceApplication="geeknote"))
+
+
+def notebook(i):
+    return Types.Notebook(guid=guid('notebook', i), name="Notebook %d" % i,
+                          updateSequenceNum=i, defaultNotebook=(i == 0),
+                          serviceCreated=1300000000000 + i, serviceUpdated=1300000000000 + i)
+
+
+def tag(i):
+    return Types.Tag(guid=guid('tag', i), name="tag-%d" % i, updateSequenceNum=i)
+
+
+def noteList(count, contentSize=0):
+    """ findNotes() style reply: notes without content """
+    return NoteStore.NoteList(startIndex=0, totalNotes=count,
+                              notes=[note(i, contentSize) for i in range(count)],
+                              updateCount=count)
+
+
+def notesMetadataList(count):
+    """ findNotesMetadata() style reply with title, created and tags """
+    notes = [NoteStore.NoteMetadata(guid=guid('note', i),
+                                    title="Synthetic note number %d" % i,
+                                    created=1300000000000 + i * 1000,
+                                    tagGuids=[guid('tag', i % 25)])
+             for i in range(count)]
+    return NoteStore.NotesMetadataList(startIndex=0, totalNotes=count,
+                                       notes=notes, updateCount=count)
+
+
+def syncChunk(count, contentSize=0):
+    """ getSyncChunk() style reply with notes, notebooks and tags """
+    return NoteStore.SyncChunk(currentTime=1300000000000,
+                               chunkHighUSN=count, updateCount=count,
+                               notes=[note(i, contentSize) for i in range(count)],
+                               notebooks=[notebook(i) for i in range(10)],
+                               tags=[tag(i) for i in range(25)])
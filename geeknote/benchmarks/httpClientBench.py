@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Keep-alive benchmark for THttpClient.
+
+Issues the same UserStore call many times against a local stand-in server,
+once with a new connection per call (the old behaviour) and once through
+a keep-alive connection pool. The stand-in sleeps --handshake-ms on every
+new connection to emulate TCP + TLS setup against the real service.
+
+    python -m geeknote.benchmarks.httpClientBench --calls 200 --handshake-ms 30
+"""
+
+import argparse
+import time
+
+from geeknote.standin import Standin
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+import evernote.edam.userstore.UserStore as UserStore
+
+
+class UserStoreHandler(UserStore.Iface):
+
+    def checkVersion(self, clientName, edamVersionMajor, edamVersionMinor):
+        return True
+
+
+def run(calls, handshakeDelay, poolSize):
+    standin = Standin(UserStore.Processor(UserStoreHandler()), '/edam/user',
+                      handshakeDelay=handshakeDelay).start()
+    try:
+        pool = THttpClient.THttpConnectionPool(maxsize=poolSize)
+        transport = THttpClient.THttpClient(standin.url, pool=pool)
+        client = UserStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+
+        start = time.time()
+        for i in xrange(calls):
+            client.checkVersion("benchmark", 1, 25)
+        elapsed = time.time() - start
+
+        pool.clear()
+        return elapsed, standin.connections
+    finally:
+        standin.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200, help='RPCs per run')
+    parser.add_argument('--handshake-ms', type=float, default=20, help='Emulated connection setup cost')
+    args = parser.parse_args()
+
+    handshakeDelay = args.handshake_ms / 1000.0
+
+    print "calls: %d, emulated handshake: %.1f ms" % (args.calls, args.handshake_ms)
+    results = []
+    for name, poolSize in (('new connection per call', 0), ('keep-alive pool', THttpClient.THttpConnectionPool.DEFAULT_MAXSIZE)):
+        elapsed, connections = run(args.calls, handshakeDelay, poolSize)
+        results.append(elapsed)
+        print "%-24s %8.3f s %8.2f ms/call %6d connections" % (
+            name, elapsed, elapsed * 1000 / args.calls, connections)
+
+    print "speedup: %.1fx" % (results[0] / results[1])
+
+if __name__ == "__main__":
+    main()
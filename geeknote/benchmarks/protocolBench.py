@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Protocol benchmark suite: encode and decode throughput and peak memory of
+Note, Resource, NoteList, NotesMetadataList and SyncChunk at several
+scales, through TBinaryProtocol, TBinaryProtocolAccelerated and
+TCompactProtocol. The scale is the number of notes in the lists, and the
+KB of content or attachment in Note and Resource.
+
+    python -m geeknote.benchmarks.protocolBench --scales 10,100,1000 --json results.json
+
+Give the file of an earlier run as --baseline to fail on regressions:
+
+    python -m geeknote.benchmarks.protocolBench --baseline results.json --tolerance 0.25
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+
+import edamData
+from serializationBench import timeit
+
+import thrift.protocol
+from thrift.protocol import TCodec
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift import TSerialization
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import ctypes
+    # give the memory freed by earlier runs back before forking, or the
+    # child reuses it without its peak growing
+    mallocTrim = ctypes.CDLL(None).malloc_trim
+except (ImportError, OSError, AttributeError):
+    mallocTrim = None
+
+PROTOCOLS = (
+    ('binary', TBinaryProtocol.TBinaryProtocolFactory()),
+    ('accelerated', TBinaryProtocol.TBinaryProtocolAcceleratedFactory()),
+    ('compact', TCompactProtocol.TCompactProtocolFactory()),
+)
+
+PAYLOADS = (
+    ('Note', lambda scale: edamData.note(0, contentSize=scale * 1024, resources=1, resourceSize=1024)),
+    ('Resource', lambda scale: edamData.resource(0, size=scale * 1024)),
+    ('NoteList', lambda scale: edamData.noteList(scale)),
+    ('NotesMetadataList', lambda scale: edamData.notesMetadataList(scale)),
+    ('SyncChunk', lambda scale: edamData.syncChunk(scale)),
+)
+
+# compared against a baseline
+TIMINGS = ('encodeMs', 'decodeMs')
+
+
+def maxRss():
+    """ peak resident memory of this process in KB """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on OS X, KB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def peakMemory(func):
+    """
+    KB of memory func() takes on top of what is resident now, or None
+    where it can't be told. func runs once in a forked child, which starts
+    with a peak equal to the memory it shares with this process. The pages
+    the child copies just by running are not counted.
+    """
+    if resource is None or not hasattr(os, 'fork'):
+        return None
+    return max(_childPeak(func) - _childPeak(lambda: None), 0)
+
+
+def _childPeak(func):
+    gc.collect()
+    if mallocTrim:
+        mallocTrim(0)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read)
+            before = maxRss()
+            func()
+            os.write(write, str(maxRss() - before))
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    reply = os.read(read, 64)
+    os.close(read)
+    os.waitpid(pid, 0)
+    if not reply:
+        raise RuntimeError("benchmark child process failed")
+    return int(reply)
+
+
+def measure(payload, scale, protocol, obj, factory, minTime):
+    data = TSerialization.serialize(obj, factory)
+    encode = timeit(lambda: TSerialization.serialize(obj, factory), minTime)
+    decode = timeit(lambda: TSerialization.deserialize(obj.__class__(), data, factory), minTime)
+    megabytes = len(data) / 1024.0 / 1024.0
+    return {
+        'payload': payload,
+        'scale': scale,
+        'protocol': protocol,
+        'bytes': len(data),
+        'encodeMs': encode * 1000,
+        'decodeMs': decode * 1000,
+        'encodeMBps': megabytes / encode,
+        'decodeMBps': megabytes / decode,
+        'encodePeakKB': peakMemory(lambda: TSerialization.serialize(obj, factory)),
+        'decodePeakKB': peakMemory(lambda: TSerialization.deserialize(obj.__class__(), data, factory)),
+    }
+
+
+def run(scales, minTime, payloads=None):
+    """ measure every payload at every scale with every protocol, return the result rows """
+    results = []
+    for payload, build in PAYLOADS:
+        if payloads and payload not in payloads:
+            continue
+        for scale in scales:
+            obj = build(scale)
+            for protocol, factory in PROTOCOLS:
+                results.append(measure(payload, scale, protocol, obj, factory, minTime))
+            del obj
+    return results
+
+
+def environment():
+    return {
+        'time': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fastbinary': thrift.protocol.fastbinary is not None,
+        'codecs': TCodec.enabled,
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """ messages for the timings more than tolerance slower than in baseline """
+    before = dict(((row['payload'], row['scale'], row['protocol']), row) for row in baseline['results'])
+    messages = []
+    for row in results:
+        old = before.get((row['payload'], row['scale'], row['protocol']))
+        if old is None:
+            continue
+        for timing in TIMINGS:
+            if row[timing] > old[timing] * (1 + tolerance):
+                messages.append("%s/%d %s %s: %.3f ms, was %.3f ms" % (
+                    row['payload'], row['scale'], row['protocol'], timing, row[timing], old[timing]))
+    return messages
+
+
+def printTable(results):
+    print "%-18s %6s %-12s %10s %10s %10s %9s %9s %9s %9s" % (
+        'payload', 'scale', 'protocol', 'bytes', 'encode ms', 'decode ms',
+        'enc MB/s', 'dec MB/s', 'enc KB', 'dec KB')
+    for row in results:
+        print "%-18s %6d %-12s %10d %10.3f %10.3f %9.1f %9.1f %9s %9s" % (
+            row['payload'], row['scale'], row['protocol'], row['bytes'],
+            row['encodeMs'], row['decodeMs'], row['encodeMBps'], row['decodeMBps'],
+            row['encodePeakKB'], row['decodePeakKB'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='10,100,1000', help='Comma separated scales')
+    parser.add_argument('--payloads', help='Comma separated payloads, all by default')
+    parser.add_argument('--min-time', type=float, default=0.3, help='Seconds to spend on each measurement')
+    parser.add_argument('--no-codecs', action='store_true', help='Use the generated read/write code')
+    parser.add_argument('--json', help='Write the results to this file, - for stdout')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    if thrift.protocol.fastbinary is None:
+        print >> sys.stderr, "fastbinary is not available (%s), accelerated uses pure Python" % \
+            thrift.protocol.fastbinary_error
+    TCodec.enabled = not args.no_codecs
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    payloads = args.payloads.split(',') if args.payloads else None
+    report = {'environment': environment(), 'results': run(scales, args.min_time, payloads)}
+
+    if args.json == '-':
+        print json.dumps(report, indent=2, sort_keys=True)
+    else:
+        printTable(report['results'])
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            messages = regressions(report['results'], json.load(f), args.tolerance)
+        for message in messages:
+            print >> sys.stderr, "regression: %s" % message
+        if messages:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Large field benchmark for TTransportBase.readAll and readInto.
+
+Reads payloads from 1 KB to 50 MB through a transport that returns at
+most --chunk-kb per read() call, like a socket does, comparing the old
+string concatenation loop with the bytearray based readAll and readInto.
+
+    python -m geeknote.benchmarks.readAllBench --chunk-kb 16
+"""
+
+import argparse
+
+from serializationBench import timeit
+
+from thrift.transport import TTransport
+
+SIZES = (
+    ('1 KB', 1024),
+    ('64 KB', 64 * 1024),
+    ('1 MB', 1024 * 1024),
+    ('10 MB', 10 * 1024 * 1024),
+    ('50 MB', 50 * 1024 * 1024),
+)
+
+
+class ChunkedTransport(TTransport.TTransportBase):
+    """ read() returns at most chunkSize bytes of data """
+
+    def __init__(self, data, chunkSize):
+        self.data = data
+        self.chunkSize = chunkSize
+        self.pos = 0
+
+    def read(self, sz):
+        sz = min(sz, self.chunkSize)
+        chunk = self.data[self.pos:self.pos + sz]
+        self.pos += len(chunk)
+        return chunk
+
+
+def concatReadAll(trans, sz):
+    """ readAll before the bytearray read path """
+    buff = ''
+    have = 0
+    while (have < sz):
+        chunk = trans.read(sz - have)
+        have += len(chunk)
+        buff += chunk
+
+        if len(chunk) == 0:
+            raise EOFError()
+
+    return buff
+
+
+def readInto(trans, sz):
+    buff = bytearray(sz)
+    trans.readInto(buff)
+    return buff
+
+
+METHODS = (
+    ('concat', concatReadAll),
+    ('readAll', lambda trans, sz: trans.readAll(sz)),
+    ('readInto', readInto),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk-kb', type=int, default=16, help='Largest chunk returned by one read()')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to spend on each measurement')
+    args = parser.parse_args()
+
+    chunkSize = args.chunk_kb * 1024
+
+    print "%-8s %-10s %12s %12s" % ('payload', 'method', 'ms', 'MB/s')
+    for name, size in SIZES:
+        data = '\x5a' * size
+        for method, func in METHODS:
+            seconds = timeit(lambda: func(ChunkedTransport(data, chunkSize), size), args.min_time)
+            print "%-8s %-10s %12.3f %12.1f" % (name, method, seconds * 1000, size / seconds / 1024 / 1024)
+
+if __name__ == "__main__":
+    main()
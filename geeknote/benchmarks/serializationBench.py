@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Serialization benchmark: pure Python TBinaryProtocol against the
+fastbinary accelerated protocol on synthetic Note, NoteList and SyncChunk.
+
+    python -m geeknote.benchmarks.serializationBench --scale 1000
+"""
+
+import argparse
+import time
+
+import edamData
+
+import thrift.protocol
+from thrift import TSerialization
+from thrift.protocol import TBinaryProtocol
+
+PROTOCOLS = (
+    ('binary', TBinaryProtocol.TBinaryProtocolFactory()),
+    ('accelerated', TBinaryProtocol.TBinaryProtocolAcceleratedFactory()),
+)
+
+
+def payloads(scale):
+    return (
+        ('Note', edamData.note(0, contentSize=64 * 1024, resources=2, resourceSize=32 * 1024)),
+        ('NoteList', edamData.noteList(scale)),
+        ('SyncChunk', edamData.syncChunk(scale, contentSize=512)),
+    )
+
+
+def timeit(func, minTime):
+    """ run func until minTime seconds have passed, return seconds per call """
+    calls = 0
+    start = time.time()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.time() - start
+        if elapsed >= minTime:
+            return elapsed / calls
+
+
+def measure(obj, factory, minTime=0.5):
+    """ return (encoded size, encode seconds, decode seconds) for one object """
+    data = TSerialization.serialize(obj, factory)
+    encode = timeit(lambda: TSerialization.serialize(obj, factory), minTime)
+    decode = timeit(lambda: TSerialization.deserialize(obj.__class__(), data, factory), minTime)
+    return len(data), encode, decode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1000, help='Notes in NoteList and SyncChunk')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to spend on each measurement')
+    args = parser.parse_args()
+
+    if thrift.protocol.fastbinary is None:
+        print "fastbinary is not available (%s), both rows use pure Python" % thrift.protocol.fastbinary_error
+
+    print "%-10s %-12s %10s %12s %12s" % ('payload', 'protocol', 'bytes', 'encode ms', 'decode ms')
+    for name, obj in payloads(args.scale):
+        results = {}
+        for protocol, factory in PROTOCOLS:
+            size, encode, decode = measure(obj, factory, args.min_time)
+            results[protocol] = (encode, decode)
+            print "%-10s %-12s %10d %12.3f %12.3f" % (name, protocol, size, encode * 1000, decode * 1000)
+        print "%-10s %-12s %10s %11.1fx %11.1fx" % (
+            name, 'speedup', '',
+            results['binary'][0] / results['accelerated'][0],
+            results['binary'][1] / results['accelerated'][1])
+
+if __name__ == "__main__":
+    main()
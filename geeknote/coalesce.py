@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import copy
+import time
+import threading
+
+import config
+from log import logging
+from background import Future
+
+# NoteStore reads answered from the coalescing layer
+COALESCED = frozenset(['listNotebooks', 'listTags', 'getNote'])
+# calls starting with these don't change the account, the rest invalidate
+READ_PREFIXES = ('get', 'list', 'find', 'check')
+
+
+class _Call(Future):
+    """ a coalesced call, finished is when its result came """
+
+    def __init__(self):
+        super(_Call, self).__init__()
+        self.finished = None
+
+
+class CoalescingClient(object):
+    """
+    Wraps a NoteStore.Client and answers identical COALESCED calls once.
+
+    A call that is already in flight is waited for instead of being sent
+    again, and its result is reused for window seconds. Every caller gets
+    its own copy of the result. Any call that may change the account, like
+    createNotebook or updateNote, drops what is cached.
+    """
+
+    def __init__(self, client, window=None):
+        self._client = client
+        self._window = window if window is not None else config.COALESCE_WINDOW
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def invalidate(self):
+        # calls in flight finish for their waiters, but are not reused
+        with self._lock:
+            self._calls = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith(('_', 'send_', 'recv_')) or not callable(attr):
+            return attr
+
+        if name in COALESCED:
+            def call(*args, **kwargs):
+                return self._coalesce(name, attr, args, kwargs)
+        elif name.startswith(READ_PREFIXES):
+            return attr
+        else:
+            def call(*args, **kwargs):
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self.invalidate()
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+
+        self.__dict__[name] = call
+        return call
+
+    def _coalesce(self, name, func, args, kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            entry = self._calls.get(key)
+            leader = entry is None or self._expired(entry)
+            if leader:
+                for other in [k for k, e in self._calls.items() if self._expired(e)]:
+                    del self._calls[other]
+                entry = self._calls[key] = _Call()
+
+        if not leader:
+            result = entry.result()
+            logging.debug("Coalesced %s call", name)
+            return copy.deepcopy(result)
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._forget(key, entry)
+            entry.setException(sys.exc_info())
+            raise
+
+        entry.finished = time.time()
+        entry.setResult(copy.deepcopy(result))
+        return result
+
+    def _expired(self, entry):
+        return entry.finished is not None and time.time() - entry.finished > self._window
+
+    def _forget(self, key, entry):
+        with self._lock:
+            if self._calls.get(key) is entry:
+                del self._calls[key]
+
+
+def coalesce(client, window=None):
+    return CoalescingClient(client, window)
@@ -24,6 +24,44 @@ IS_OUT_TERMINAL = sys.stdout.isatty()
 APP_DIR = os.path.join(os.getenv("USERPROFILE") or os.getenv("HOME"),  ".geeknote")
 ERROR_LOG = os.path.join(APP_DIR, "error.log")
 
+# Local copies of notes, used by show and edit
+NOTE_CACHE = os.path.join(APP_DIR, "notes.cache")
+NOTE_CACHE_SIZE = 50 * 1024 * 1024
+# Serialization of cached notes and searches: "binary" or "compact"
+CACHE_PROTOCOL = "binary"
+
+# Per method totals of Evernote calls, see "geeknote stats"
+RPC_STATS = os.path.join(APP_DIR, "rpcstats.json")
+# Append every Evernote call to this file as a JSON line, None to disable
+RPC_TRACE = os.getenv("GEEKNOTE_RPC_TRACE")
+
+# Pacing of Evernote calls, shared by all geeknote processes through RATE_LIMIT_FILE:
+# bursts of up to RATE_LIMIT_BURST calls, RATE_LIMIT_RATE calls per second on average.
+# A call refused with RATE_LIMIT_REACHED is repeated up to RATE_LIMIT_RETRIES times.
+RATE_LIMIT_FILE = os.path.join(APP_DIR, "ratelimit.lock")
+RATE_LIMIT_RATE = 1.0
+RATE_LIMIT_BURST = 60
+RATE_LIMIT_RETRIES = 3
+
+# Identical listNotebooks, listTags and getNote calls within this many seconds
+# are sent once, 0 only merges calls that are in flight at the same time
+COALESCE_WINDOW = 30
+
+# The note store url, shard and version check are asked once in this many seconds
+BOOTSTRAP_TTL = 24 * 3600
+
+# Notes asked for by one search call, Evernote returns at most 250
+SEARCH_PAGE_SIZE = 100
+
+# Local replica of the account created by "geeknote mirror", once it exists
+# notebook-list, tag-list and note lookups read from it after syncing the changes
+MIRROR_FILE = os.path.join(APP_DIR, "mirror.db")
+# Objects asked for by one getFilteredSyncChunk call
+MIRROR_CHUNK_SIZE = 500
+
+# Connections createNotes and updateNotes send notes on at once
+BULK_WORKERS = 4
+
 # Set default system editor
 DEF_UNIX_EDITOR = "nano"
 DEF_WIN_EDITOR = "notepad.exe"
@@ -32,6 +70,13 @@ EDITOR_OPEN = "WRITE"
 DEV_MODE = False
 DEBUG = False
 
+# Ask for gzip replies and gzip large request bodies
+HTTP_COMPRESSION = False
+
+# Per connection timeouts in milliseconds, None blocks forever
+HTTP_CONNECT_TIMEOUT = 30000
+HTTP_READ_TIMEOUT = 300000
+
 # Url view the note
 NOTE_URL = "https://%domain%/Home.action?#n=%s"
 
@@ -0,0 +1,604 @@
+# -*- coding: utf-8 -*-
+
+import re
+import copy
+import math
+import time
+import uuid
+import hashlib
+import threading
+
+from standin import Standin
+
+import evernote.edam.userstore.UserStore as UserStore
+import evernote.edam.userstore.constants as UserStoreConstants
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+# calls which don't take an authentication token
+PUBLIC = frozenset(['checkVersion', 'getBootstrapInfo', 'authenticate', 'getPublicUserInfo'])
+# calls which don't count against the rate limit
+UNLIMITED = frozenset(['checkVersion', 'getBootstrapInfo'])
+
+# notes returned by one search call at most
+SEARCH_PAGE_MAX = 250
+
+# one term of the search grammar: [-][field:]value or [-][field:]"some value"
+SEARCH_TERM = re.compile(r'(-?)(?:(\w+):)?("[^"]*"|\S+)')
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def _guid():
+    return str(uuid.uuid4())
+
+
+def _notFound(identifier, key):
+    return Errors.EDAMNotFoundException(identifier=identifier, key=key)
+
+
+def _userError(errorCode, parameter):
+    return Errors.EDAMUserException(errorCode=errorCode, parameter=parameter)
+
+
+def _text(content):
+    """ the words of an ENML document, lowercased """
+    return re.sub(r'<[^>]*>', ' ', content or '').lower()
+
+
+def _resourceView(resource, withData):
+    view = copy.copy(resource)
+    if resource.data is not None:
+        view.data = copy.copy(resource.data)
+        if not withData:
+            view.data.body = None
+    view.recognition = None
+    view.alternateData = None
+    return view
+
+
+def _noteView(note, withContent=False, withResourcesData=False):
+    """ a copy of a stored note, without the parts the caller didn't ask for """
+    view = copy.copy(note)
+    view.content = note.content if withContent else None
+    if note.tagGuids is not None:
+        view.tagGuids = list(note.tagGuids)
+    view.attributes = copy.deepcopy(note.attributes)
+    if note.resources is not None:
+        view.resources = [_resourceView(resource, withResourcesData) for resource in note.resources]
+    return view
+
+
+class FakeNoteStore(NoteStore.Iface):
+    """
+    NoteStore of one account, kept in memory.
+
+    Implements notebooks, tags, notes with their resources, searches and
+    sync chunks. Every change takes the next update sequence number (USN)
+    of the account. Expunged objects are remembered with theirs, so sync
+    chunks can report them. Methods not implemented here answer with a
+    MISSING_RESULT application error.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.updateCount = 0
+        self.notebooks = {}
+        self.tags = {}
+        self.notes = {}
+        # guid -> (USN, the SyncChunk field listing it)
+        self.expunged = {}
+        self.defaultNotebook = self._createNotebook(Types.Notebook(name="My Notebook")).guid
+
+    def _usn(self):
+        self.updateCount += 1
+        return self.updateCount
+
+    def _expunge(self, objects, guid, field):
+        del objects[guid]
+        self.expunged[guid] = (self._usn(), field)
+
+    def _get(self, objects, guid, identifier):
+        if guid not in objects:
+            raise _notFound(identifier, guid)
+        return objects[guid]
+
+    def _checkName(self, objects, obj, identifier):
+        if not obj.name or not obj.name.strip():
+            raise _userError(Errors.EDAMErrorCode.BAD_DATA_FORMAT, identifier)
+        for other in objects.values():
+            if other.guid != obj.guid and other.name.lower() == obj.name.lower():
+                raise _userError(Errors.EDAMErrorCode.DATA_CONFLICT, identifier)
+
+    """
+    SYNCHRONIZATION
+    """
+    def getSyncState(self, authenticationToken):
+        with self.lock:
+            return NoteStore.SyncState(currentTime=_now(), fullSyncBefore=0,
+                                       updateCount=self.updateCount, uploaded=0)
+
+    def getSyncChunk(self, authenticationToken, afterUSN, maxEntries, fullSyncOnly):
+        chunkFilter = NoteStore.SyncChunkFilter(includeNotes=True, includeNoteResources=True,
+                                                includeNoteAttributes=True, includeNotebooks=True,
+                                                includeTags=True, includeExpunged=not fullSyncOnly)
+        return self.getFilteredSyncChunk(authenticationToken, afterUSN, maxEntries, chunkFilter)
+
+    def getFilteredSyncChunk(self, authenticationToken, afterUSN, maxEntries, filter):
+        with self.lock:
+            entries = []
+            if filter.includeNotebooks:
+                entries += [(nb.updateSequenceNum, 'notebooks', nb) for nb in self.notebooks.values()]
+            if filter.includeTags:
+                entries += [(tag.updateSequenceNum, 'tags', tag) for tag in self.tags.values()]
+            if filter.includeNotes:
+                entries += [(note.updateSequenceNum, 'notes', note) for note in self.notes.values()]
+            if filter.includeExpunged:
+                entries += [(usn, field, guid) for guid, (usn, field) in self.expunged.items()]
+            entries = sorted([entry for entry in entries if entry[0] > afterUSN],
+                             key=lambda entry: entry[0])[:maxEntries]
+
+            chunk = NoteStore.SyncChunk(currentTime=_now(), updateCount=self.updateCount)
+            for usn, field, value in entries:
+                if field == 'notes':
+                    # sync chunks never carry content or resource bodies
+                    value = _noteView(value)
+                    if not filter.includeNoteResources:
+                        value.resources = None
+                    if not filter.includeNoteAttributes:
+                        value.attributes = None
+                elif field in ('notebooks', 'tags'):
+                    value = copy.deepcopy(value)
+                if getattr(chunk, field) is None:
+                    setattr(chunk, field, [])
+                getattr(chunk, field).append(value)
+            if entries:
+                chunk.chunkHighUSN = entries[-1][0]
+            return chunk
+
+    """
+    NOTEBOOKS
+    """
+    def listNotebooks(self, authenticationToken):
+        with self.lock:
+            return copy.deepcopy(sorted(self.notebooks.values(), key=lambda nb: nb.name.lower()))
+
+    def getNotebook(self, authenticationToken, guid):
+        with self.lock:
+            return copy.deepcopy(self._get(self.notebooks, guid, "Notebook.guid"))
+
+    def getDefaultNotebook(self, authenticationToken):
+        return self.getNotebook(authenticationToken, self.defaultNotebook)
+
+    def createNotebook(self, authenticationToken, notebook):
+        with self.lock:
+            return copy.deepcopy(self._createNotebook(notebook))
+
+    def _createNotebook(self, notebook):
+        notebook = copy.deepcopy(notebook)
+        notebook.guid = _guid()
+        self._checkName(self.notebooks, notebook, "Notebook.name")
+        notebook.defaultNotebook = not self.notebooks
+        notebook.serviceCreated = notebook.serviceUpdated = _now()
+        notebook.updateSequenceNum = self._usn()
+        self.notebooks[notebook.guid] = notebook
+        return notebook
+
+    def updateNotebook(self, authenticationToken, notebook):
+        with self.lock:
+            stored = self._get(self.notebooks, notebook.guid, "Notebook.guid")
+            self._checkName(self.notebooks, notebook, "Notebook.name")
+            stored.name = notebook.name
+            stored.stack = notebook.stack
+            stored.serviceUpdated = _now()
+            stored.updateSequenceNum = self._usn()
+            return stored.updateSequenceNum
+
+    def expungeNotebook(self, authenticationToken, guid):
+        with self.lock:
+            self._get(self.notebooks, guid, "Notebook.guid")
+            if guid == self.defaultNotebook:
+                raise _userError(Errors.EDAMErrorCode.DATA_CONFLICT, "Notebook.guid")
+            for note in self.notes.values():
+                if note.notebookGuid == guid:
+                    self._expunge(self.notes, note.guid, 'expungedNotes')
+            self._expunge(self.notebooks, guid, 'expungedNotebooks')
+            return self.updateCount
+
+    """
+    TAGS
+    """
+    def listTags(self, authenticationToken):
+        with self.lock:
+            return copy.deepcopy(sorted(self.tags.values(), key=lambda tag: tag.name.lower()))
+
+    def getTag(self, authenticationToken, guid):
+        with self.lock:
+            return copy.deepcopy(self._get(self.tags, guid, "Tag.guid"))
+
+    def createTag(self, authenticationToken, tag):
+        with self.lock:
+            return copy.deepcopy(self._createTag(tag))
+
+    def _createTag(self, tag):
+        tag = copy.deepcopy(tag)
+        tag.guid = _guid()
+        self._checkName(self.tags, tag, "Tag.name")
+        tag.updateSequenceNum = self._usn()
+        self.tags[tag.guid] = tag
+        return tag
+
+    def updateTag(self, authenticationToken, tag):
+        with self.lock:
+            stored = self._get(self.tags, tag.guid, "Tag.guid")
+            self._checkName(self.tags, tag, "Tag.name")
+            stored.name = tag.name
+            stored.parentGuid = tag.parentGuid
+            stored.updateSequenceNum = self._usn()
+            return stored.updateSequenceNum
+
+    def expungeTag(self, authenticationToken, guid):
+        with self.lock:
+            self._get(self.tags, guid, "Tag.guid")
+            for note in self.notes.values():
+                if note.tagGuids and guid in note.tagGuids:
+                    note.tagGuids.remove(guid)
+                    note.updateSequenceNum = self._usn()
+            self._expunge(self.tags, guid, 'expungedTags')
+            return self.updateCount
+
+    """
+    NOTES
+    """
+    def getNote(self, authenticationToken, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        with self.lock:
+            return _noteView(self._get(self.notes, guid, "Note.guid"), withContent, withResourcesData)
+
+    def getNoteContent(self, authenticationToken, guid):
+        with self.lock:
+            return self._get(self.notes, guid, "Note.guid").content
+
+    def getNoteTagNames(self, authenticationToken, guid):
+        with self.lock:
+            note = self._get(self.notes, guid, "Note.guid")
+            return [self.tags[tagGuid].name for tagGuid in note.tagGuids or []]
+
+    def createNote(self, authenticationToken, note):
+        with self.lock:
+            stored = Types.Note(guid=_guid(), active=True, created=note.created or _now(),
+                                notebookGuid=self.defaultNotebook)
+            self._storeNote(stored, note)
+            self.notes[stored.guid] = stored
+            return _noteView(stored)
+
+    def updateNote(self, authenticationToken, note):
+        with self.lock:
+            stored = self._get(self.notes, note.guid, "Note.guid")
+            self._storeNote(stored, note)
+            return _noteView(stored)
+
+    def _storeNote(self, stored, note):
+        """ copy the fields set in note over stored, then take a new USN """
+        note = copy.deepcopy(note)
+        title = note.title if note.title is not None else stored.title
+        if not title or not title.strip():
+            raise _userError(Errors.EDAMErrorCode.BAD_DATA_FORMAT, "Note.title")
+        if note.notebookGuid is not None:
+            self._get(self.notebooks, note.notebookGuid, "Note.notebookGuid")
+        for guid in note.tagGuids or []:
+            self._get(self.tags, guid, "Note.tagGuids")
+
+        stored.title = title
+        if note.notebookGuid is not None:
+            stored.notebookGuid = note.notebookGuid
+        if note.content is not None:
+            stored.content = note.content
+            stored.contentHash = hashlib.md5(note.content).digest()
+            stored.contentLength = len(note.content)
+        if note.tagGuids is not None or note.tagNames is not None:
+            tagGuids = list(note.tagGuids or [])
+            for name in note.tagNames or []:
+                tag = self._tagByName(name) or self._createTag(Types.Tag(name=name))
+                if tag.guid not in tagGuids:
+                    tagGuids.append(tag.guid)
+            stored.tagGuids = tagGuids
+        if note.attributes is not None:
+            stored.attributes = note.attributes
+        if note.resources is not None:
+            stored.resources = note.resources
+
+        stored.updated = note.updated or _now()
+        stored.updateSequenceNum = self._usn()
+        for resource in note.resources or []:
+            resource.guid = resource.guid or _guid()
+            resource.noteGuid = stored.guid
+            resource.active = True
+            resource.updateSequenceNum = stored.updateSequenceNum
+            if resource.data is not None and resource.data.body is not None:
+                resource.data.bodyHash = hashlib.md5(resource.data.body).digest()
+                resource.data.size = len(resource.data.body)
+
+    def _tagByName(self, name):
+        for tag in self.tags.values():
+            if tag.name.lower() == name.lower():
+                return tag
+
+    def deleteNote(self, authenticationToken, guid):
+        with self.lock:
+            note = self._get(self.notes, guid, "Note.guid")
+            note.active = False
+            note.deleted = _now()
+            note.updateSequenceNum = self._usn()
+            return note.updateSequenceNum
+
+    def expungeNote(self, authenticationToken, guid):
+        with self.lock:
+            self._get(self.notes, guid, "Note.guid")
+            self._expunge(self.notes, guid, 'expungedNotes')
+            return self.updateCount
+
+    def getResource(self, authenticationToken, guid, withData, withRecognition,
+                    withAttributes, withAlternateData):
+        with self.lock:
+            view = _resourceView(self._resource(guid), withData)
+            if not withAttributes:
+                view.attributes = None
+            return view
+
+    def getResourceData(self, authenticationToken, guid):
+        with self.lock:
+            return self._resource(guid).data.body
+
+    def _resource(self, guid):
+        for note in self.notes.values():
+            for resource in note.resources or []:
+                if resource.guid == guid:
+                    return resource
+        raise _notFound("Resource.guid", guid)
+
+    """
+    SEARCH
+    """
+    def findNotes(self, authenticationToken, filter, offset, maxNotes):
+        maxNotes = min(maxNotes, SEARCH_PAGE_MAX)
+        with self.lock:
+            found = self._search(filter)
+            return NoteStore.NoteList(startIndex=offset, totalNotes=len(found),
+                                      notes=[_noteView(note) for note in found[offset:offset + maxNotes]],
+                                      updateCount=self.updateCount)
+
+    def findNotesMetadata(self, authenticationToken, filter, offset, maxNotes, resultSpec):
+        maxNotes = min(maxNotes, SEARCH_PAGE_MAX)
+        with self.lock:
+            found = self._search(filter)
+            notes = []
+            for note in found[offset:offset + maxNotes]:
+                metadata = NoteStore.NoteMetadata(guid=note.guid)
+                for spec in resultSpec.thrift_spec:
+                    if spec is None or not getattr(resultSpec, spec[2]):
+                        continue
+                    # includeTitle -> title
+                    name = spec[2][len('include'):]
+                    name = name[0].lower() + name[1:]
+                    if name.startswith('largestResource'):
+                        value = self._largestResource(note, name)
+                    else:
+                        value = copy.deepcopy(getattr(note, name))
+                    setattr(metadata, name, value)
+                notes.append(metadata)
+            return NoteStore.NotesMetadataList(startIndex=offset, totalNotes=len(found), notes=notes,
+                                               updateCount=self.updateCount)
+
+    def _largestResource(self, note, name):
+        resources = [resource for resource in note.resources or [] if resource.data]
+        if not resources:
+            return None
+        largest = max(resources, key=lambda resource: resource.data.size)
+        return largest.mime if name == 'largestResourceMime' else largest.data.size
+
+    def findNoteCounts(self, authenticationToken, filter, withTrash):
+        with self.lock:
+            counts = NoteStore.NoteCollectionCounts(notebookCounts={}, tagCounts={})
+            for note in self._search(filter):
+                counts.notebookCounts[note.notebookGuid] = counts.notebookCounts.get(note.notebookGuid, 0) + 1
+                for guid in note.tagGuids or []:
+                    counts.tagCounts[guid] = counts.tagCounts.get(guid, 0) + 1
+            if withTrash:
+                counts.trashCount = len([note for note in self.notes.values() if not note.active])
+            return counts
+
+    def _search(self, filter):
+        """ the notes matching a NoteFilter, in its order """
+        terms = []
+        words = filter.words or ''
+        anyTerm = words.startswith('any:')
+        if anyTerm:
+            words = words[len('any:'):]
+        for negative, field, value in SEARCH_TERM.findall(words):
+            terms.append((bool(negative), (field or '').lower(), value.strip('"').lower()))
+
+        found = []
+        for note in self.notes.values():
+            if bool(note.active) == bool(filter.inactive):
+                continue
+            if filter.notebookGuid and note.notebookGuid != filter.notebookGuid:
+                continue
+            if filter.tagGuids and not set(filter.tagGuids) <= set(note.tagGuids or []):
+                continue
+            matches = [self._matches(note, field, value) != negative for negative, field, value in terms]
+            if matches and not (any(matches) if anyTerm else all(matches)):
+                continue
+            found.append(note)
+
+        key = {
+            Types.NoteSortOrder.CREATED: lambda note: note.created,
+            Types.NoteSortOrder.TITLE: lambda note: note.title.lower(),
+            Types.NoteSortOrder.UPDATE_SEQUENCE_NUMBER: lambda note: note.updateSequenceNum,
+        }.get(filter.order, lambda note: note.updated)
+        found.sort(key=key, reverse=not filter.ascending)
+        return found
+
+    def _matches(self, note, field, value):
+        # a trailing * matches any ending
+        prefix = value.endswith('*')
+        value = value.rstrip('*')
+
+        def named(name):
+            name = name.lower()
+            return name.startswith(value) if prefix else name == value
+
+        if field == 'intitle':
+            return value in note.title.lower()
+        if field == 'notebook':
+            return named(self.notebooks[note.notebookGuid].name)
+        if field == 'tag':
+            return any(named(self.tags[guid].name) for guid in note.tagGuids or [])
+        if field in ('created', 'updated'):
+            try:
+                since = int(time.mktime(time.strptime(value[:8], "%Y%m%d")) * 1000)
+            except ValueError:
+                raise _userError(Errors.EDAMErrorCode.BAD_DATA_FORMAT, "NoteFilter.words")
+            return getattr(note, field) >= since
+        return value in note.title.lower() or value in _text(note.content)
+
+
+class FakeUserStore(UserStore.Iface):
+    """ UserStore of the account of a FakeEvernote """
+
+    def __init__(self, service, username="geeknote"):
+        self.service = service
+        self.user = Types.User(id=1, username=username, email="%s@example.com" % username,
+                               name=username, timezone="UTC", privilege=Types.PrivilegeLevel.NORMAL,
+                               created=_now(), updated=_now(), active=True, shardId="s1")
+
+    def checkVersion(self, clientName, edamVersionMajor, edamVersionMinor):
+        return (edamVersionMajor == UserStoreConstants.EDAM_VERSION_MAJOR and
+                edamVersionMinor <= UserStoreConstants.EDAM_VERSION_MINOR)
+
+    def getUser(self, authenticationToken):
+        return copy.deepcopy(self.user)
+
+    def getPublicUserInfo(self, username):
+        if username != self.user.username:
+            raise _notFound("User.username", username)
+        return UserStore.PublicUserInfo(userId=self.user.id, shardId=self.user.shardId,
+                                        privilege=self.user.privilege, username=username,
+                                        noteStoreUrl=self.service.noteStoreUrl)
+
+    def getNoteStoreUrl(self, authenticationToken):
+        return self.service.noteStoreUrl
+
+
+class _Gate(object):
+    """ handler proxy: every call is counted, delayed, authenticated and rate limited """
+
+    def __init__(self, handler, service):
+        self._handler = handler
+        self._service = service
+
+    def __getattr__(self, name):
+        attr = getattr(self._handler, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args):
+            self._service.admit(name, args)
+            return attr(*args)
+
+        self.__dict__[name] = call
+        return call
+
+
+class FakeEvernote(object):
+    """
+    Local Evernote service for tests and benchmarks.
+
+    Serves a FakeUserStore and a FakeNoteStore of one account on two
+    Standin endpoints, getNoteStoreUrl points at the second one. Calls
+    authenticate with any of tokens, others fail with INVALID_AUTH and
+    expired ones with AUTH_EXPIRED. latency seconds are slept before
+    every call, a dict gives the latency of each method, or a function
+    called with the arguments of the call in place of the sleep. rateLimit is
+    (calls, seconds): beyond calls in a window of seconds the service
+    answers RATE_LIMIT_REACHED with the rest of the window as
+    rateLimitDuration, as Evernote does. calls counts the calls by method.
+
+        fake = FakeEvernote(latency=0.05).start()
+        transport = THttpClient.THttpClient(fake.noteStoreUrl)
+        noteStore = NoteStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+        noteStore.listNotebooks(fake.token)
+        fake.stop()
+    """
+
+    def __init__(self, token="S=s1:U=1:fake", latency=0, rateLimit=None,
+                 handshakeDelay=0, protocolFactory=None, compress=False):
+        self.token = token
+        self.tokens = set([token])
+        self.expired = set()
+        self.latency = latency
+        self.rateLimit = rateLimit
+        self.calls = {}
+        self.lock = threading.Lock()
+        # start and number of calls of the current rate limit window
+        self.window = (0, 0)
+
+        self.noteStore = FakeNoteStore()
+        self.userStore = FakeUserStore(self)
+        self.noteStandin = Standin(NoteStore.Processor(_Gate(self.noteStore, self)), '/shard/s1/notestore',
+                                   handshakeDelay, protocolFactory, compress)
+        self.userStandin = Standin(UserStore.Processor(_Gate(self.userStore, self)), '/edam/user',
+                                   handshakeDelay, protocolFactory, compress)
+
+    @property
+    def userStoreUrl(self):
+        return self.userStandin.url
+
+    @property
+    def noteStoreUrl(self):
+        return self.noteStandin.url
+
+    def start(self):
+        self.userStandin.start()
+        self.noteStandin.start()
+        return self
+
+    def stop(self):
+        self.userStandin.stop()
+        self.noteStandin.stop()
+
+    def expire(self, token=None):
+        """ calls with token fail with AUTH_EXPIRED from now on """
+        token = token or self.token
+        self.tokens.discard(token)
+        self.expired.add(token)
+
+    def admit(self, name, args):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+        latency = self.latency.get(name, 0) if isinstance(self.latency, dict) else self.latency
+        if callable(latency):
+            latency(*args)
+        elif latency:
+            time.sleep(latency)
+
+        if name not in PUBLIC and args[0] not in self.tokens:
+            errorCode = Errors.EDAMErrorCode.AUTH_EXPIRED if args[0] in self.expired \
+                else Errors.EDAMErrorCode.INVALID_AUTH
+            raise _userError(errorCode, "authenticationToken")
+
+        if self.rateLimit and name not in UNLIMITED:
+            calls, seconds = self.rateLimit
+            with self.lock:
+                now = time.time()
+                start, count = self.window
+                if now - start >= seconds:
+                    start, count = now, 0
+                if count >= calls:
+                    raise Errors.EDAMSystemException(errorCode=Errors.EDAMErrorCode.RATE_LIMIT_REACHED,
+                                                     rateLimitDuration=int(math.ceil(start + seconds - now)))
+                self.window = (start, count + 1)
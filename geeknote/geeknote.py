@@ -15,17 +15,33 @@ import time
 from datetime import datetime
 from urlparse import urlparse
 import re
-import lib.thrift.protocol.TBinaryProtocol as TBinaryProtocol
-import lib.thrift.transport.THttpClient as THttpClient
+# import thrift from the same path as the generated evernote modules,
+# otherwise TBinaryProtocolAccelerated is not recognized by their read/write
+import thrift.protocol.TBinaryProtocol as TBinaryProtocol
+import thrift.transport.THttpClient as THttpClient
+from thrift.protocol import fastbinary, fastbinary_error
+from thrift.Thrift import TType, TMessageType, TApplicationException
+from thrift.protocol import TCodec
 import evernote.edam.userstore.UserStore as UserStore
 import evernote.edam.userstore.constants as UserStoreConstants
 import evernote.edam.notestore.NoteStore as NoteStore
 import evernote.edam.type.ttypes as Types
 import evernote.edam.error.ttypes as Errors
 
+# listings only need guid, title and dates: decode the rest of a Note on first use
+TCodec.lazy(Types.Note, ('content', 'resources', 'attributes'))
+
+# what a search asks for: enough to list the notes and to show or edit one of them later,
+# the USN checks a cached copy of the content
+SEARCH_RESULT_SPEC = NoteStore.NotesMetadataResultSpec(includeTitle=True, includeCreated=True,
+                                                       includeUpdated=True, includeUpdateSequenceNum=True)
+
 import locale
 import time
 import signal
+import itertools
+import collections
+import copy
 
 import out
 from argparser import argparser
@@ -33,11 +49,24 @@ from argparser import argparser
 from oauth import GeekNoteAuth
 
 from storage import Storage
+from notecache import NoteCache
+from mirror import Mirror
+import rpcstats
+import ratelimit
+import coalesce
+import background
 import editor
 import tools
 from log import logging
 
 
+def contentHash(content):
+    """ the MD5 digest Evernote keeps as Note.contentHash """
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return hashlib.md5(content).digest()
+
+
 # decorator to disable evernote connection on create instance of GeekNote
 def GeekNoneDBConnectOnly(func):
     def wrapper(*args, **kwargs):
@@ -54,7 +83,17 @@ class GeekNote(object):
     userStore = None
     noteStore = None
     storage = None
+    noteCache = None
+    rateLimiter = None
+    bootstrap = None
+    mirror = None
+    # the mirror has the changes made up to now, see syncMirror
+    mirrorSynced = False
+    # updateCount of the account as asked by this process, see getUpdateCount
+    updateCount = None
     skipInitConnection = False
+    # idle keep-alive connections shared by the UserStore and NoteStore clients
+    httpPool = THttpClient.THttpConnectionPool()
 
     def __init__(self, skipInitConnection=False):
         if skipInitConnection:
@@ -84,6 +123,10 @@ class GeekNote(object):
 
                 errorCode = int(e.errorCode)
 
+                # the cached note store url may be stale, ask Evernote again next time
+                if errorCode in (Errors.EDAMErrorCode.INVALID_AUTH, Errors.EDAMErrorCode.AUTH_EXPIRED):
+                    GeekNote(skipInitConnection=True).removeBootstrap()
+
                 # auth-token error, re-auth
                 if errorCode == 9:
                     storage = Storage()
@@ -94,6 +137,10 @@ class GeekNote(object):
                 elif errorCode == 3:
                     out.failureMessage("Sorry, you do not have permissions to do this operation.")
 
+                elif errorCode == Errors.EDAMErrorCode.RATE_LIMIT_REACHED:
+                    out.failureMessage("Sorry, Evernote limits the number of requests, try again in %s seconds."
+                                       % (getattr(e, 'rateLimitDuration', None) or ratelimit.DEFAULT_DURATION))
+
                 else:
                     return False
 
@@ -108,13 +155,132 @@ class GeekNote(object):
         GeekNote.storage = Storage()
         return GeekNote.storage
 
+    def getNoteCache(self):
+        # an empty cache has no length, it is still the one to use
+        if GeekNote.noteCache is not None:
+            return GeekNote.noteCache
+
+        GeekNote.noteCache = NoteCache()
+        return GeekNote.noteCache
+
+    def getRateLimiter(self):
+        if GeekNote.rateLimiter:
+            return GeekNote.rateLimiter
+
+        def onPark(seconds):
+            out.preloader.setMessage("Rate limit reached, waiting %d s..." % seconds, needLaunch=False)
+
+        GeekNote.rateLimiter = ratelimit.RateLimiter(onPark=onPark)
+        return GeekNote.rateLimiter
+
+    def getBootstrap(self):
+        """ note store url, version check and shard kept in Storage for config.BOOTSTRAP_TTL """
+        if GeekNote.bootstrap is not None:
+            return GeekNote.bootstrap
+
+        GeekNote.bootstrap = self.getStorage().getBootstrap(config.BOOTSTRAP_TTL) or {}
+        return GeekNote.bootstrap
+
+    def setBootstrap(self, **values):
+        self.getBootstrap().update(values)
+        self.getStorage().setBootstrap(GeekNote.bootstrap)
+
+    def removeBootstrap(self):
+        GeekNote.bootstrap = None
+        GeekNote.noteStore = None
+        self.getStorage().removeBootstrap()
+
+    def getMirror(self):
+        """ the local replica of the account, None until "geeknote mirror" has created it """
+        if GeekNote.mirror:
+            return GeekNote.mirror
+
+        if not os.path.exists(config.MIRROR_FILE):
+            return None
+        GeekNote.mirror = Mirror()
+        return GeekNote.mirror
+
+    def createMirror(self, keepContent=False):
+        GeekNote.mirror = self.getMirror() or Mirror()
+        if keepContent:
+            GeekNote.mirror.setKeepContent(True)
+        return GeekNote.mirror
+
+    def removeMirror(self):
+        if self.getMirror():
+            GeekNote.mirror.close()
+            os.remove(GeekNote.mirror.path)
+        GeekNote.mirror = None
+        GeekNote.mirrorSynced = False
+
+    @EdamException
+    def syncMirror(self):
+        """
+        Fetch the changes made since the last sync into the mirror and return
+        it, or None if there is no mirror. Done once per process, and again
+        after this process changes the account.
+        """
+        mirror = self.getMirror()
+        if mirror is None or GeekNote.mirrorSynced:
+            return mirror
+
+        user = self.getStorage().getUserInfo()
+        mirror.sync(self.getNoteStore(), self.authToken, userId=getattr(user, 'id', None))
+        if mirror.keepsContent:
+            for guid, usn in mirror.staleContent():
+                mirror.setContent(guid, usn, self.getNoteStore().getNoteContent(self.authToken, guid))
+
+        GeekNote.mirrorSynced = True
+        return mirror
+
+    def getUpdateCount(self):
+        """ the account's updateCount, asked once per process """
+        if GeekNote.updateCount is None:
+            GeekNote.updateCount = self.getNoteStore().getSyncState(self.authToken).updateCount
+        return GeekNote.updateCount
+
+    def _getNames(self, kind, find):
+        """
+        {name: guid} of the notebooks or tags. Storage keeps their names as of
+        an updateCount of the account, they are listed again once it changes.
+        """
+        storage = self.getStorage()
+        updateCount = self.getUpdateCount()
+        if storage.getUserprop(kind + 'UpdateCount') == updateCount:
+            names = getattr(storage, 'get' + kind.capitalize())()
+        else:
+            names = dict((item.guid, item.name.decode('utf-8')) for item in find())
+            getattr(storage, 'set' + kind.capitalize())(names)
+            storage.setUserprop(kind + 'UpdateCount', updateCount)
+        return dict((name.encode('utf-8'), str(guid)) for guid, name in names.items())
+
+    def _accountChanged(self, usn, kind=None, guid=None, name=None):
+        """
+        Keep the names in Storage current after this process changed the
+        account to usn: a notebook or tag of kind was created or renamed to
+        name, or removed if name is None.
+        """
+        storage = self.getStorage()
+        if kind:
+            names = getattr(storage, 'get' + kind.capitalize())() or {}
+            names.pop(guid, None)
+            if name:
+                names[guid] = name.decode('utf-8')
+            getattr(storage, 'set' + kind.capitalize())(names)
+
+        # names current before the change still are, unless someone else changed the account too
+        for cached in ('notebooks', 'tags'):
+            if usn is not None and storage.getUserprop(cached + 'UpdateCount') == usn - 1:
+                storage.setUserprop(cached + 'UpdateCount', usn)
+        GeekNote.updateCount = usn if usn is not None and GeekNote.updateCount == usn - 1 else None
+
     def getUserStore(self):
         if GeekNote.userStore:
             return GeekNote.userStore
 
-        userStoreHttpClient = THttpClient.THttpClient(self.userStoreUri)
-        userStoreProtocol = TBinaryProtocol.TBinaryProtocol(userStoreHttpClient)
-        GeekNote.userStore = UserStore.Client(userStoreProtocol)
+        userStoreProtocol = self.getProtocol(self.userStoreUri)
+        GeekNote.userStore = ratelimit.schedule(rpcstats.instrument(UserStore.Client(userStoreProtocol)),
+                                                self.getRateLimiter())
 
         self.checkVersion()
 
@@ -124,20 +290,48 @@ class GeekNote(object):
         if GeekNote.noteStore:
             return GeekNote.noteStore
 
-        noteStoreUrl = self.getUserStore().getNoteStoreUrl(self.authToken)
-        noteStoreHttpClient = THttpClient.THttpClient(noteStoreUrl)
-        noteStoreProtocol = TBinaryProtocol.TBinaryProtocol(noteStoreHttpClient)
-        GeekNote.noteStore = NoteStore.Client(noteStoreProtocol)
+        # repeated listNotebooks/listTags/getNote calls are answered once
+        GeekNote.noteStore = coalesce.coalesce(self.createNoteStore())
 
         return GeekNote.noteStore
 
+    def createNoteStore(self):
+        """ a NoteStore client of its own, for calls made on another thread """
+        noteStoreProtocol = self.getProtocol(self.getNoteStoreUrl())
+        return ratelimit.schedule(rpcstats.instrument(NoteStore.Client(noteStoreProtocol)),
+                                  self.getRateLimiter())
+
+    def getNoteStoreUrl(self):
+        bootstrap = self.getBootstrap()
+        if bootstrap.get('noteStoreUrl'):
+            return bootstrap['noteStoreUrl']
+
+        noteStoreUrl = self.getUserStore().getNoteStoreUrl(self.authToken)
+        shard = re.search(r'/shard/([^/]+)/', noteStoreUrl)
+        self.setBootstrap(noteStoreUrl=noteStoreUrl, shardId=shard.group(1) if shard else None)
+        return noteStoreUrl
+
+    def getProtocol(self, uri, pool=None):
+        """ Thrift protocol over HTTP, C-accelerated when fastbinary is built """
+        httpClient = THttpClient.THttpClient(uri, pool=pool or self.httpPool,
+                                             compress=config.HTTP_COMPRESSION)
+        httpClient.setConnectTimeout(config.HTTP_CONNECT_TIMEOUT)
+        httpClient.setReadTimeout(config.HTTP_READ_TIMEOUT)
+        if fastbinary:
+            return TBinaryProtocol.TBinaryProtocolAccelerated(httpClient)
+        return TBinaryProtocol.TBinaryProtocol(httpClient)
+
     def checkVersion(self):
+        if self.getBootstrap().get('versionOK'):
+            return
+
         versionOK = self.getUserStore().checkVersion("Python EDAMTest",
                                        UserStoreConstants.EDAM_VERSION_MAJOR,
                                        UserStoreConstants.EDAM_VERSION_MINOR)
         if not versionOK:
             logging.error("Old EDAM version")
             return tools.exit()
+        self.setBootstrap(versionOK=True)
 
     def checkAuth(self):
         self.authToken = self.getStorage().getUserToken()
@@ -155,43 +349,199 @@ class GeekNote(object):
             return False
 
         self.getStorage().createUser(self.authToken, userInfo)
+        # another user may live on another shard
+        GeekNote.bootstrap = None
+        GeekNote.noteStore = None
         return True
 
     def getUserInfo(self):
         return self.getUserStore().getUser(self.authToken)
 
     def removeUser(self):
+        # the notes of this account must not stay on disk after it is gone
+        self.removeMirror()
+        self.getNoteCache().clear()
         return self.getStorage().removeUser()
 
     """
     WORK WITH NOTEST
     """
     @EdamException
-    def findNotes(self, keywords, count, createOrder=False):
+    def findNotes(self, keywords, count, createOrder=False, resultSpec=SEARCH_RESULT_SPEC, offset=0):
+        """ return NotesMetadataList, its notes carry only the fields resultSpec asks for """
+        noteFilter = self._createNoteFilter(keywords, createOrder)
+        return self.getNoteStore().findNotesMetadata(self.authToken, noteFilter, offset, count, resultSpec)
+
+    def findNotesPages(self, keywords, count, createOrder=False, resultSpec=SEARCH_RESULT_SPEC, pageSize=None):
+        """
+        Generator of the first count notes found, as NotesMetadataList pages of
+        up to pageSize notes. The next page is fetched on a background thread
+        while the caller works on the current one, so no more than two pages
+        are held at once. Errors of the first page are handled as in findNotes,
+        the ones of later pages are raised from the generator.
+        """
+        pageSize = pageSize or config.SEARCH_PAGE_SIZE
+        page = self.findNotes(keywords, min(count, pageSize), createOrder, resultSpec)
+        if not page:
+            return
 
+        noteFilter = self._createNoteFilter(keywords, createOrder)
+        noteStore = None
+        offset = len(page.notes)
+        total = min(count, page.totalNotes)
+        while True:
+            prefetch = None
+            if page.notes and offset < total:
+                noteStore = noteStore or self.createNoteStore()
+                prefetch = background.run(noteStore.findNotesMetadata, self.authToken, noteFilter,
+                                          offset, min(pageSize, total - offset), resultSpec)
+            yield page
+
+            if prefetch is None:
+                return
+            page = prefetch.result()
+            offset += len(page.notes)
+
+    def _createNoteFilter(self, keywords, createOrder=False):
         noteFilter = NoteStore.NoteFilter(order=Types.NoteSortOrder.RELEVANCE)
         if createOrder:
             noteFilter.order = Types.NoteSortOrder.CREATED
 
         if keywords:
             noteFilter.words = keywords
-        return self.getNoteStore().findNotes(self.authToken, noteFilter, 0, count)
+        return noteFilter
 
     @EdamException
     def loadNoteContent(self, note):
-        """ modify Note object """
+        """ modify Note or NoteMetadata object """
         if not isinstance(note, object):
             raise Exception("Note content must be an instanse of Note, '%s' given." % type(note))
 
+        # notes found by a search carry the USN to check the cached copy against
+        mirror = self.getMirror()
+        if note.updateSequenceNum is not None and mirror:
+            content = mirror.getContent(note.guid, note.updateSequenceNum)
+            if content is not None:
+                logging.debug("Note content from mirror: %s", note.guid)
+                note.content = content
+                return
+
+        if note.updateSequenceNum is not None:
+            cached = self.getNoteCache().get(note.guid, note.updateSequenceNum)
+            if cached is not None and cached.content is not None:
+                logging.debug("Note content from cache: %s", note.guid)
+                note.content = cached.content
+                return
+
         note.content = self.getNoteStore().getNoteContent(self.authToken, note.guid)
 
+        if note.updateSequenceNum is not None:
+            if mirror:
+                mirror.setContent(note.guid, note.updateSequenceNum, note.content)
+            if not isinstance(note, Types.Note):
+                note = Types.Note(guid=note.guid, title=note.title, content=note.content,
+                                  updateSequenceNum=note.updateSequenceNum)
+            self.getNoteCache().put(note)
+
+    def getContentHash(self, note):
+        """
+        MD5 of the content the service has for a Note or NoteMetadata, as
+        far as the note itself or a local copy at its USN tells, else None
+        """
+        if getattr(note, 'content', None) is not None:
+            return contentHash(note.content)
+        if getattr(note, 'contentHash', None) is not None:
+            return note.contentHash
+        if note.updateSequenceNum is None:
+            return None
+
+        mirror = self.getMirror()
+        known = mirror.getContentHash(note.guid, note.updateSequenceNum) if mirror else None
+        if known is None:
+            cached = self.getNoteCache().get(note.guid, note.updateSequenceNum)
+            if cached is not None and cached.content is not None:
+                known = contentHash(cached.content)
+        return known
+
     @EdamException
     def getNote(self, guid, with_content=False):
         note = self.getNoteStore().getNote(self.authToken, guid, with_content, False, False, False)
         return note
 
+    @EdamException
+    def downloadResource(self, guid, fileobj, chunkSize=64 * 1024):
+        """
+        Write the body of resource guid to fileobj, return its size.
+        The body is copied from the reply in chunkSize pieces, so memory
+        use does not depend on the size of the attachment.
+        """
+        noteStore = self.getNoteStore()
+
+        def download():
+            with rpcstats.globalStats.measure('getResourceData', noteStore._iprot.trans):
+                noteStore.send_getResourceData(self.authToken, guid)
+                return self._recvBinary(noteStore._iprot, NoteStore.getResourceData_result,
+                                        fileobj, chunkSize)
+        return self.getRateLimiter().call(download)
+
+    def _recvBinary(self, iprot, resultClass, fileobj, chunkSize):
+        """ stream the binary success field of a *_result reply to fileobj """
+        (fname, mtype, rseqid) = iprot.readMessageBegin()
+        if mtype == TMessageType.EXCEPTION:
+            x = TApplicationException()
+            x.read(iprot)
+            iprot.readMessageEnd()
+            raise x
+
+        specs = dict((spec[0], spec) for spec in resultClass.thrift_spec if spec)
+        size = None
+        error = None
+
+        iprot.readStructBegin()
+        while True:
+            (name, ftype, fid) = iprot.readFieldBegin()
+            if ftype == TType.STOP:
+                break
+
+            if fid == 0 and ftype == TType.STRING:
+                size = iprot.readI32()
+                buff = bytearray(min(size, chunkSize))
+                view = memoryview(buff)
+                left = size
+                while left > 0:
+                    chunk = view[:min(left, chunkSize)]
+                    iprot.trans.readInto(chunk)
+                    fileobj.write(chunk.tobytes())
+                    left -= len(chunk)
+            elif fid in specs and ftype == TType.STRUCT == specs[fid][1]:
+                error = specs[fid][3][0]()
+                error.read(iprot)
+            else:
+                iprot.skip(ftype)
+            iprot.readFieldEnd()
+        iprot.readStructEnd()
+        iprot.readMessageEnd()
+
+        if error is not None:
+            raise error
+        if size is None:
+            raise TApplicationException(TApplicationException.MISSING_RESULT,
+                                        "%s failed: unknown result" % resultClass.__name__)
+        return size
+
     @EdamException
     def createNote(self, title, content, tags=None, notebook=None, created=None, attributes=None):
+        note = self._newNote(title, content, tags, notebook, created, attributes)
+
+        logging.debug("New note : %s", note)
+
+        note = self.getNoteStore().createNote(self.authToken, note)
+        GeekNote.mirrorSynced = False
+        # tagNames may have created tags
+        self._accountChanged(None if tags else note.updateSequenceNum)
+        return note
+
+    def _newNote(self, title, content, tags=None, notebook=None, created=None, attributes=None):
         na = None
         if attributes:
             na = Types.NoteAttributes()
@@ -211,22 +561,38 @@ class GeekNote(object):
         if notebook:
             note.notebookGuid = notebook
 
-        logging.debug("New note : %s", note)
-
-        note = self.getNoteStore().createNote(self.authToken, note)
         return note
 
     @EdamException
-    def updateNote(self, guid, title=None, content=None, tags=None, notebook=None, attributes=None):
+    def updateNote(self, guid, title=None, content=None, tags=None, notebook=None, attributes=None,
+                   contentHash=None):
+        """
+        The content is sent only if it differs from the one the service has,
+        whose MD5 is contentHash, or the contentHash of a note passed in.
+        """
         # allow us to pass in a note object instead
         # due to the way evernote is imported via geeknote.lib
-        # the isinstance check won't work
-        if hasattr(guid, "title"):
-            note = guid
+        # the isinstance check won't work, and a str guid has a title method
+        if not isinstance(guid, basestring):
+            note = self._checkNote(guid)
             logging.debug("Update note : %s", note)
-            self.getNoteStore().updateNote(self.authToken, note)
+            result = self.getNoteStore().updateNote(self.authToken, self._withoutSameContent(note))
+            self.getNoteCache().remove(note.guid)
+            GeekNote.mirrorSynced = False
+            self._accountChanged(None if note.tagNames else result.updateSequenceNum)
             return note
 
+        note = self._updatedNote(guid, title, content, tags, notebook, attributes)
+
+        logging.debug("Update note : %s", note)
+
+        result = self.getNoteStore().updateNote(self.authToken, self._withoutSameContent(note, contentHash))
+        self.getNoteCache().remove(guid)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(None if tags else result.updateSequenceNum)
+        return note
+
+    def _updatedNote(self, guid, title=None, content=None, tags=None, notebook=None, attributes=None):
         na = Types.NoteAttributes()
         if attributes:
             for k, v in attributes.items():
@@ -247,16 +613,102 @@ class GeekNote(object):
         if notebook:
             note.notebookGuid = notebook
 
-        logging.debug("Update note : %s", note)
+        return note
+
+    def _withoutSameContent(self, note, knownHash=None):
+        """ note, or a copy without the content if it is the one whose MD5 is knownHash or note.contentHash """
+        knownHash = knownHash or note.contentHash
+        if note.content is None or knownHash is None or contentHash(note.content) != knownHash:
+            return note
 
-        self.getNoteStore().updateNote(self.authToken, note)
+        logging.debug("Content of note %s is unchanged, not sent", note.guid)
+        note = copy.copy(note)
+        note.content = None
         return note
 
+    def createNotes(self, notes, workers=None):
+        """
+        Create the notes of an iterable of Types.Note, or of dicts of
+        createNote arguments, several at once. Return, in the order of notes,
+        the created Note or the exception that failed it.
+        """
+        return self._sendNotes('createNote', (
+            self._newNote(**note) if isinstance(note, dict) else self._checkNote(note) for note in notes), workers)
+
+    def updateNotes(self, notes, workers=None):
+        """
+        as createNotes, with Types.Note or dicts of updateNote arguments,
+        a content the service already has is not sent, as in updateNote
+        """
+        def updated(note):
+            if not isinstance(note, dict):
+                return self._withoutSameContent(self._checkNote(note))
+            note = dict(note)
+            knownHash = note.pop('contentHash', None)
+            return self._withoutSameContent(self._updatedNote(**note), knownHash)
+
+        results = self._sendNotes('updateNote', (updated(note) for note in notes), workers)
+        for result in results:
+            if not isinstance(result, Exception):
+                self.getNoteCache().remove(result.guid)
+        return results
+
+    def _checkNote(self, note):
+        """ note if it is a Types.Note, a NoteMetadata or any other record can't be sent """
+        # by name: the types may also be imported as geeknote.lib.evernote,
+        # and getNote returns a LazyNote subclass without fastbinary
+        if 'Note' not in [cls.__name__ for cls in type(note).__mro__]:
+            raise TypeError("a Note or a dict of arguments is expected, not %s" % type(note).__name__)
+        return note
+
+    def _sendNotes(self, method, notes, workers=None):
+        """
+        Call method for every note on up to workers NoteStore connections
+        of their own, paced by the rate limiter of all the calls. No more
+        than twice as many notes as workers are taken from notes at once.
+        """
+        from asyncnote import NoteStorePool
+
+        workers = workers or config.BULK_WORKERS
+        pool = NoteStorePool(self.getNoteStoreUrl(), workers, self.getProtocol, self.getRateLimiter())
+        results = []
+        pending = collections.deque()
+
+        def collect():
+            note, future = pending.popleft()
+            try:
+                results.append(future.result())
+            except Exception, e:
+                logging.error("Error: %s \"%s\" : %s", method, note.title or note.guid, str(e))
+                results.append(e)
+
+        try:
+            for note in notes:
+                logging.debug("%s : %s", method, note)
+                pending.append((note, pool.submit(method, self.authToken, note)))
+                if len(pending) >= workers * 2:
+                    collect()
+            while pending:
+                collect()
+        finally:
+            pool.close()
+            # also when notes stopped with an error, some may have been sent
+            if GeekNote.noteStore:
+                # the pool's clients don't go through it
+                GeekNote.noteStore.invalidate()
+            GeekNote.mirrorSynced = False
+            # the USNs of concurrent changes don't tell whether anyone else changed the account
+            self._accountChanged(None)
+        return results
+
     @EdamException
     def removeNote(self, guid):
         logging.debug("Delete note with guid: %s", guid)
 
-        self.getNoteStore().deleteNote(self.authToken, guid)
+        usn = self.getNoteStore().deleteNote(self.authToken, guid)
+        self.getNoteCache().remove(guid)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(usn)
         return True
 
     """
@@ -264,8 +716,16 @@ class GeekNote(object):
     """
     @EdamException
     def findNotebooks(self):
+        mirror = self.syncMirror()
+        if mirror:
+            return mirror.notebooks()
         return self.getNoteStore().listNotebooks(self.authToken)
 
+    @EdamException
+    def getNotebookGuids(self):
+        """ {name: guid} of the notebooks """
+        return self._getNames('notebooks', self.findNotebooks)
+
     @EdamException
     def createNotebook(self, name):
         notebook = Types.Notebook()
@@ -274,6 +734,8 @@ class GeekNote(object):
         logging.debug("New notebook : %s", notebook)
 
         result = self.getNoteStore().createNotebook(self.authToken, notebook)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(result.updateSequenceNum, 'notebooks', result.guid, result.name)
         return result
 
     @EdamException
@@ -284,14 +746,18 @@ class GeekNote(object):
 
         logging.debug("Update notebook : %s", notebook)
 
-        self.getNoteStore().updateNotebook(self.authToken, notebook)
+        usn = self.getNoteStore().updateNotebook(self.authToken, notebook)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(usn, 'notebooks', guid, name)
         return True
 
     @EdamException
     def removeNotebook(self, guid):
         logging.debug("Delete notebook : %s", guid)
 
-        self.getNoteStore().expungeNotebook(self.authToken, guid)
+        usn = self.getNoteStore().expungeNotebook(self.authToken, guid)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(usn, 'notebooks', guid)
         return True
 
     """
@@ -299,8 +765,16 @@ class GeekNote(object):
     """
     @EdamException
     def findTags(self):
+        mirror = self.syncMirror()
+        if mirror:
+            return mirror.tags()
         return self.getNoteStore().listTags(self.authToken)
 
+    @EdamException
+    def getTagGuids(self):
+        """ {name: guid} of the tags """
+        return self._getNames('tags', self.findTags)
+
     @EdamException
     def createTag(self, name):
         tag = Types.Tag()
@@ -309,6 +783,8 @@ class GeekNote(object):
         logging.debug("New tag : %s", tag)
 
         result = self.getNoteStore().createTag(self.authToken, tag)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(result.updateSequenceNum, 'tags', result.guid, result.name)
         return result
 
     @EdamException
@@ -319,14 +795,18 @@ class GeekNote(object):
 
         logging.debug("Update tag : %s", tag)
 
-        self.getNoteStore().updateTag(self.authToken, tag)
+        usn = self.getNoteStore().updateTag(self.authToken, tag)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(usn, 'tags', guid, name)
         return True
 
     @EdamException
     def removeTag(self, guid):
         logging.debug("Delete tag : %s", guid)
 
-        self.getNoteStore().expungeTag(self.authToken, guid)
+        usn = self.getNoteStore().expungeTag(self.authToken, guid)
+        GeekNote.mirrorSynced = False
+        self._accountChanged(usn, 'tags', guid)
         return True
 
 class GeekNoteConnector(object):
@@ -407,6 +887,62 @@ class User(GeekNoteConnector):
                 self.getStorage().setUserprop('editor', editor)
                 out.successMessage("Changes have been saved.")
 
+class Diagnostics(GeekNoteConnector):
+    """ Report on the runtime environment """
+
+    @GeekNoneDBConnectOnly
+    def show(self):
+        from benchmarks import edamData, serializationBench
+
+        protocol = self.getEvernote().getProtocol(config.USER_STORE_URI)
+        info = [
+            ('Python', sys.version.split()[0]),
+            ('fastbinary', 'active' if fastbinary else 'not available: %s' % fastbinary_error),
+            ('Thrift protocol', protocol.__class__.__name__),
+        ]
+
+        out.preloader.setMessage("Measuring serialization speed...")
+        noteList = edamData.noteList(1000)
+        decode = {}
+        for name, factory in serializationBench.PROTOCOLS:
+            size, encodeTime, decode[name] = serializationBench.measure(noteList, factory, 0.2)
+        info.append(('Decode 1000 notes', "binary %.1f ms, accelerated %.1f ms (%.1fx)" % (
+            decode['binary'] * 1000, decode['accelerated'] * 1000,
+            decode['binary'] / decode['accelerated'])))
+
+        out.showDiagnostics(info)
+
+class Stats(object):
+    """ Report on the Evernote calls made so far """
+
+    def show(self, reset=None):
+        stats = rpcstats.globalStats
+        if reset:
+            stats.reset()
+            out.successMessage("RPC statistics have been reset.")
+            return
+
+        out.showStats(stats.totals())
+
+class LocalMirror(GeekNoteConnector):
+    """ Keep a local replica of the account """
+
+    def sync(self, content=None, remove=None):
+        if remove:
+            GeekNote(skipInitConnection=True).removeMirror()
+            out.successMessage("The local mirror has been removed.")
+            return
+
+        self.getEvernote().createMirror(keepContent=content)
+        out.preloader.setMessage("Syncing the local mirror...")
+        mirror = self.getEvernote().syncMirror()
+        if not mirror:
+            out.failureMessage("Error while syncing the local mirror.")
+            return tools.exit()
+
+        out.successMessage("The local mirror is up to date: %d notes, %d notebooks, %d tags." % (
+            mirror.findNotes(count=0).totalNotes, len(mirror.notebooks()), len(mirror.tags())))
+
 class Tags(GeekNoteConnector):
     """ Work with auth Notebooks """
 
@@ -454,13 +990,12 @@ class Tags(GeekNoteConnector):
             out.failureMessage("Error while removing the tag.")
 
     def _searchTag(self, tag):
-        result = self.getEvernote().findTags()
-        tag = [item for item in result if item.name == tag]
+        guid = self.getEvernote().getTagGuids().get(tag)
 
-        if tag:
-            tag = tag[0]
+        if guid:
+            tag = Types.Tag(guid=guid, name=tag)
         else:
-            tag = out.SelectSearchResult(result)
+            tag = out.SelectSearchResult(self.getEvernote().findTags())
 
         logging.debug("Selected tag: %s" % str(tag))
         return tag
@@ -513,13 +1048,12 @@ class Notebooks(GeekNoteConnector):
 
     def _searchNotebook(self, notebook):
 
-        result = self.getEvernote().findNotebooks()
-        notebook = [item for item in result if item.name == notebook]
+        guid = self.getEvernote().getNotebookGuids().get(notebook)
 
-        if notebook:
-            notebook = notebook[0]
+        if guid:
+            notebook = Types.Notebook(guid=guid, name=notebook)
         else:
-            notebook = out.SelectSearchResult(result)
+            notebook = out.SelectSearchResult(self.getEvernote().findNotebooks())
 
         logging.debug("Selected notebook: %s" % str(notebook))
         return notebook
@@ -528,12 +1062,7 @@ class Notebooks(GeekNoteConnector):
         if len(notebook) == 36 and notebook.find("-") == 4:
             return notebook
 
-        result = self.getEvernote().findNotebooks()
-        notebook = [item for item in result if item.name == notebook]
-        if notebook:
-            return notebook[0].guid
-        else:
-            return None
+        return self.getEvernote().getNotebookGuids().get(notebook)
 
 class Notes(GeekNoteConnector):
     """ Work with Notes """
@@ -564,9 +1093,16 @@ class Notes(GeekNoteConnector):
         note = self._searchNote(note)
 
         inputData = self._parceInput(title, content, tags, notebook, note)
+        knownHash = self.getEvernote().getContentHash(note)
+        if knownHash is None and inputData['content'] is not None:
+            # the note without its content is cheaper than sending the content again
+            knownHash = self.getEvernote().getNote(note.guid).contentHash
+        if self._isUnchanged(note, inputData, knownHash):
+            out.successMessage("Note has not been changed.")
+            return
 
         out.preloader.setMessage("Saving note...")
-        result = self.getEvernote().updateNote(guid=note.guid, **inputData)
+        result = self.getEvernote().updateNote(guid=note.guid, contentHash=knownHash, **inputData)
 
         if result:
             out.successMessage("Note has been successfully saved.")
@@ -600,6 +1136,12 @@ class Notes(GeekNoteConnector):
 
         out.showNote(note)
 
+    def _isUnchanged(self, note, inputData, knownHash):
+        """ whether saving inputData would leave note, whose content has the MD5 knownHash, as it is """
+        content = inputData['content']
+        return ((content is None or contentHash(content) == knownHash) and
+                inputData['title'] == note.title and not inputData['tags'] and not inputData['notebook'])
+
     def _parceInput(self, title=None, content=None, tags=None, notebook=None, note=None):
         result = {
             "title": title,
@@ -622,6 +1164,10 @@ class Notes(GeekNoteConnector):
                 if note:
                     self.getEvernote().loadNoteContent(note)
                     content = editor.edit(note.content)
+                    # the editor closed without changes, keep the content as it is
+                    if content == editor.ENMLtoText(note.content):
+                        logging.debug("Content not changed in the editor")
+                        content = None
                 else:
                    content = editor.edit()
 
@@ -629,8 +1175,9 @@ class Notes(GeekNoteConnector):
                 logging.debug("Load content from the file")
                 content = open(content, "r").read()
 
-            logging.debug("Convert content")
-            content = editor.textToENML(content)
+            if content is not None:
+                logging.debug("Convert content")
+                content = editor.textToENML(content)
 
             result['content'] = content
 
@@ -657,10 +1204,15 @@ class Notes(GeekNoteConnector):
             note = result.notes[int(note)-1]
 
         else:
-            request = self._createSearchRequest(search=note)
+            mirror = self.getEvernote().syncMirror()
+            if mirror:
+                logging.debug("Search notes in the mirror: %s" % note)
+                result = mirror.findNotes(title=note, count=20)
+            else:
+                request = self._createSearchRequest(search=note)
 
-            logging.debug("Search notes: %s" % request)
-            result = self.getEvernote().findNotes(request, 20)
+                logging.debug("Search notes: %s" % request)
+                result = self.getEvernote().findNotes(request, 20)
 
             logging.debug("Search notes result: %s" % str(result))
             if result.totalNotes == 0:
@@ -678,7 +1230,7 @@ class Notes(GeekNoteConnector):
         return note
 
 
-    def find(self, search=None, tags=None, notebooks=None, date=None, exact_entry=None, content_search=None, with_url=None, count=None, ):
+    def find(self, search=None, tags=None, notebooks=None, date=None, exact_entry=None, content_search=None, with_url=None, count=None, local=None):
 
         request = self._createSearchRequest(search, tags, notebooks, date, exact_entry, content_search)
 
@@ -690,16 +1242,48 @@ class Notes(GeekNoteConnector):
         logging.debug("Search count: %s", count)
 
         createFilter = True if search == "*" else False
-        result = self.getEvernote().findNotes(request, count, createFilter)
+        if local:
+            return self._findLocal(request, count, createFilter, with_url)
 
-        if result.totalNotes == 0:
+        pages = self.getEvernote().findNotesPages(request, count, createFilter)
+        first = next(pages, None)
+        if first is None:
+            return out.failureMessage("Error while searching notes.")
+
+        if first.totalNotes == 0:
             out.successMessage("Notes have not been found.")
 
+        # print the notes as their pages arrive, keep them for "show <number>"
+        result = NoteStore.NotesMetadataList(startIndex=0, totalNotes=first.totalNotes, notes=[])
+
+        def notes():
+            for page in itertools.chain([first], pages):
+                result.notes.extend(page.notes)
+                for note in page.notes:
+                    yield note
+
+        out.SearchResult(notes(), request, showUrl=with_url, total=min(count, first.totalNotes))
+
         # save search result
-        # print result
         self.getStorage().setSearch(result)
 
-        out.SearchResult(result.notes, request, showUrl=with_url)
+    def _findLocal(self, request, count, createFilter, with_url):
+        mirror = GeekNote(skipInitConnection=True).getMirror()
+        if mirror is None:
+            out.failureMessage('There is no local mirror, create it with "geeknote mirror".')
+            return tools.exit()
+
+        try:
+            result = mirror.search(request, count, createFilter)
+        except ValueError, e:
+            out.failureMessage(str(e))
+            return tools.exit()
+
+        if result.totalNotes == 0:
+            out.successMessage("Notes have not been found.")
+
+        out.SearchResult(result.notes, request, showUrl=with_url, total=min(count, result.totalNotes))
+        GeekNote(skipInitConnection=True).getStorage().setSearch(result)
 
     def _createSearchRequest(self, search=None, tags=None, notebooks=None, date=None, exact_entry=None, content_search=None):
 
@@ -769,6 +1353,7 @@ def modifyArgsByStdinStream():
     return ('create', ARGS)
 
 def main(args=None):
+    rpcstats.saveAtExit()
     try:
         # if terminal
         if config.IS_IN_TERMINAL:
@@ -806,6 +1391,15 @@ def main(args=None):
         if COMMAND == 'settings':
             User().settings(**ARGS)
 
+        if COMMAND == 'diagnostics':
+            Diagnostics().show(**ARGS)
+
+        if COMMAND == 'stats':
+            Stats().show(**ARGS)
+
+        if COMMAND == 'mirror':
+            LocalMirror().sync(**ARGS)
+
         # Notes
         if COMMAND == 'create':
             Notes().create(**ARGS)
@@ -10,6 +10,9 @@ import markdown
 
 from geeknote import GeekNote
 from storage import Storage
+import rpcstats
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
 import editor
 import tools
 import meta as metamod
@@ -128,18 +131,38 @@ class GNSync:
         filedatas = list(map(self._get_filedata, files))
         filedatas.sort(key=lambda x: x.get('date', 0), reverse=True)
 
+        creates, updates = [], []
         for filedata in filedatas:
             if not self._is_dirty(filedata):
                 print(filedata['title'], 'skipped')
                 continue
 
             note = _match_note(filedata)
-            note = self._process_note(filedata, note)
-            assert note.guid is not None
-            self.add_evernote_guid(filedata, note.guid)
+            if not note:
+                creates.append((filedata, self._create_note(filedata)))
+            elif filedata['mtime'] > note.updated:
+                updates.append((filedata, self._update_note(filedata, note)))
+            else:
+                self.add_evernote_guid(filedata, note.guid)
+
+        # the notes are sent several at once, a failed one doesn't stop the others
+        self._send_notes(GeekNote().createNotes, creates, 'created')
+        self._send_notes(GeekNote().updateNotes, updates, 'updated')
 
         logger.info('Sync Complete')
 
+    def _send_notes(self, send, pairs, done):
+        results = send([note for filedata, note in pairs])
+        for (filedata, note), result in zip(pairs, results):
+            if isinstance(result, Exception):
+                logger.error('Note "{0}" was not {1}: {2}'.format(filedata['file_name'], done, result))
+                print(filedata['title'], 'failed')
+                continue
+
+            logger.info('Note "{0}" was {1}'.format(filedata['file_name'], done))
+            assert result.guid is not None
+            self.add_evernote_guid(filedata, result.guid)
+
     def _is_dirty(self, filedata):
         if 'evernoteupdate' not in filedata:
             return True
@@ -147,13 +170,6 @@ class GNSync:
             return True
         return filedata['mtime'] > filedata['evernoteupdate']
 
-    def _process_note(self, f, n):
-        if n:
-            if f['mtime'] > n.updated:
-                self._update_note(f, n)
-            return n
-        return self._create_note(f)
-
     def add_evernote_guid(self, filedata, guid):
         """ Check if guid is in markdown meta, add if not"""
         content = filedata['content']
@@ -168,29 +184,28 @@ class GNSync:
     @log
     def _update_note(self, filedata, note):
         """
-        Updates note from file
+        Note to send for the note, a Note or a NoteMetadata, updated from file
         """
         created = filedata['mtime']
         if 'date' in filedata:
             created = filedata['date']
 
-        note.title = filedata['title']
-        note.content = filedata['content']
-        note.updated = filedata['mtime']
-        note.created = created
-        result = GeekNote().updateNote(note)
-
-        if result:
-            logger.info('Note "{0}" was updated'.format(note.title))
-        else:
-            raise Exception('Note "{0}" was not updated'.format(note.title))
-
-        return result
+        # a NoteMetadata can't carry the content, send a Note;
+        # with the contentHash the content is only sent when it changed
+        return Types.Note(
+            guid=note.guid,
+            title=filedata['title'],
+            content=filedata['content'],
+            contentHash=getattr(note, 'contentHash', None),
+            created=created,
+            updated=filedata['mtime'],
+            attributes=note.attributes
+        )
 
     @log
     def _create_note(self, filedata):
         """
-        Creates note from file
+        Arguments of createNote for a note from file
         """
         if filedata is None:
             return
@@ -203,7 +218,7 @@ class GNSync:
         if 'date' in filedata:
             created = filedata['date']
 
-        note = GeekNote().createNote(
+        return dict(
             title=filedata['title'],
             content=filedata['content'],
             notebook=self.notebook_guid,
@@ -211,14 +226,6 @@ class GNSync:
             attributes=attrs
         )
 
-
-        if note:
-            logger.info('Note "{0}" was created'.format(filedata['file_name']))
-        else:
-            raise Exception('Note "{0}" was not created'.format(filedata['file_name']))
-
-        return note
-
     @log
     def _get_filedata(self, f):
         content = codecs.open(f['path'], mode="r", encoding='utf-8').read()
@@ -262,15 +269,10 @@ class GNSync:
         Get notebook guid and name. Takes default notebook if notebook's name does not
         select.
         """
-        notebooks = GeekNote().findNotebooks()
-
         if not notebook_name:
             notebook_name = os.path.basename(os.path.realpath(path))
 
-        notebook = [item for item in notebooks if item.name == notebook_name]
-        guid = None
-        if notebook:
-            guid = notebook[0].guid
+        guid = GeekNote().getNotebookGuids().get(notebook_name)
 
         if not guid:
             notebook = GeekNote().createNotebook(notebook_name)
@@ -311,7 +313,9 @@ class GNSync:
         Get notes from evernote.
         """
         keywords = 'notebook:"{0}"'.format(tools.strip(self.notebook_name))
-        return GeekNote().findNotes(keywords, 10000).notes
+        resultSpec = NoteStore.NotesMetadataResultSpec(includeTitle=True, includeUpdated=True)
+        return [note for page in GeekNote().findNotesPages(keywords, 10000, resultSpec=resultSpec)
+                for note in page.notes]
 
 
 def main():
@@ -331,6 +335,7 @@ def main():
     logpath = args.logpath if args.logpath else None
 
     reset_logpath(logpath)
+    rpcstats.saveAtExit()
 
     print('path=', path)
     GNS = GNSync(notebook, path, mask, format)
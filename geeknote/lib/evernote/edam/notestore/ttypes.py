@@ -2602,3 +2602,7 @@ class NoteVersionId(object):
 
   def __ne__(self, other):
     return not (self == other)
+
+# read()/write() go through compiled codecs when fastbinary is not used
+from thrift.protocol import TCodec
+TCodec.install(globals())
@@ -4265,3 +4265,7 @@ class LinkedNotebook(object):
 
   def __ne__(self, other):
     return not (self == other)
+
+# read()/write() go through compiled codecs when fastbinary is not used
+from thrift.protocol import TCodec
+TCodec.install(globals())
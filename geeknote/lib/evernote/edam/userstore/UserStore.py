@@ -1977,3 +1977,7 @@ class getNoteStoreUrl_result(object):
 
   def __ne__(self, other):
     return not (self == other)
+
+# read()/write() go through compiled codecs when fastbinary is not used
+from thrift.protocol import TCodec
+TCodec.install(globals())
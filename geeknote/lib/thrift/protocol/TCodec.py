@@ -0,0 +1,723 @@
+"""Specialized struct codecs for the pure Python TBinaryProtocol and
+TCompactProtocol.
+
+The generated read() and write() methods go through a protocol method call
+for every field header, length and value. When fastbinary can't be used,
+install() makes the generated classes decode and encode through a function
+compiled from their thrift_spec instead: field headers and values are
+unpacked with precompiled struct.Struct objects straight from the transport.
+The compiled functions are cached per class. Compact encoders collect
+a whole struct in a list and write it to the transport at once.
+
+lazy() makes chosen fields of a class decode on first access: the decoder
+only records where their bytes are in the reply buffer.
+"""
+
+import struct
+import threading
+
+from thrift.Thrift import TType
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.protocol import fastbinary
+from thrift.protocol.TProtocol import TProtocolException
+from thrift.transport import TTransport
+
+# switch the compiled codecs off, e.g. to compare against the generated code
+enabled = True
+
+PROTOCOLS = (TBinaryProtocol.TBinaryProtocol,
+             TBinaryProtocol.TBinaryProtocolAccelerated)
+
+FORMATS = {
+  TType.BOOL: 'b',
+  TType.BYTE: 'b',
+  TType.I16: 'h',
+  TType.I32: 'i',
+  TType.I64: 'q',
+  TType.DOUBLE: 'd',
+}
+
+SIZES = dict((ttype, struct.calcsize('!' + fmt)) for ttype, fmt in FORMATS.items())
+
+# class -> subclass with lazily decoded fields, see lazy()
+lazyClasses = {}
+
+
+class _Compiler(object):
+
+  def __init__(self, cls):
+    self.cls = cls
+    self.ns = {'DEC': decoders, 'ENC': encoders}
+    self.lines = []
+    self.depth = 0
+
+  def emit(self, line, indent):
+    self.lines.append('  ' * indent + line)
+
+  def unpack(self, fmt):
+    name = 'U_' + fmt
+    self.ns[name] = struct.Struct('!' + fmt).unpack
+    return name
+
+  def pack(self, fmt):
+    name = 'P_' + fmt
+    self.ns[name] = struct.Struct('!' + fmt).pack
+    return name
+
+  def klass(self, cls):
+    cls = lazyClasses.get(cls, cls)
+    name = 'C_%s_%x' % (cls.__name__, id(cls))
+    self.ns[name] = cls
+    return name
+
+  def var(self, prefix):
+    self.depth += 1
+    return '%s%d' % (prefix, self.depth)
+
+  def build(self, name):
+    source = '\n'.join(self.lines) + '\n'
+    exec compile(source, '<TCodec %s.%s>' % (name, self.cls.__name__), 'exec') in self.ns
+    return self.ns[name]
+
+  # decoding
+
+  def readExpr(self, ttype, args):
+    if ttype == TType.BOOL:
+      return "(readAll(1) != '\\x00')"
+    if ttype in FORMATS:
+      fmt = FORMATS[ttype]
+      return '%s(readAll(%d))[0]' % (self.unpack(fmt), struct.calcsize('!' + fmt))
+    if ttype == TType.STRING:
+      return 'readAll(%s(readAll(4))[0])' % self.unpack('i')
+    if ttype == TType.STRUCT:
+      cls = self.klass(args[0])
+      return 'DEC[%s](%s(), iprot, readAll)' % (cls, cls)
+    if ttype in (TType.LIST, TType.SET):
+      items = '[%s for %s in xrange(%s(readAll(5))[1])]' % (
+        self.readExpr(args[0], args[1]), self.var('_'), self.unpack('bi'))
+      return items if ttype == TType.LIST else 'set(%s)' % items
+    if ttype == TType.MAP:
+      return 'dict([(%s, %s) for %s in xrange(%s(readAll(6))[2])])' % (
+        self.readExpr(args[0], args[1]), self.readExpr(args[2], args[3]),
+        self.var('_'), self.unpack('bbi'))
+    raise TypeError('no codec for thrift type %r' % ttype)
+
+  def decoder(self):
+    lazyFields = getattr(self.cls, '_lazyFields', ())
+    self.ns['SKIP'] = _skip
+    self.emit('def decode(self, iprot, readAll):', 0)
+    self.emit('fields = self.__dict__', 1)
+    self.emit('while True:', 1)
+    self.emit('ftype = ord(readAll(1))', 2)
+    self.emit('if ftype == 0:', 2)
+    self.emit('return self', 3)
+    self.emit('fid = %s(readAll(2))[0]' % self.unpack('h'), 2)
+    keyword = 'if'
+    for spec in self.cls.thrift_spec:
+      if spec is None:
+        continue
+      fid, ttype, name, args = spec[:4]
+      self.emit('%s fid == %d and ftype == %d:' % (keyword, fid, ttype), 2)
+      if name in lazyFields:
+        self.emit('raw = SKIP(readAll, ftype)', 3)
+        self.emit('if raw is not None:', 3)
+        self.emit('fields[%r] = raw' % name, 4)
+        self.emit('continue', 4)
+      self.emit('self.%s = %s' % (name, self.readExpr(ttype, args)), 3)
+      keyword = 'elif'
+    if keyword == 'elif':
+      self.emit('else:', 2)
+      self.emit('iprot.skip(ftype)', 3)
+    else:
+      self.emit('iprot.skip(ftype)', 2)
+    return self.build('decode')
+
+  def valueDecoder(self, ttype, args):
+    self.emit('def value(iprot, readAll):', 0)
+    self.emit('return %s' % self.readExpr(ttype, args), 1)
+    return self.build('value')
+
+  # encoding
+
+  def writeValue(self, ttype, args, value, indent):
+    if ttype == TType.BOOL:
+      self.emit('write(%s(1 if %s else 0))' % (self.pack('b'), value), indent)
+    elif ttype in FORMATS:
+      self.emit('write(%s(%s))' % (self.pack(FORMATS[ttype]), value), indent)
+    elif ttype == TType.STRING:
+      self.emit('write(%s(len(%s)))' % (self.pack('i'), value), indent)
+      self.emit('write(%s)' % value, indent)
+    else:
+      self.writeBody(ttype, args, value, indent)
+
+  def writeBody(self, ttype, args, value, indent):
+    """ everything but the header for container and struct values """
+    if ttype == TType.STRUCT:
+      self.emit('ENC[%s](%s, oprot)' % (self.klass(args[0]), value), indent)
+    elif ttype in (TType.LIST, TType.SET):
+      self.emit('write(%s(%d, len(%s)))' % (self.pack('bi'), args[0], value), indent)
+      item = self.var('e')
+      self.emit('for %s in %s:' % (item, value), indent)
+      self.writeValue(args[0], args[1], item, indent + 1)
+    elif ttype == TType.MAP:
+      self.emit('write(%s(%d, %d, len(%s)))' % (self.pack('bbi'), args[0], args[2], value), indent)
+      key, item = self.var('k'), self.var('v')
+      self.emit('for %s, %s in %s.items():' % (key, item, value), indent)
+      self.writeValue(args[0], args[1], key, indent + 1)
+      self.writeValue(args[2], args[3], item, indent + 1)
+    else:
+      raise TypeError('no codec for thrift type %r' % ttype)
+
+  def encoder(self):
+    self.emit('def encode(self, oprot):', 0)
+    self.emit('write = oprot.trans.write', 1)
+    for spec in self.cls.thrift_spec:
+      if spec is None:
+        continue
+      fid, ttype, name, args = spec[:4]
+      self.emit('value = self.%s' % name, 1)
+      self.emit('if value is not None:', 1)
+      # the field header is packed together with fixed size values
+      if ttype == TType.BOOL:
+        self.emit('write(%s(%d, %d, 1 if value else 0))' % (self.pack('bhb'), ttype, fid), 2)
+      elif ttype in FORMATS:
+        self.emit('write(%s(%d, %d, value))' % (self.pack('bh' + FORMATS[ttype]), ttype, fid), 2)
+      elif ttype == TType.STRING:
+        self.emit('write(%s(%d, %d, len(value)))' % (self.pack('bhi'), ttype, fid), 2)
+        self.emit('write(value)', 2)
+      else:
+        self.emit('write(%s(%d, %d))' % (self.pack('bh'), ttype, fid), 2)
+        self.writeBody(ttype, args, 'value', 2)
+    self.emit("write('\\x00')", 1)
+    return self.build('encode')
+
+
+class _CompactCompiler(_Compiler):
+  """Compiles TCompactProtocol codecs.
+
+  Compact decoders also take a varint() function, see varintReader().
+  Compact encoders take the append() of a list instead of a protocol.
+  Field headers depend on the id of the previous field written, they are
+  looked up in a per field table indexed by that id.
+  """
+
+  def __init__(self, cls):
+    _Compiler.__init__(self, cls)
+    self.ns.update({
+      'DEC': compactDecoders,
+      'ENC': compactEncoders,
+      'BYTES': TCompactProtocol.BYTES,
+      'VARINT': TCompactProtocol.encodeVarint,
+      'ZIGZAG': TCompactProtocol.fromZigZag,
+      'LISTSIZE': _readListSize,
+      'MAPSIZE': _readMapSize,
+      'SKIP': _skipCompact,
+      'U_d': _unpack_le_d,
+      'P_d': _pack_le_d,
+    })
+
+  def klass(self, cls):
+    # lazy fields keep binary offsets, compact structs are decoded eagerly
+    name = 'C_%s_%x' % (cls.__name__, id(cls))
+    self.ns[name] = cls
+    return name
+
+  def header(self, fid, ctype):
+    name = 'H_%d_%d' % (fid, ctype)
+    headers = []
+    for last in xrange(fid):
+      if fid - last <= 15:
+        headers.append(chr((fid - last) << 4 | ctype))
+      else:
+        headers.append(chr(ctype) + TCompactProtocol.encodeVarint(TCompactProtocol.makeZigZag(fid, 16)))
+    self.ns[name] = tuple(headers)
+    return name
+
+  # decoding
+
+  def readExpr(self, ttype, args):
+    if ttype == TType.BOOL:
+      return "(readAll(1) == '\\x01')"
+    if ttype == TType.BYTE:
+      return '%s(readAll(1))[0]' % self.unpack('b')
+    if ttype in (TType.I16, TType.I32, TType.I64):
+      return 'ZIGZAG(varint())'
+    if ttype == TType.DOUBLE:
+      return 'U_d(readAll(8))[0]'
+    if ttype == TType.STRING:
+      return 'readAll(varint())'
+    if ttype == TType.STRUCT:
+      cls = self.klass(args[0])
+      return 'DEC[%s](%s(), iprot, readAll, varint)' % (cls, cls)
+    if ttype in (TType.LIST, TType.SET):
+      items = '[%s for %s in xrange(LISTSIZE(readAll, varint))]' % (
+        self.readExpr(args[0], args[1]), self.var('_'))
+      return items if ttype == TType.LIST else 'set(%s)' % items
+    if ttype == TType.MAP:
+      return 'dict([(%s, %s) for %s in xrange(MAPSIZE(readAll, varint))])' % (
+        self.readExpr(args[0], args[1]), self.readExpr(args[2], args[3]), self.var('_'))
+    raise TypeError('no codec for thrift type %r' % ttype)
+
+  def decoder(self):
+    self.emit('def decode(self, iprot, readAll, varint):', 0)
+    self.emit('fid = 0', 1)
+    self.emit('while True:', 1)
+    self.emit('byte = ord(readAll(1))', 2)
+    self.emit('ctype = byte & 0x0f', 2)
+    self.emit('if ctype == 0:', 2)
+    self.emit('return self', 3)
+    self.emit('if byte > 0x0f:', 2)
+    self.emit('fid += byte >> 4', 3)
+    self.emit('else:', 2)
+    self.emit('fid = ZIGZAG(varint())', 3)
+    keyword = 'if'
+    for spec in self.cls.thrift_spec:
+      if spec is None:
+        continue
+      fid, ttype, name, args = spec[:4]
+      if ttype == TType.BOOL:
+        self.emit('%s fid == %d and (ctype == 1 or ctype == 2):' % (keyword, fid), 2)
+        self.emit('self.%s = ctype == 1' % name, 3)
+      else:
+        self.emit('%s fid == %d and ctype == %d:' % (keyword, fid, TCompactProtocol.CTYPES[ttype]), 2)
+        self.emit('self.%s = %s' % (name, self.readExpr(ttype, args)), 3)
+      keyword = 'elif'
+    if keyword == 'elif':
+      self.emit('else:', 2)
+      self.emit('SKIP(readAll, varint, ctype)', 3)
+    else:
+      self.emit('SKIP(readAll, varint, ctype)', 2)
+    return self.build('decode')
+
+  # encoding
+
+  def writeValue(self, ttype, args, value, indent):
+    if ttype == TType.BOOL:
+      self.emit("append('\\x01' if %s else '\\x02')" % value, indent)
+    elif ttype == TType.BYTE:
+      self.emit('append(%s(%s))' % (self.pack('b'), value), indent)
+    elif ttype in (TType.I16, TType.I32, TType.I64):
+      bits = {TType.I16: 15, TType.I32: 31, TType.I64: 63}[ttype]
+      self.emit('append(VARINT((%s << 1) ^ (%s >> %d)))' % (value, value, bits), indent)
+    elif ttype == TType.DOUBLE:
+      self.emit('append(P_d(%s))' % value, indent)
+    elif ttype == TType.STRING:
+      self.emit('append(VARINT(len(%s)))' % value, indent)
+      self.emit('append(%s)' % value, indent)
+    else:
+      self.writeBody(ttype, args, value, indent)
+
+  def writeBody(self, ttype, args, value, indent):
+    if ttype == TType.STRUCT:
+      self.emit('ENC[%s](%s, append)' % (self.klass(args[0]), value), indent)
+    elif ttype in (TType.LIST, TType.SET):
+      ctype = TCompactProtocol.CTYPES[args[0]]
+      size = self.var('n')
+      self.emit('%s = len(%s)' % (size, value), indent)
+      self.emit('append(BYTES[%s << 4 | %d] if %s < 15 else BYTES[%d] + VARINT(%s))' % (
+        size, ctype, size, 0xf0 | ctype, size), indent)
+      item = self.var('e')
+      self.emit('for %s in %s:' % (item, value), indent)
+      self.writeValue(args[0], args[1], item, indent + 1)
+    elif ttype == TType.MAP:
+      types = TCompactProtocol.CTYPES[args[0]] << 4 | TCompactProtocol.CTYPES[args[2]]
+      self.emit("append(VARINT(len(%s)) + BYTES[%d] if %s else '\\x00')" % (value, types, value), indent)
+      key, item = self.var('k'), self.var('v')
+      self.emit('for %s, %s in %s.items():' % (key, item, value), indent)
+      self.writeValue(args[0], args[1], key, indent + 1)
+      self.writeValue(args[2], args[3], item, indent + 1)
+    else:
+      raise TypeError('no codec for thrift type %r' % ttype)
+
+  def encoder(self):
+    self.emit('def encode(self, append):', 0)
+    self.emit('last = 0', 1)
+    for spec in self.cls.thrift_spec:
+      if spec is None:
+        continue
+      fid, ttype, name, args = spec[:4]
+      self.emit('value = self.%s' % name, 1)
+      self.emit('if value is not None:', 1)
+      if ttype == TType.BOOL:
+        self.emit('append((%s if value else %s)[last])' % (
+          self.header(fid, TCompactProtocol.CompactType.TRUE),
+          self.header(fid, TCompactProtocol.CompactType.FALSE)), 2)
+      else:
+        self.emit('append(%s[last])' % self.header(fid, TCompactProtocol.CTYPES[ttype]), 2)
+        self.writeValue(ttype, args, 'value', 2)
+      self.emit('last = %d' % fid, 2)
+    self.emit("append('\\x00')", 1)
+    return self.build('encode')
+
+
+class _Codecs(dict):
+  """Compiles a codec on first use of a class."""
+
+  def __init__(self, kind, compiler=_Compiler):
+    dict.__init__(self)
+    self.kind = kind
+    self.compiler = compiler
+
+  def __missing__(self, cls):
+    codec = getattr(self.compiler(cls), self.kind)()
+    self[cls] = codec
+    return codec
+
+decoders = _Codecs('decoder')
+encoders = _Codecs('encoder')
+compactDecoders = _Codecs('decoder', _CompactCompiler)
+compactEncoders = _Codecs('encoder', _CompactCompiler)
+
+
+def reader(trans):
+  """Returns a readAll(sz) function for trans.
+
+  For C readable transports it reads straight from cstringio_buf and only
+  goes through the transport to refill it, like fastbinary does. Those
+  readers also get a skip(ttype) attribute used for lazy fields.
+  """
+  if not isinstance(trans, TTransport.CReadableTransport):
+    return trans.readAll
+  state = [trans.cstringio_buf, None]
+
+  def readAll(sz):
+    data = state[0].read(sz)
+    if len(data) < sz:
+      buf = trans.cstringio_buf
+      if buf is not state[0]:
+        # the transport moved on to a new buffer, e.g. in iprot.skip()
+        state[:] = [buf, None]
+        return data + readAll(sz - len(data))
+      state[:] = [trans.cstringio_refill(data, sz), None]
+      data = state[0].read(sz)
+    return data
+
+  def skip(ttype):
+    """Skips a value in the current buffer, returns where it is.
+    Returns None when the value does not end in this buffer."""
+    buf = state[0]
+    if buf is not trans.cstringio_buf:
+      return None
+    if state[1] is None:
+      start = buf.tell()
+      buf.seek(0, 2)
+      state[1] = buf.tell()
+      buf.seek(start)
+    start = buf.tell()
+    try:
+      _skipValue(buf, ttype)
+      if buf.tell() > state[1]:
+        raise EOFError()
+    except EOFError:
+      buf.seek(start)
+      return None
+    return _Raw(buf, start, buf.tell())
+
+  def varint():
+    buf = state[0]
+    first = buf.read(1)
+    if first and first < '\x80':
+      return ord(first)
+    # scan the rest of the value in the buffer instead of reading it byte by byte
+    data = first + buf.read(9)
+    n = shift = 0
+    for i in xrange(len(data)):
+      byte = ord(data[i])
+      n |= (byte & 0x7f) << shift
+      if byte < 0x80:
+        buf.seek(i + 1 - len(data), 1)
+        return n
+      shift += 7
+    # the value goes on in the next buffer
+    buf.seek(-len(data), 1)
+    return TCompactProtocol.decodeVarint(readAll)
+
+  readAll.skip = skip
+  readAll.varint = varint
+  return readAll
+
+
+def varintReader(readAll):
+  """Returns a function reading one unsigned varint through readAll."""
+  varint = getattr(readAll, 'varint', None)
+  if varint is None:
+    varint = lambda: TCompactProtocol.decodeVarint(readAll)
+  return varint
+
+
+def _take(buf, sz):
+  data = buf.read(sz)
+  if len(data) < sz:
+    raise EOFError()
+  return data
+
+_unpack_i = struct.Struct('!i').unpack
+_unpack_bi = struct.Struct('!bi').unpack
+_unpack_bbi = struct.Struct('!bbi').unpack
+
+
+def _skipStruct(buf):
+  # the most common field types are handled inline, this runs per field
+  read = buf.read
+  seek = buf.seek
+  while True:
+    ftype = read(1)
+    if ftype == '\x00':
+      return
+    if not ftype:
+      raise EOFError()
+    ftype = ord(ftype)
+    seek(2, 1)
+    if ftype == TType.STRING:
+      seek(_unpack_i(_take(buf, 4))[0], 1)
+    elif ftype in SIZES:
+      seek(SIZES[ftype], 1)
+    else:
+      _skipValue(buf, ftype)
+
+
+def _skipValue(buf, ttype):
+  """Moves buf past a value without decoding it."""
+  if ttype in SIZES:
+    buf.seek(SIZES[ttype], 1)
+  elif ttype == TType.STRING:
+    buf.seek(_unpack_i(_take(buf, 4))[0], 1)
+  elif ttype == TType.STRUCT:
+    _skipStruct(buf)
+  elif ttype in (TType.LIST, TType.SET):
+    etype, size = _unpack_bi(_take(buf, 5))
+    if etype in SIZES:
+      buf.seek(SIZES[etype] * size, 1)
+    elif etype == TType.STRUCT:
+      for i in xrange(size):
+        _skipStruct(buf)
+    else:
+      for i in xrange(size):
+        _skipValue(buf, etype)
+  elif ttype == TType.MAP:
+    ktype, vtype, size = _unpack_bbi(_take(buf, 6))
+    for i in xrange(size):
+      _skipValue(buf, ktype)
+      _skipValue(buf, vtype)
+  else:
+    raise EOFError()
+
+
+_unpack_le_d = struct.Struct('<d').unpack
+_pack_le_d = struct.Struct('<d').pack
+
+
+def _readListSize(readAll, varint):
+  size = ord(readAll(1)) >> 4
+  if size == 15:
+    size = varint()
+  return size
+
+
+def _readMapSize(readAll, varint):
+  size = varint()
+  if size:
+    readAll(1)
+  return size
+
+
+def _skipCompact(readAll, varint, ctype, element=False):
+  """Reads past a compact value, bool fields have no value bytes."""
+  CompactType = TCompactProtocol.CompactType
+  if ctype in (CompactType.TRUE, CompactType.FALSE):
+    if element:
+      readAll(1)
+  elif ctype == CompactType.BYTE:
+    readAll(1)
+  elif ctype in (CompactType.I16, CompactType.I32, CompactType.I64):
+    varint()
+  elif ctype == CompactType.DOUBLE:
+    readAll(8)
+  elif ctype == CompactType.BINARY:
+    readAll(varint())
+  elif ctype in (CompactType.LIST, CompactType.SET):
+    sizeType = ord(readAll(1))
+    size = sizeType >> 4
+    if size == 15:
+      size = varint()
+    for i in xrange(size):
+      _skipCompact(readAll, varint, sizeType & 0x0f, True)
+  elif ctype == CompactType.MAP:
+    size = varint()
+    if size:
+      types = ord(readAll(1))
+      for i in xrange(size):
+        _skipCompact(readAll, varint, types >> 4, True)
+        _skipCompact(readAll, varint, types & 0x0f, True)
+  elif ctype == CompactType.STRUCT:
+    while True:
+      byte = ord(readAll(1))
+      if byte & 0x0f == 0:
+        return
+      if byte <= 0x0f:
+        varint()
+      _skipCompact(readAll, varint, byte & 0x0f)
+  else:
+    raise TProtocolException(TProtocolException.INVALID_DATA,
+                             'unknown compact type %d' % ctype)
+
+
+def _skip(readAll, ttype):
+  skip = getattr(readAll, 'skip', None)
+  return skip(ttype) if skip is not None else None
+
+
+class _Raw(object):
+  """Position of a lazy field's value in a reply buffer."""
+
+  __slots__ = ('buf', 'start', 'end')
+
+  # the buffer may still be shared with its transport
+  lock = threading.Lock()
+
+  def __init__(self, buf, start, end):
+    self.buf = buf
+    self.start = start
+    self.end = end
+
+  def load(self, decode):
+    with self.lock:
+      pos = self.buf.tell()
+      self.buf.seek(self.start)
+      data = self.buf.read(self.end - self.start)
+      self.buf.seek(pos)
+    trans = TTransport.TMemoryBuffer(data)
+    return decode(TBinaryProtocol.TBinaryProtocol(trans), reader(trans))
+
+
+class _LazyField(object):
+  """Decodes a field recorded as _Raw on first access."""
+
+  def __init__(self, name, decode):
+    self.name = name
+    self.decode = decode
+
+  def __get__(self, obj, cls):
+    if obj is None:
+      return self
+    value = obj.__dict__.get(self.name)
+    if value.__class__ is _Raw:
+      value = obj.__dict__[self.name] = value.load(self.decode)
+    return value
+
+  def __set__(self, obj, value):
+    obj.__dict__[self.name] = value
+
+
+def _loadAll(obj):
+  for name in obj._lazyFields:
+    getattr(obj, name)
+
+
+def _plain(cls, fields):
+  """Unpickles a lazy struct as its generated class."""
+  obj = cls.__new__(cls)
+  obj.__dict__.update(fields)
+  return obj
+
+
+def lazy(cls, fields):
+  """Decodes the named fields of cls only when they are first accessed.
+
+  Structs of cls read by the compiled codecs become instances of a
+  subclass whose lazy fields keep the position of their value in the
+  reply buffer until used. The subclass compares, prints and pickles like
+  cls, so callers don't see the difference. Pass no fields to decode cls eagerly again.
+  """
+  lazyClasses.pop(cls, None)
+  if fields:
+    def __eq__(self, other):
+      if not isinstance(other, cls):
+        return False
+      _loadAll(self)
+      if hasattr(other, '_lazyFields'):
+        _loadAll(other)
+      return self.__dict__ == other.__dict__
+
+    def __repr__(self):
+      _loadAll(self)
+      L = ['%s=%r' % (key, value) for key, value in self.__dict__.iteritems()]
+      return '%s(%s)' % (cls.__name__, ', '.join(L))
+
+    def __reduce_ex__(self, protocol):
+      _loadAll(self)
+      return (_plain, (cls, dict(self.__dict__)))
+
+    namespace = {
+      '_lazyFields': frozenset(fields),
+      '__eq__': __eq__,
+      '__repr__': __repr__,
+      '__reduce_ex__': __reduce_ex__,
+    }
+    specs = dict((spec[2], spec) for spec in cls.thrift_spec if spec is not None)
+    for name in fields:
+      fid, ttype, name, args = specs[name][:4]
+      namespace[name] = _LazyField(name, _Compiler(cls).valueDecoder(ttype, args))
+    lazyClasses[cls] = type('Lazy' + cls.__name__, (cls,), namespace)
+  # decoders of the enclosing structs have to pick up the new class
+  decoders.clear()
+
+
+def decode(obj, iprot):
+  """Reads obj from iprot with the codec compiled for its class."""
+  return decoders[obj.__class__](obj, iprot, reader(iprot.trans))
+
+
+def encode(obj, oprot):
+  """Writes obj to oprot with the codec compiled for its class."""
+  encoders[obj.__class__](obj, oprot)
+
+
+def _accelerated(prot):
+  return (fastbinary is not None and
+          prot.__class__ is TBinaryProtocol.TBinaryProtocolAccelerated)
+
+
+def _read(generated):
+  def read(self, iprot):
+    if not enabled:
+      generated(self, iprot)
+    elif iprot.__class__ is TCompactProtocol.TCompactProtocol:
+      readAll = reader(iprot.trans)
+      compactDecoders[self.__class__](self, iprot, readAll, varintReader(readAll))
+    elif (iprot.__class__ in PROTOCOLS and
+          not (_accelerated(iprot) and isinstance(iprot.trans, TTransport.CReadableTransport))):
+      decoders[self.__class__](self, iprot, reader(iprot.trans))
+    else:
+      generated(self, iprot)
+  read.__doc__ = generated.__doc__
+  return read
+
+
+def _write(generated):
+  def write(self, oprot):
+    if not enabled:
+      generated(self, oprot)
+    elif oprot.__class__ is TCompactProtocol.TCompactProtocol:
+      out = []
+      compactEncoders[self.__class__](self, out.append)
+      oprot.trans.write(''.join(out))
+    elif oprot.__class__ in PROTOCOLS and not _accelerated(oprot):
+      encoders[self.__class__](self, oprot)
+    else:
+      generated(self, oprot)
+  write.__doc__ = generated.__doc__
+  return write
+
+
+def install(namespace):
+  """Routes read() and write() of the generated structs in namespace
+  (a module's globals()) through the compiled codecs."""
+  for obj in namespace.values():
+    if not isinstance(obj, type) or obj.__dict__.get('thrift_spec') is None:
+      continue
+    if 'read' in obj.__dict__:
+      obj.read = _read(obj.__dict__['read'])
+    if 'write' in obj.__dict__:
+      obj.write = _write(obj.__dict__['write'])
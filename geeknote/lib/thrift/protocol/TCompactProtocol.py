@@ -18,7 +18,7 @@
 #
 
 from TProtocol import *
-from struct import pack, unpack
+from struct import Struct
 
 __all__ = ['TCompactProtocol', 'TCompactProtocolFactory']
 
@@ -32,15 +32,14 @@ CONTAINER_READ = 6
 VALUE_READ = 7
 BOOL_READ = 8
 
-def make_helper(v_from, container):
-  def helper(func):
-    def nested(self, *args, **kwargs):
-      assert self.state in (v_from, container), (self.state, v_from, container)
-      return func(self, *args, **kwargs)
-    return nested
-  return helper
-writer = make_helper(VALUE_WRITE, CONTAINER_WRITE)
-reader = make_helper(VALUE_READ, CONTAINER_READ)
+# one character strings by value, for header bytes and small varints
+BYTES = tuple(chr(i) for i in range(256))
+
+_pack_b = Struct('!b').pack
+_unpack_b = Struct('!b').unpack
+# doubles are little endian in the compact protocol
+_pack_d = Struct('<d').pack
+_unpack_d = Struct('<d').unpack
 
 def makeZigZag(n, bits):
   return (n << 1) ^ (n >> (bits - 1))
@@ -48,28 +47,38 @@ def makeZigZag(n, bits):
 def fromZigZag(n):
   return (n >> 1) ^ -(n & 1)
 
-def writeVarint(trans, n):
-  out = []
+def encodeVarint(n):
+  """Returns the varint bytes of an unsigned n as one string."""
+  if 0 <= n < 0x80:
+    return BYTES[n]
+  if 0 <= n < 0x4000:
+    return BYTES[n & 0x7f | 0x80] + BYTES[n >> 7]
+  out = bytearray()
+  while n > 0x7f:
+    out.append(n & 0x7f | 0x80)
+    n >>= 7
+  out.append(n)
+  return str(out)
+
+def decodeVarint(readAll):
+  byte = ord(readAll(1))
+  if byte < 0x80:
+    return byte
+  result = byte & 0x7f
+  shift = 7
   while True:
-    if n & ~0x7f == 0:
-      out.append(n)
-      break
-    else:
-      out.append((n & 0xff) | 0x80)
-      n = n >> 7
-  trans.write(''.join(map(chr, out)))
-
-def readVarint(trans):
-  result = 0
-  shift = 0
-  while True:
-    x = trans.readAll(1)
-    byte = ord(x)
+    byte = ord(readAll(1))
     result |= (byte & 0x7f) << shift
-    if byte >> 7 == 0:
+    if byte < 0x80:
       return result
     shift += 7
 
+def writeVarint(trans, n):
+  trans.write(encodeVarint(n))
+
+def readVarint(trans):
+  return decodeVarint(trans.readAll)
+
 class CompactType:
   STOP = 0x00
   TRUE = 0x01
@@ -85,29 +94,38 @@ class CompactType:
   MAP = 0x0B
   STRUCT = 0x0C
 
-CTYPES = {TType.STOP: CompactType.STOP,
-          TType.BOOL: CompactType.TRUE, # used for collection
-          TType.BYTE: CompactType.BYTE,
-          TType.I16: CompactType.I16,
-          TType.I32: CompactType.I32,
-          TType.I64: CompactType.I64,
-          TType.DOUBLE: CompactType.DOUBLE,
-          TType.STRING: CompactType.BINARY,
-          TType.STRUCT: CompactType.STRUCT,
-          TType.LIST: CompactType.LIST,
-          TType.SET: CompactType.SET,
-          TType.MAP: CompactType.MAP
-          }
-
-TTYPES = {}
-for k, v in CTYPES.items():
-  TTYPES[v] = k
+# TType -> CompactType, indexed by TType
+CTYPES = [None] * 16
+CTYPES[TType.STOP] = CompactType.STOP
+CTYPES[TType.BOOL] = CompactType.TRUE # used for collection
+CTYPES[TType.BYTE] = CompactType.BYTE
+CTYPES[TType.I16] = CompactType.I16
+CTYPES[TType.I32] = CompactType.I32
+CTYPES[TType.I64] = CompactType.I64
+CTYPES[TType.DOUBLE] = CompactType.DOUBLE
+CTYPES[TType.STRING] = CompactType.BINARY
+CTYPES[TType.STRUCT] = CompactType.STRUCT
+CTYPES[TType.LIST] = CompactType.LIST
+CTYPES[TType.SET] = CompactType.SET
+CTYPES[TType.MAP] = CompactType.MAP
+CTYPES = tuple(CTYPES)
+
+# CompactType -> TType, indexed by CompactType
+TTYPES = [None] * 16
+for ttype, ctype in enumerate(CTYPES):
+  if ctype is not None:
+    TTYPES[ctype] = ttype
 TTYPES[CompactType.FALSE] = TType.BOOL
-del k
-del v
+TTYPES = tuple(TTYPES)
+del ttype, ctype
 
 class TCompactProtocol(TProtocolBase):
-  "Compact implementation of the Thrift protocol driver."
+  """Compact implementation of the Thrift protocol driver.
+
+  Field headers and small varints are looked up in BYTES, larger varints
+  are built in one pass and written with a single call. Value methods
+  don't assert the protocol state: only bools depend on it.
+  """
 
   PROTOCOL_ID = 0x82
   VERSION = 1
@@ -124,15 +142,12 @@ class TCompactProtocol(TProtocolBase):
     self.__structs = []
     self.__containers = []
 
-  def __writeVarint(self, n):
-    writeVarint(self.trans, n)
-
   def writeMessageBegin(self, name, type, seqid):
     assert self.state == CLEAR
-    self.__writeUByte(self.PROTOCOL_ID)
-    self.__writeUByte(self.VERSION | (type << self.TYPE_SHIFT_AMOUNT))
-    self.__writeVarint(seqid)
-    self.__writeString(name)
+    self.trans.write(BYTES[self.PROTOCOL_ID] +
+                     BYTES[self.VERSION | (type << self.TYPE_SHIFT_AMOUNT)] +
+                     encodeVarint(seqid) + encodeVarint(len(name)))
+    self.trans.write(name)
     self.state = VALUE_WRITE
 
   def writeMessageEnd(self):
@@ -150,15 +165,14 @@ class TCompactProtocol(TProtocolBase):
     self.state, self.__last_fid = self.__structs.pop()
 
   def writeFieldStop(self):
-    self.__writeByte(0)
+    self.trans.write('\x00')
 
   def __writeFieldHeader(self, type, fid):
     delta = fid - self.__last_fid
     if 0 < delta <= 15:
-      self.__writeUByte(delta << 4 | type)
+      self.trans.write(BYTES[delta << 4 | type])
     else:
-      self.__writeByte(type)
-      self.__writeI16(fid)
+      self.trans.write(BYTES[type] + encodeVarint(makeZigZag(fid, 16)))
     self.__last_fid = fid
 
   def writeFieldBegin(self, name, type, fid):
@@ -174,25 +188,12 @@ class TCompactProtocol(TProtocolBase):
     assert self.state in (VALUE_WRITE, BOOL_WRITE), self.state
     self.state = FIELD_WRITE
 
-  def __writeUByte(self, byte):
-    self.trans.write(pack('!B', byte))
-
-  def __writeByte(self, byte):
-    self.trans.write(pack('!b', byte))
-
-  def __writeI16(self, i16):
-    self.__writeVarint(makeZigZag(i16, 16))
-
-  def __writeSize(self, i32):
-    self.__writeVarint(i32)
-
   def writeCollectionBegin(self, etype, size):
     assert self.state in (VALUE_WRITE, CONTAINER_WRITE), self.state
     if size <= 14:
-      self.__writeUByte(size << 4 | CTYPES[etype])
+      self.trans.write(BYTES[size << 4 | CTYPES[etype]])
     else:
-      self.__writeUByte(0xf0 | CTYPES[etype])
-      self.__writeSize(size)
+      self.trans.write(BYTES[0xf0 | CTYPES[etype]] + encodeVarint(size))
     self.__containers.append(self.state)
     self.state = CONTAINER_WRITE
   writeSetBegin = writeCollectionBegin
@@ -201,10 +202,9 @@ class TCompactProtocol(TProtocolBase):
   def writeMapBegin(self, ktype, vtype, size):
     assert self.state in (VALUE_WRITE, CONTAINER_WRITE), self.state
     if size == 0:
-      self.__writeByte(0)
+      self.trans.write('\x00')
     else:
-      self.__writeSize(size)
-      self.__writeUByte(CTYPES[ktype] << 4 | CTYPES[vtype])
+      self.trans.write(encodeVarint(size) + BYTES[CTYPES[ktype] << 4 | CTYPES[vtype]])
     self.__containers.append(self.state)
     self.state = CONTAINER_WRITE
 
@@ -216,48 +216,41 @@ class TCompactProtocol(TProtocolBase):
   writeListEnd = writeCollectionEnd
 
   def writeBool(self, bool):
+    ctype = CompactType.TRUE if bool else CompactType.FALSE
     if self.state == BOOL_WRITE:
-        if bool:
-            ctype = CompactType.TRUE
-        else:
-            ctype = CompactType.FALSE
-        self.__writeFieldHeader(ctype, self.__bool_fid)
+      self.__writeFieldHeader(ctype, self.__bool_fid)
     elif self.state == CONTAINER_WRITE:
-       if bool:
-           self.__writeByte(CompactType.TRUE)
-       else:
-           self.__writeByte(CompactType.FALSE)
+      self.trans.write(BYTES[ctype])
     else:
       raise AssertionError, "Invalid state in compact protocol"
 
-  writeByte = writer(__writeByte)
-  writeI16 = writer(__writeI16)
+  def writeByte(self, byte):
+    self.trans.write(_pack_b(byte))
+
+  def writeI16(self, i16):
+    self.trans.write(encodeVarint((i16 << 1) ^ (i16 >> 15)))
 
-  @writer
   def writeI32(self, i32):
-    self.__writeVarint(makeZigZag(i32, 32))
+    self.trans.write(encodeVarint((i32 << 1) ^ (i32 >> 31)))
 
-  @writer
   def writeI64(self, i64):
-    self.__writeVarint(makeZigZag(i64, 64))
+    self.trans.write(encodeVarint((i64 << 1) ^ (i64 >> 63)))
 
-  @writer
   def writeDouble(self, dub):
-    self.trans.write(pack('!d', dub))
+    self.trans.write(_pack_d(dub))
 
-  def __writeString(self, s):
-    self.__writeSize(len(s))
+  def writeString(self, s):
+    self.trans.write(encodeVarint(len(s)))
     self.trans.write(s)
-  writeString = writer(__writeString)
 
   def readFieldBegin(self):
     assert self.state == FIELD_READ, self.state
-    type = self.__readUByte()
+    type = ord(self.trans.readAll(1))
     if type & 0x0f == TType.STOP:
       return (None, 0, 0)
     delta = type >> 4
     if delta == 0:
-      fid = self.__readI16()
+      fid = fromZigZag(readVarint(self.trans))
     else:
       fid = self.__last_fid + delta
     self.__last_fid = fid
@@ -270,46 +263,32 @@ class TCompactProtocol(TProtocolBase):
       self.__bool_value = False
     else:
       self.state = VALUE_READ
-    return (None, self.__getTType(type), fid)
+    return (None, TTYPES[type], fid)
 
   def readFieldEnd(self):
     assert self.state in (VALUE_READ, BOOL_READ), self.state
     self.state = FIELD_READ
 
-  def __readUByte(self):
-    result, = unpack('!B', self.trans.readAll(1))
-    return result
-
-  def __readByte(self):
-    result, = unpack('!b', self.trans.readAll(1))
-    return result
-
-  def __readVarint(self):
-    return readVarint(self.trans)
-
-  def __readZigZag(self):
-    return fromZigZag(self.__readVarint())
-
   def __readSize(self):
-    result = self.__readVarint()
+    result = readVarint(self.trans)
     if result < 0:
       raise TException("Length < 0")
     return result
 
   def readMessageBegin(self):
     assert self.state == CLEAR
-    proto_id = self.__readUByte()
+    proto_id = ord(self.trans.readAll(1))
     if proto_id != self.PROTOCOL_ID:
       raise TProtocolException(TProtocolException.BAD_VERSION,
           'Bad protocol id in the message: %d' % proto_id)
-    ver_type = self.__readUByte()
+    ver_type = ord(self.trans.readAll(1))
     type = (ver_type & self.TYPE_MASK) >> self.TYPE_SHIFT_AMOUNT
     version = ver_type & self.VERSION_MASK
     if version != self.VERSION:
       raise TProtocolException(TProtocolException.BAD_VERSION,
           'Bad version: %d (expect %d)' % (version, self.VERSION))
-    seqid = self.__readVarint()
-    name = self.__readString()
+    seqid = readVarint(self.trans)
+    name = self.readString()
     return (name, type, seqid)
 
   def readMessageEnd(self):
@@ -328,9 +307,9 @@ class TCompactProtocol(TProtocolBase):
 
   def readCollectionBegin(self):
     assert self.state in (VALUE_READ, CONTAINER_READ), self.state
-    size_type = self.__readUByte()
+    size_type = ord(self.trans.readAll(1))
     size = size_type >> 4
-    type = self.__getTType(size_type)
+    type = TTYPES[size_type & 0x0f]
     if size == 15:
       size = self.__readSize()
     self.__containers.append(self.state)
@@ -344,9 +323,9 @@ class TCompactProtocol(TProtocolBase):
     size = self.__readSize()
     types = 0
     if size > 0:
-      types = self.__readUByte()
-    vtype = self.__getTType(types)
-    ktype = self.__getTType(types >> 4)
+      types = ord(self.trans.readAll(1))
+    vtype = TTYPES[types & 0x0f]
+    ktype = TTYPES[types >> 4]
     self.__containers.append(self.state)
     self.state = CONTAINER_READ
     return (ktype, vtype, size)
@@ -360,31 +339,25 @@ class TCompactProtocol(TProtocolBase):
 
   def readBool(self):
     if self.state == BOOL_READ:
-      return self.__bool_value == CompactType.TRUE
+      return self.__bool_value
     elif self.state == CONTAINER_READ:
-      return self.__readByte() == CompactType.TRUE
+      return self.trans.readAll(1) == BYTES[CompactType.TRUE]
     else:
       raise AssertionError, "Invalid state in compact protocol: %d" % self.state
 
-  readByte = reader(__readByte)
-  __readI16 = __readZigZag
-  readI16 = reader(__readZigZag)
-  readI32 = reader(__readZigZag)
-  readI64 = reader(__readZigZag)
+  def readByte(self):
+    return _unpack_b(self.trans.readAll(1))[0]
 
-  @reader
-  def readDouble(self):
-    buff = self.trans.readAll(8)
-    val, = unpack('!d', buff)
-    return val
+  def readI16(self):
+    return fromZigZag(readVarint(self.trans))
+  readI32 = readI16
+  readI64 = readI16
 
-  def __readString(self):
-    len = self.__readSize()
-    return self.trans.readAll(len)
-  readString = reader(__readString)
+  def readDouble(self):
+    return _unpack_d(self.trans.readAll(8))[0]
 
-  def __getTType(self, byte):
-    return TTYPES[byte & 0x0f]
+  def readString(self):
+    return self.trans.readAll(self.__readSize())
 
 
 class TCompactProtocolFactory:
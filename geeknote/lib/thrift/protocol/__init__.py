@@ -18,3 +18,25 @@
 #
 
 __all__ = ['TProtocol', 'TBinaryProtocol', 'fastbinary', 'TBase']
+
+def _probe_fastbinary():
+  """Import the fastbinary C module and check that it can encode.
+
+  Returns (module, None) when the accelerated path is usable and
+  (None, reason) otherwise.  The generated code imports fastbinary
+  from this package, so a module that fails the probe is never used."""
+  try:
+    from thrift.protocol import fastbinary
+    from thrift.Thrift import TType
+
+    class Probe(object):
+      thrift_spec = (None, (1, TType.I32, 'value', None, None, ), )
+      value = 1
+
+    if fastbinary.encode_binary(Probe(), (Probe, Probe.thrift_spec)) != '\x08\x00\x01\x00\x00\x00\x01\x00':
+      return None, 'fastbinary produced unexpected output'
+    return fastbinary, None
+  except Exception, e:
+    return None, str(e)
+
+fastbinary, fastbinary_error = _probe_fastbinary()
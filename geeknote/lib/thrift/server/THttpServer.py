@@ -18,6 +18,7 @@
 #
 
 import BaseHTTPServer
+import zlib
 
 from thrift.server import TServer
 from thrift.transport import TTransport
@@ -43,11 +44,14 @@ class THttpServer(TServer.TServer):
 
   def __init__(self, processor, server_address,
       inputProtocolFactory, outputProtocolFactory = None,
-      server_class = BaseHTTPServer.HTTPServer):
+      server_class = BaseHTTPServer.HTTPServer, compress = False):
     """Set up protocol factories and HTTP server.
 
     See BaseHTTPServer for server_address.
-    See TServer for protocol factories."""
+    See TServer for protocol factories.
+
+    gzip/deflate encoded requests are always accepted, replies are
+    gzipped for clients which accept it only when compress is set."""
 
     if outputProtocolFactory is None:
       outputProtocolFactory = inputProtocolFactory
@@ -58,11 +62,20 @@ class THttpServer(TServer.TServer):
     thttpserver = self
 
     class RequestHander(BaseHTTPServer.BaseHTTPRequestHandler):
+      # keep the connection open between calls, as a real endpoint would
+      protocol_version = 'HTTP/1.1'
+      # send headers and reply in one segment
+      wbufsize = -1
+      disable_nagle_algorithm = True
+
       def do_POST(self):
         # Don't care about the request path.
         itrans = TTransport.TFileObjectTransport(self.rfile)
         otrans = TTransport.TFileObjectTransport(self.wfile)
         itrans = TTransport.TBufferedTransport(itrans, int(self.headers['Content-Length']))
+        if self.headers.get('content-encoding', '').lower() in ('gzip', 'deflate'):
+          body = self.rfile.read(int(self.headers['Content-Length']))
+          itrans = TTransport.TMemoryBuffer(zlib.decompress(body, 32 + zlib.MAX_WBITS))
         otrans = TTransport.TMemoryBuffer()
         iprot = thttpserver.inputProtocolFactory.getProtocol(itrans)
         oprot = thttpserver.outputProtocolFactory.getProtocol(otrans)
@@ -71,11 +84,21 @@ class THttpServer(TServer.TServer):
         except ResponseException, exn:
           exn.handler(self)
         else:
+          reply = otrans.getvalue()
           self.send_response(200)
           self.send_header("content-type", "application/x-thrift")
+          if thttpserver.compress and 'gzip' in self.headers.get('accept-encoding', ''):
+            zcomp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            reply = zcomp.compress(reply) + zcomp.flush()
+            self.send_header("content-encoding", "gzip")
+          self.send_header("content-length", str(len(reply)))
           self.end_headers()
-          self.wfile.write(otrans.getvalue())
+          self.wfile.write(reply)
+
+      def log_message(self, format, *args):
+        pass
 
+    self.compress = compress
     self.httpd = server_class(server_address, RequestHander)
 
   def serve(self):
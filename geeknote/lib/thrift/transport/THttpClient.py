@@ -18,18 +18,125 @@
 #
 
 from TTransport import *
+from TZlibTransport import TZlibTransport
 from cStringIO import StringIO
 
 import urlparse
 import httplib
 import warnings
+import select
 import socket
+import threading
+import zlib
 
-class THttpClient(TTransportBase):
+class THttpConnectionPool(object):
 
-  """Http implementation of TTransport base."""
+  """Bounded pool of persistent HTTP/1.1 connections.
 
-  def __init__(self, uri_or_host, port=None, path=None):
+  Idle connections are kept per (scheme, host, port) so that consecutive
+  RPCs reuse an already established TCP (and TLS) session instead of paying
+  for a new handshake on every call.  At most maxsize idle connections are
+  kept for each host; extra connections are closed when released.  A pool
+  with maxsize=0 keeps nothing and behaves like one connection per request.
+
+  The pool is safe to share between threads."""
+
+  DEFAULT_MAXSIZE = 4
+
+  def __init__(self, maxsize=DEFAULT_MAXSIZE):
+    self.maxsize = maxsize
+    self.__idle = {}
+    self.__lock = threading.Lock()
+
+  def acquire(self, scheme, host, port):
+    """Return an idle connection to the host or a new unconnected one."""
+    key = (scheme, host, port)
+    while True:
+      self.__lock.acquire()
+      try:
+        idle = self.__idle.get(key)
+        conn = idle.pop() if idle else None
+      finally:
+        self.__lock.release()
+      if conn is None:
+        break
+      if not _dropped(conn):
+        return conn
+      conn.close()
+
+    if scheme == 'https':
+      return httplib.HTTPSConnection(host, port)
+    return httplib.HTTPConnection(host, port)
+
+  def release(self, scheme, host, port, conn):
+    """Give a connection back to the pool, closing it if the pool is full."""
+    if conn.sock is not None:
+      key = (scheme, host, port)
+      self.__lock.acquire()
+      try:
+        idle = self.__idle.setdefault(key, [])
+        if len(idle) < self.maxsize:
+          idle.append(conn)
+          return
+      finally:
+        self.__lock.release()
+    conn.close()
+
+  def clear(self):
+    """Close every idle connection."""
+    self.__lock.acquire()
+    try:
+      idle, self.__idle = self.__idle, {}
+    finally:
+      self.__lock.release()
+    for conns in idle.values():
+      for conn in conns:
+        conn.close()
+
+def _dropped(conn):
+  """Whether the server closed an idle connection, or sent on it unasked."""
+  try:
+    return bool(select.select([conn.sock], [], [], 0)[0])
+  except (select.error, socket.error, ValueError):
+    return True
+
+class THttpClient(TTransportBase, CReadableTransport):
+
+  """Http implementation of TTransport base.
+
+  Requests are sent over HTTP/1.1 and the connection is kept alive between
+  calls.  Pass a THttpConnectionPool to share idle connections between
+  several clients talking to the same host.
+
+  Replies are read through a fixed-size buffer which also implements the
+  CReadableTransport interface, so TBinaryProtocolAccelerated can decode
+  them with the fastbinary C module.
+
+  With compress=True the client advertises gzip/deflate, decompresses
+  encoded replies incrementally through a TZlibTransport, and gzips
+  request bodies of at least COMPRESS_MIN_SIZE bytes.  The server must
+  accept Content-Encoding on requests, so this is opt-in.
+
+  bytes_out/bytes_in count payload bytes, bytes_out_comp/bytes_in_comp
+  the bytes that actually went over the wire, retries the requests
+  repeated on a fresh connection.  A request is only repeated when it
+  could not be sent on a reused connection: once it is sent the server
+  may have acted on it, and Thrift calls like createNote are not
+  idempotent.
+
+  Timeouts are set on each instance and applied to its own socket, the
+  process wide socket default timeout is never touched.  An instance is
+  not thread safe, but one THttpClient (and one Client on top of it) per
+  thread is: instances only share the THttpConnectionPool, which is
+  locked, and a connection is used by a single instance at a time."""
+
+  DEFAULT_BUFFER = 4096
+
+  # smaller request bodies are not worth compressing
+  COMPRESS_MIN_SIZE = 1024
+
+  def __init__(self, uri_or_host, port=None, path=None, pool=None, rbuf_size=DEFAULT_BUFFER,
+               compress=False, compresslevel=6):
     """THttpClient supports two different types constructor parameters.
 
     THttpClient(host, port, path) - deprecated
@@ -56,71 +163,217 @@ class THttpClient(TTransportBase):
       self.path = parsed.path
       if parsed.query:
         self.path += '?%s' % parsed.query
+    if pool is None:
+      pool = THttpConnectionPool(maxsize=1)
+    self.__pool = pool
     self.__wbuf = StringIO()
+    self.__rbuf = StringIO('')
+    self.__rbuf_size = rbuf_size
     self.__http = None
-    self.__timeout = None
+    self.__response = None
+    self.__reader = None
+    self.__connect_timeout = None
+    self.__read_timeout = None
+    self.compress = compress
+    self.compresslevel = compresslevel
+    self._init_stats()
+
+  def _init_stats(self):
+    self.bytes_out = 0
+    self.bytes_out_comp = 0
+    self.bytes_in = 0
+    self.bytes_in_comp = 0
+    self.retries = 0
 
   def open(self):
-    if self.scheme == 'http':
-      self.__http = httplib.HTTP(self.host, self.port)
-    else:
-      self.__http = httplib.HTTPS(self.host, self.port)
+    if self.__http is None:
+      self.__http = self.__pool.acquire(self.scheme, self.host, self.port)
 
   def close(self):
-    self.__http.close()
-    self.__http = None
+    self.__reader = None
+    if self.__response is not None:
+      self.__response.close()
+      self.__response = None
+    if self.__http is not None:
+      self.__http.close()
+      self.__http = None
 
   def isOpen(self):
     return self.__http != None
 
   def setTimeout(self, ms):
-    if not hasattr(socket, 'getdefaulttimeout'):
-      raise NotImplementedError
+    """Set both the connect and the read timeout, in milliseconds."""
+    self.setConnectTimeout(ms)
+    self.setReadTimeout(ms)
 
+  def setConnectTimeout(self, ms):
+    """Limit the time to establish a new connection, None to block."""
     if ms is None:
-      self.__timeout = None
+      self.__connect_timeout = None
     else:
-      self.__timeout = ms/1000.0
+      self.__connect_timeout = ms/1000.0
+
+  def setReadTimeout(self, ms):
+    """Limit the time any single send or receive may block, None to block."""
+    if ms is None:
+      self.__read_timeout = None
+    else:
+      self.__read_timeout = ms/1000.0
 
   def read(self, sz):
-    return self.__http.file.read(sz)
+    ret = self.__rbuf.read(sz)
+    if len(ret) != 0:
+      return ret
+
+    self.__rbuf = StringIO(self.__readResponse(max(sz, self.__rbuf_size)))
+    return self.__rbuf.read(sz)
+
+  def readInto(self, buf):
+    # large reads bypass the read buffer and go straight into buf
+    view = memoryview(buf)
+    sz = len(view)
+    chunk = self.__rbuf.read(sz)
+    have = len(chunk)
+    view[:have] = chunk
+    while have < sz:
+      chunk = self.__readResponse(sz - have)
+      if len(chunk) == 0:
+        raise EOFError()
+      view[have:have + len(chunk)] = chunk
+      have += len(chunk)
+    return sz
+
+  def __readResponse(self, sz):
+    if self.__reader is None:
+      return ''
+    try:
+      buff = self.__reader.read(sz)
+    except socket.timeout:
+      # the rest of the reply is lost, the connection can't be reused
+      self.close()
+      raise TTransportException(TTransportException.TIMED_OUT,
+                                'Timed out reading reply from %s' % self.host)
+    self.bytes_in += len(buff)
+    if self.__reader is self.__response:
+      self.bytes_in_comp += len(buff)
+    if self.__response is not None and self.__response.isclosed():
+      if self.__reader is not self.__response:
+        # the decompressor keeps serving what it has buffered
+        self.bytes_in_comp += self.__reader.bytes_in
+      self.__release()
+    return buff
 
   def write(self, buf):
     self.__wbuf.write(buf)
 
-  def __withTimeout(f):
-    def _f(*args, **kwargs):
-      orig_timeout = socket.getdefaulttimeout()
-      socket.setdefaulttimeout(args[0].__timeout)
-      result = f(*args, **kwargs)
-      socket.setdefaulttimeout(orig_timeout)
-      return result
-    return _f
+  def __release(self):
+    """Hand the connection back to the pool once the reply is consumed."""
+    if self.__response is not None:
+      # the connection can't carry another request until the previous
+      # reply has been read to the end
+      self.__response.read()
+      self.__response = None
+    if self.__http is not None:
+      self.__pool.release(self.scheme, self.host, self.port, self.__http)
+      self.__http = None
 
   def flush(self):
-    if self.isOpen():
-      self.close()
-    self.open();
+    self.__release()
 
     # Pull data out of buffer
     data = self.__wbuf.getvalue()
     self.__wbuf = StringIO()
 
+    self.bytes_out += len(data)
+    encoding = None
+    if self.compress and len(data) >= self.COMPRESS_MIN_SIZE:
+      zcomp = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+      data = zcomp.compress(data) + zcomp.flush()
+      encoding = 'gzip'
+    self.bytes_out_comp += len(data)
+
+    while True:
+      self.open()
+      # an idle connection may have been dropped by the server meanwhile,
+      # a request that could not be sent on it is sent on a fresh connection
+      reused = self.__http.sock is not None
+      try:
+        self.__send(data, encoding)
+      except socket.timeout:
+        self.close()
+        raise TTransportException(TTransportException.TIMED_OUT,
+                                  'Timed out talking to %s' % self.host)
+      except (httplib.CannotSendRequest, socket.error):
+        self.close()
+        if not reused:
+          raise
+        self.retries += 1
+      else:
+        break
+
+    # the server may have processed the request, so from here on it is not repeated
+    try:
+      response = self.__http.getresponse()
+    except socket.timeout:
+      self.close()
+      raise TTransportException(TTransportException.TIMED_OUT,
+                                'Timed out talking to %s' % self.host)
+    except (httplib.HTTPException, socket.error), e:
+      self.close()
+      raise TTransportException(TTransportException.UNKNOWN,
+                                'No reply from %s to a request sent: %r' % (self.host, e))
+
+    self.__response = response
+    if response.getheader('content-encoding', '').lower() in ('gzip', 'deflate'):
+      # 32 + MAX_WBITS accepts both gzip and zlib framing
+      self.__reader = TZlibTransport(TFileObjectTransport(response), wbits=32 + zlib.MAX_WBITS)
+    else:
+      self.__reader = response
+    self.__rbuf = StringIO('')
+    self.code = response.status
+    self.message = response.reason
+    self.headers = response.msg
+
+  def __send(self, data, encoding=None):
+    if self.__http.sock is None:
+      self.__http.timeout = self.__connect_timeout
+      self.__http.connect()
+    # pooled connections may come from a client with other timeouts
+    self.__http.sock.settimeout(self.__read_timeout)
+
     # HTTP request
-    self.__http.putrequest('POST', self.path)
+    self.__http.putrequest('POST', self.path, skip_host=True,
+                           skip_accept_encoding=self.compress)
 
     # Write headers
     self.__http.putheader('Host', self.host)
     self.__http.putheader('Content-Type', 'application/x-thrift')
     self.__http.putheader('Content-Length', str(len(data)))
-    self.__http.endheaders()
+    if self.compress:
+      self.__http.putheader('Accept-Encoding', 'gzip, deflate')
+    if encoding:
+      self.__http.putheader('Content-Encoding', encoding)
+
+    # Write payload in the same packet as the headers
+    self.__http.endheaders(data)
+
+  # Implement the CReadableTransport interface.
+  @property
+  def cstringio_buf(self):
+    return self.__rbuf
 
-    # Write payload
-    self.__http.send(data)
+  def cstringio_refill(self, partialread, reqlen):
+    retstring = partialread
+    if reqlen < self.__rbuf_size:
+      # try to make a read of as much as we can.
+      retstring += self.__readResponse(self.__rbuf_size)
 
-    # Get reply to flush the request
-    self.code, self.message, self.headers = self.__http.getreply()
+    # but make sure we do read reqlen bytes.
+    while len(retstring) < reqlen:
+      chunk = self.__readResponse(reqlen - len(retstring))
+      if len(chunk) == 0:
+        raise EOFError()
+      retstring += chunk
 
-  # Decorate if we know how to timeout
-  if hasattr(socket, 'getdefaulttimeout'):
-    flush = __withTimeout(flush)
+    self.__rbuf = StringIO(retstring)
+    return self.__rbuf
@@ -52,17 +52,38 @@ class TTransportBase:
     pass
 
   def readAll(self, sz):
-    buff = ''
-    have = 0
-    while (have < sz):
-      chunk = self.read(sz-have)
+    chunk = self.read(sz)
+    if len(chunk) == sz:
+      return chunk
+
+    # join once at the end, growing a string chunk by chunk is quadratic
+    # whenever realloc can't extend it in place
+    chunks = [chunk]
+    have = len(chunk)
+    while have < sz:
+      chunk = self.read(sz - have)
+      if len(chunk) == 0:
+        raise EOFError()
+      chunks.append(chunk)
       have += len(chunk)
-      buff += chunk
+    return ''.join(chunks)
+
+  def readInto(self, buf):
+    """Fills the writable buffer buf (a bytearray or memoryview) completely.
 
+    Returns the number of bytes read, raises EOFError if the transport
+    ends first.
+    """
+    view = memoryview(buf)
+    sz = len(view)
+    have = 0
+    while have < sz:
+      chunk = self.read(sz - have)
       if len(chunk) == 0:
         raise EOFError()
-
-    return buff
+      view[have:have + len(chunk)] = chunk
+      have += len(chunk)
+    return sz
 
   def write(self, buf):
     pass
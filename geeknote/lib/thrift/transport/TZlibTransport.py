@@ -79,7 +79,7 @@ class TZlibTransport(TTransportBase, CReadableTransport):
   # the TBinaryProtocolAccelerated class.
   DEFAULT_BUFFSIZE = 4096
 
-  def __init__(self, trans, compresslevel=9):
+  def __init__(self, trans, compresslevel=9, wbits=zlib.MAX_WBITS):
     '''
     Create a new TZlibTransport, wrapping C{trans}, another
     TTransport derived object.
@@ -89,9 +89,14 @@ class TZlibTransport(TTransportBase, CReadableTransport):
     @param compresslevel: The zlib compression level, ranging
     from 0 (no compression) to 9 (best compression).  Default is 9.
     @type compresslevel: int
+    @param wbits: The zlib window size and stream format.  The default
+    is a zlib stream, 16 + MAX_WBITS selects gzip and, for reading
+    only, 32 + MAX_WBITS accepts either of them.
+    @type wbits: int
     '''
     self.__trans = trans
     self.compresslevel = compresslevel
+    self.wbits = wbits
     self.__rbuf = StringIO()
     self.__wbuf = StringIO()
     self._init_zlib()
@@ -120,8 +125,9 @@ class TZlibTransport(TTransportBase, CReadableTransport):
     Internal method for setting up the zlib compression and
     decompression objects.
     '''
-    self._zcomp_read = zlib.decompressobj()
-    self._zcomp_write = zlib.compressobj(self.compresslevel)
+    self._zcomp_read = zlib.decompressobj(self.wbits)
+    self._zcomp_write = zlib.compressobj(self.compresslevel, zlib.DEFLATED,
+                                         self.wbits & ~32)
 
   def getCompRatio(self):
     '''
@@ -196,9 +202,10 @@ class TZlibTransport(TTransportBase, CReadableTransport):
     ret = self.__rbuf.read(sz)
     if len(ret) > 0:
       return ret
-    # keep reading from transport until something comes back
+    # keep reading from transport until something comes back,
+    # an empty read means the underlying transport is exhausted
     while True:
-      if self.readComp(sz):
+      if self.readComp(sz) is not False:
         break
     ret = self.__rbuf.read(sz)
     return ret
@@ -207,8 +214,12 @@ class TZlibTransport(TTransportBase, CReadableTransport):
     '''
     Read compressed data from the underlying transport, then
     decompress it and append it to the internal StringIO read buffer
+
+    Returns None if the underlying transport had nothing left to read
     '''
     zbuf = self.__trans.read(sz)
+    if len(zbuf) == 0 and len(self._zcomp_read.unconsumed_tail) == 0:
+      return None
     zbuf = self._zcomp_read.unconsumed_tail + zbuf
     buf = self._zcomp_read.decompress(zbuf)
     self.bytes_in += len(zbuf)
@@ -256,6 +267,9 @@ class TZlibTransport(TTransportBase, CReadableTransport):
     if reqlen < self.DEFAULT_BUFFSIZE:
       retstring += self.read(self.DEFAULT_BUFFSIZE)
     while len(retstring) < reqlen:
-      retstring += self.read(reqlen - len(retstring))
+      chunk = self.read(reqlen - len(retstring))
+      if len(chunk) == 0:
+        raise EOFError()
+      retstring += chunk
     self.__rbuf = StringIO(retstring)
     return self.__rbuf
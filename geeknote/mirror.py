@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import sqlite3
+import threading
+
+import config
+import editor
+from log import logging
+from notecache import CACHE_PROTOCOLS
+
+from thrift import TSerialization
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS notebooks (guid TEXT PRIMARY KEY, name TEXT, usn INTEGER, data BLOB);
+CREATE TABLE IF NOT EXISTS tags (guid TEXT PRIMARY KEY, name TEXT, usn INTEGER, data BLOB);
+CREATE TABLE IF NOT EXISTS searches (guid TEXT PRIMARY KEY, name TEXT, usn INTEGER, data BLOB);
+CREATE TABLE IF NOT EXISTS notes (
+    guid TEXT PRIMARY KEY, title TEXT, notebookGuid TEXT, created INTEGER, updated INTEGER,
+    active INTEGER, usn INTEGER, contentHash BLOB, content TEXT, contentUsn INTEGER, data BLOB);
+CREATE TABLE IF NOT EXISTS noteTags (noteGuid TEXT, tagGuid TEXT, PRIMARY KEY (noteGuid, tagGuid));
+CREATE INDEX IF NOT EXISTS notesByNotebook ON notes (notebookGuid);
+CREATE INDEX IF NOT EXISTS notesByUpdated ON notes (updated);
+CREATE INDEX IF NOT EXISTS notesByCreated ON notes (created);
+CREATE INDEX IF NOT EXISTS noteTagsByTag ON noteTags (tagGuid);
+"""
+
+
+def _hasFTS5():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+# words of the notes, with the rowid of their row in notes;
+# without FTS5 the same columns are scanned with LIKE
+FTS5 = _hasFTS5()
+TEXT_SCHEMA = {
+    True: "CREATE VIRTUAL TABLE IF NOT EXISTS noteText USING fts5(title, text, tags, notebook)",
+    False: "CREATE TABLE IF NOT EXISTS noteText (title TEXT, text TEXT, tags TEXT, notebook TEXT)",
+}
+TEXT_COLUMNS = ('title', 'text', 'tags', 'notebook')
+INDEX_VERSION = 1
+
+# a term of a search request: optional negation, optional field, word or "phrase"
+SEARCH_TERM = re.compile(r'(-?)(?:(\w+):)?("[^"]*"|\S+)')
+
+# table and struct of the objects in a SyncChunk, and of its expunged guids
+SYNCED = (
+    ('notebooks', Types.Notebook, 'expungedNotebooks'),
+    ('tags', Types.Tag, 'expungedTags'),
+    ('searches', Types.SavedSearch, 'expungedSearches'),
+    ('notes', Types.Note, 'expungedNotes'),
+)
+
+
+class Mirror(object):
+    """
+    Local replica of the account: notebooks, tags, saved searches and note
+    metadata in a SQLite file, kept current by the Evernote sync protocol.
+
+    sync() asks getSyncState for the account's updateCount and fetches only
+    the sync chunks past the one it reached last time. Objects are stored as
+    serialized structs next to the columns they are looked up by. Note
+    content never comes in chunks, it is added with setContent and dropped
+    when a later chunk shows the note with another contentHash.
+
+    Titles, tag and notebook names and the text of the content are kept in
+    a full-text index, which search() queries with the Evernote grammar.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.MIRROR_FILE
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.text_factory = str
+        self.db.executescript(SCHEMA)
+        self.db.execute(TEXT_SCHEMA[FTS5])
+        # keep the serialization the mirror was created with
+        protocol = self.getState('protocol')
+        if protocol not in CACHE_PROTOCOLS:
+            protocol = config.CACHE_PROTOCOL
+            with self.db:
+                self.setState('protocol', protocol)
+        self.protocolFactory = CACHE_PROTOCOLS[protocol]
+        # mirrors made before the search index get it now
+        if self.getState('indexVersion') != INDEX_VERSION:
+            self.reindex()
+
+    def close(self):
+        self.db.close()
+
+    def getState(self, key, default=None):
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def setState(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def updateCount(self):
+        """ the USN the mirror is current to, 0 before the first sync """
+        return self.getState('updateCount', 0)
+
+    @property
+    def keepsContent(self):
+        """ whether sync should download the content of changed notes """
+        return bool(self.getState('keepContent', 0))
+
+    def setKeepContent(self, keep):
+        with self.lock, self.db:
+            self.setState('keepContent', int(bool(keep)))
+
+    """
+    SYNC
+    """
+    def sync(self, noteStore, authToken, chunkSize=None, userId=None):
+        """
+        bring the mirror up to the account's updateCount, return the number of changes applied;
+        a mirror of another user than userId is cleared first
+        """
+        with self.lock:
+            # the USNs of another account say nothing about this one
+            if userId is not None and self.getState('userId') != userId:
+                logging.debug("Mirror: user %s, was %s", userId, self.getState('userId'))
+                self.clear()
+                with self.db:
+                    self.setState('userId', userId)
+
+            state = noteStore.getSyncState(authToken)
+            afterUSN = self.updateCount
+
+            # the service asks for a full sync after it lost track of changes
+            if afterUSN and state.fullSyncBefore > self.getState('lastSyncTime', 0):
+                logging.debug("Mirror: full sync required")
+                self.clear()
+                afterUSN = 0
+
+            chunkFilter = NoteStore.SyncChunkFilter(
+                includeNotes=True, includeNoteResources=True, includeNoteAttributes=True,
+                includeNotebooks=True, includeTags=True, includeSearches=True,
+                includeExpunged=afterUSN > 0)
+
+            applied = 0
+            while afterUSN < state.updateCount:
+                chunk = noteStore.getFilteredSyncChunk(authToken, afterUSN,
+                                                       chunkSize or config.MIRROR_CHUNK_SIZE, chunkFilter)
+                # each chunk is committed on its own, an interrupted sync resumes after it
+                with self.db:
+                    applied += self._apply(chunk)
+                    afterUSN = chunk.chunkHighUSN or chunk.updateCount
+                    self.setState('updateCount', afterUSN)
+                logging.debug("Mirror: synced up to USN %s of %s", afterUSN, chunk.updateCount)
+
+            with self.db:
+                self.setState('lastSyncTime', state.currentTime)
+            return applied
+
+    def _apply(self, chunk):
+        applied = 0
+        for table, struct, expungedField in SYNCED:
+            for obj in getattr(chunk, table) or []:
+                getattr(self, '_store' + struct.__name__)(obj)
+                applied += 1
+            for guid in getattr(chunk, expungedField) or []:
+                self._expunge(table, guid)
+                applied += 1
+        return applied
+
+    def _serialize(self, obj):
+        return buffer(TSerialization.serialize(obj, self.protocolFactory))
+
+    def _deserialize(self, struct, data):
+        return TSerialization.deserialize(struct(), str(data), self.protocolFactory)
+
+    def _storeNotebook(self, notebook):
+        self.db.execute("INSERT OR REPLACE INTO notebooks VALUES (?, ?, ?, ?)",
+                        (notebook.guid, notebook.name, notebook.updateSequenceNum, self._serialize(notebook)))
+        self.db.execute("UPDATE noteText SET notebook = ? WHERE rowid IN "
+                        "(SELECT rowid FROM notes WHERE notebookGuid = ?)", (notebook.name, notebook.guid))
+
+    def _storeTag(self, tag):
+        self.db.execute("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?)",
+                        (tag.guid, tag.name, tag.updateSequenceNum, self._serialize(tag)))
+        self._reindexTagged(tag.guid)
+
+    def _reindexTagged(self, tagGuid):
+        for rowid, guid in self.db.execute("SELECT notes.rowid, guid FROM notes JOIN noteTags "
+                                           "ON guid = noteGuid WHERE tagGuid = ?", (tagGuid,)).fetchall():
+            self.db.execute("UPDATE noteText SET tags = ? WHERE rowid = ?", (self._tagNames(guid), rowid))
+
+    def _storeSavedSearch(self, search):
+        self.db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                        (search.guid, search.name, search.updateSequenceNum, self._serialize(search)))
+
+    def _storeNote(self, note):
+        usn = note.updateSequenceNum
+        content, contentUsn = None, None
+        row = self.db.execute("SELECT contentHash, content, rowid FROM notes WHERE guid = ?",
+                              (note.guid,)).fetchone()
+        # a change of title, tags or notebook keeps the content already downloaded
+        if row and row[1] is not None and note.contentHash is not None and str(row[0]) == note.contentHash:
+            content, contentUsn = row[1], usn
+        if row:
+            self.db.execute("DELETE FROM noteText WHERE rowid = ?", (row[2],))
+
+        note.content = None
+        rowid = self.db.execute("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (note.guid, note.title, note.notebookGuid, note.created, note.updated,
+                                 int(note.active is not False), usn,
+                                 buffer(note.contentHash) if note.contentHash is not None else None,
+                                 content, contentUsn, self._serialize(note))).lastrowid
+        self.db.execute("DELETE FROM noteTags WHERE noteGuid = ?", (note.guid,))
+        self.db.executemany("INSERT INTO noteTags VALUES (?, ?)",
+                            [(note.guid, tagGuid) for tagGuid in note.tagGuids or []])
+        self._indexNote(rowid, note.guid, note.title, note.notebookGuid, content)
+
+    def _indexNote(self, rowid, guid, title, notebookGuid, content):
+        notebook = self.db.execute("SELECT name FROM notebooks WHERE guid = ?", (notebookGuid,)).fetchone()
+        self.db.execute("INSERT INTO noteText (rowid, title, text, tags, notebook) VALUES (?, ?, ?, ?, ?)",
+                        (rowid, title, editor.ENMLtoText(content) if content else '',
+                         self._tagNames(guid), notebook[0] if notebook else ''))
+
+    def _tagNames(self, noteGuid):
+        return ' '.join(row[0] for row in self.db.execute(
+            "SELECT name FROM tags JOIN noteTags ON guid = tagGuid WHERE noteGuid = ?", (noteGuid,)))
+
+    def _expunge(self, table, guid):
+        if table == 'notes':
+            self.db.execute("DELETE FROM noteText WHERE rowid IN (SELECT rowid FROM notes WHERE guid = ?)",
+                            (guid,))
+            self.db.execute("DELETE FROM noteTags WHERE noteGuid = ?", (guid,))
+        self.db.execute("DELETE FROM %s WHERE guid = ?" % table, (guid,))
+        if table == 'tags':
+            tagged = self.db.execute("SELECT noteGuid FROM noteTags WHERE tagGuid = ?", (guid,)).fetchall()
+            self.db.execute("DELETE FROM noteTags WHERE tagGuid = ?", (guid,))
+            for noteGuid, in tagged:
+                self.db.execute("UPDATE noteText SET tags = ? WHERE rowid IN "
+                                "(SELECT rowid FROM notes WHERE guid = ?)", (self._tagNames(noteGuid), noteGuid))
+
+    def reindex(self):
+        """ build the search index of all the notes again """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM noteText")
+            for row in self.db.execute("SELECT rowid, guid, title, notebookGuid, content FROM notes").fetchall():
+                self._indexNote(*row)
+            self.setState('indexVersion', INDEX_VERSION)
+
+    def clear(self):
+        """ forget everything synced, the next sync is a full one """
+        with self.lock, self.db:
+            for table, struct, expungedField in SYNCED:
+                self.db.execute("DELETE FROM %s" % table)
+            self.db.execute("DELETE FROM noteTags")
+            self.db.execute("DELETE FROM noteText")
+            self.db.execute("DELETE FROM state WHERE key IN ('updateCount', 'lastSyncTime')")
+
+    """
+    CONTENT
+    """
+    def staleContent(self):
+        """ (guid, usn) of the active notes whose content is missing or out of date """
+        with self.lock:
+            return self.db.execute("SELECT guid, usn FROM notes WHERE active = 1 AND "
+                                   "(contentUsn IS NULL OR contentUsn < usn)").fetchall()
+
+    def setContent(self, guid, usn, content):
+        """ keep the content of note guid as of usn, ignored if the mirror has another version """
+        with self.lock, self.db:
+            cursor = self.db.execute("UPDATE notes SET content = ?, contentUsn = ? WHERE guid = ? AND usn = ?",
+                                     (content, usn, guid, usn))
+            if cursor.rowcount:
+                self.db.execute("UPDATE noteText SET text = ? WHERE rowid IN (SELECT rowid FROM notes WHERE guid = ?)",
+                                (editor.ENMLtoText(content) if content else '', guid))
+
+    def getContentHash(self, guid, usn):
+        """ contentHash of note guid if the mirror has it as of usn, else None """
+        with self.lock:
+            row = self.db.execute("SELECT contentHash FROM notes WHERE guid = ? AND usn = ?",
+                                  (guid, usn)).fetchone()
+        return str(row[0]) if row and row[0] is not None else None
+
+    def getContent(self, guid, usn):
+        """ content of note guid if the mirror has it as of usn or later, else None """
+        with self.lock:
+            row = self.db.execute("SELECT content FROM notes WHERE guid = ? AND contentUsn >= ?",
+                                  (guid, usn)).fetchone()
+        return row[0] if row else None
+
+    """
+    READ
+    """
+    def notebooks(self):
+        return self._list('notebooks', Types.Notebook)
+
+    def tags(self):
+        return self._list('tags', Types.Tag)
+
+    def searches(self):
+        return self._list('searches', Types.SavedSearch)
+
+    def _list(self, table, struct):
+        with self.lock:
+            rows = self.db.execute("SELECT data FROM %s ORDER BY name COLLATE NOCASE" % table).fetchall()
+        return [self._deserialize(struct, row[0]) for row in rows]
+
+    def getNote(self, guid):
+        """ Note without content, or None """
+        with self.lock:
+            row = self.db.execute("SELECT data FROM notes WHERE guid = ?", (guid,)).fetchone()
+        return self._deserialize(Types.Note, row[0]) if row else None
+
+    def findNotes(self, title=None, notebookGuid=None, tagGuid=None, count=None):
+        """
+        NotesMetadataList of the active notes whose title contains title,
+        newest first, with the fields of geeknote.SEARCH_RESULT_SPEC
+        """
+        where, params = ["active = 1"], []
+        if title:
+            where.append("title LIKE ? ESCAPE '\\'")
+            params.append('%' + _escapeLike(title) + '%')
+        if notebookGuid:
+            where.append("notebookGuid = ?")
+            params.append(notebookGuid)
+        if tagGuid:
+            where.append("guid IN (SELECT noteGuid FROM noteTags WHERE tagGuid = ?)")
+            params.append(tagGuid)
+        return self._noteList(where, params, count)
+
+    def search(self, words, count=None, createOrder=False):
+        """
+        NotesMetadataList of the active notes matching a search request in
+        the grammar Notes._createSearchRequest writes: words and "phrases",
+        intitle:, notebook:, tag:, created: and updated:, each negated by a
+        leading -, with a trailing * matching any ending. any: at the start
+        matches any of the terms instead of all of them. Words are looked up
+        in titles, tags, notebook names and the text of the mirrored content.
+        Raises ValueError for terms it can't evaluate.
+        """
+        words = (words or '').strip()
+        anyTerm = words.startswith('any:')
+        if anyTerm:
+            words = words[len('any:'):]
+
+        conditions, params = [], []
+        for negative, field, value in SEARCH_TERM.findall(words):
+            condition = self._searchTerm(field.lower(), value, params)
+            if condition is not None:
+                conditions.append(("NOT (%s)" if negative else "(%s)") % condition)
+
+        where = ["active = 1"]
+        if conditions:
+            where.append("(%s)" % (" OR " if anyTerm else " AND ").join(conditions))
+        return self._noteList(where, params, count, 'created' if createOrder else 'updated')
+
+    def _searchTerm(self, field, value, params):
+        """ SQL condition on notes for a term, its parameters appended to params """
+        value = value.strip('"')
+        prefix = value.endswith('*')
+        value = value.rstrip('*')
+        if not value:
+            # a lone * matches every note
+            return None
+
+        if field in ('notebook', 'tag'):
+            params.append(_escapeLike(value) + ('%' if prefix else ''))
+            if field == 'notebook':
+                return "notebookGuid IN (SELECT guid FROM notebooks WHERE name LIKE ? ESCAPE '\\')"
+            return ("guid IN (SELECT noteGuid FROM noteTags JOIN tags ON tags.guid = tagGuid "
+                    "WHERE name LIKE ? ESCAPE '\\')")
+
+        if field in ('created', 'updated'):
+            try:
+                since = time.mktime(time.strptime(value[:8], "%Y%m%d"))
+            except ValueError:
+                raise ValueError("Incorrect date in %s:%s" % (field, value))
+            params.append(int(since * 1000))
+            return "%s >= ?" % field
+
+        if field not in ('', 'intitle'):
+            raise ValueError("%s: can't be searched locally" % field)
+
+        columns = ('title',) if field == 'intitle' else TEXT_COLUMNS
+        if FTS5:
+            query = '"%s"' % value.replace('"', '""') + (' *' if prefix else '')
+            params.append("{%s} : %s" % (' '.join(columns), query))
+            return "rowid IN (SELECT rowid FROM noteText WHERE noteText MATCH ?)"
+
+        params.extend(['%' + _escapeLike(value) + '%'] * len(columns))
+        return "rowid IN (SELECT rowid FROM noteText WHERE %s)" % " OR ".join(
+            "%s LIKE ? ESCAPE '\\'" % column for column in columns)
+
+    def _noteList(self, where, params, count, order='updated'):
+        where = " AND ".join(where)
+        with self.lock:
+            total = self.db.execute("SELECT count(*) FROM notes WHERE %s" % where, params).fetchone()[0]
+            rows = self.db.execute("SELECT guid, title, created, updated, usn FROM notes WHERE %s "
+                                   "ORDER BY %s DESC LIMIT ?" % (where, order),
+                                   params + [-1 if count is None else count]).fetchall()
+        notes = [NoteStore.NoteMetadata(guid=guid, title=title, created=created, updated=updated,
+                                        updateSequenceNum=usn)
+                 for guid, title, created, updated, usn in rows]
+        return NoteStore.NotesMetadataList(startIndex=0, totalNotes=total, notes=notes,
+                                           updateCount=self.updateCount)
+
+
+def _escapeLike(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
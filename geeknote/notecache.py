@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import struct
+import tempfile
+import threading
+import contextlib
+
+import config
+import ratelimit
+from log import logging
+
+from thrift import TSerialization
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+import evernote.edam.type.ttypes as Types
+
+# record header: guid, payload length
+RECORD = struct.Struct('!36sI')
+# index entry: guid, record offset, payload length, updateSequenceNum
+ENTRY = struct.Struct('!36sQIi')
+# index header per serialization, a cache written in another one reads as empty
+INDEX_MAGIC = {
+    'binary': 'GNIX0001',
+    'compact': 'GNIC0001',
+}
+# entries appended to the journal before it is merged into the index
+JOURNAL_SIZE = 128
+# journal entry of a removed note
+REMOVED = (0, 0, 0)
+
+# serializations for local caches of Evernote structs, see config.CACHE_PROTOCOL
+CACHE_PROTOCOLS = {
+    'binary': TBinaryProtocol.TBinaryProtocolAcceleratedFactory(),
+    'compact': TCompactProtocol.TCompactProtocolFactory(),
+}
+
+
+class NoteCache(object):
+    """
+    Local cache of whole notes.
+
+    Notes are serialized with TSerialization and appended to a data file.
+    A second file holds a guid -> offset index sorted by guid, which is
+    binary searched through mmap, so a lookup doesn't load the index.
+    Changes are appended to a journal of up to JOURNAL_SIZE entries that
+    is read before the index and merged into it when full, so a put
+    doesn't rewrite the index. A cached note is returned only if it is
+    at least as new as the updateSequenceNum the caller knows about.
+    When the data file grows past maxSize the oldest notes are evicted.
+    protocol picks the serialization, one of CACHE_PROTOCOLS. Other
+    geeknote processes may use the same files, changes are made under a
+    file lock. A cache that can't be read or written is logged and
+    behaves as a cache without the note.
+    """
+
+    def __init__(self, path=None, maxSize=None, protocol=None):
+        self.path = path or config.NOTE_CACHE
+        self.indexPath = self.path + '.idx'
+        self.journalPath = self.indexPath + '.log'
+        self.maxSize = maxSize if maxSize is not None else config.NOTE_CACHE_SIZE
+        self.protocol = protocol or config.CACHE_PROTOCOL
+        self.protocolFactory = CACHE_PROTOCOLS[self.protocol]
+        self.magic = INDEX_MAGIC[self.protocol]
+        self.lock = threading.Lock()
+
+    def get(self, guid, updateSequenceNum=None):
+        """
+        return cached Note
+        return None if the note is not cached or older than updateSequenceNum
+        """
+        try:
+            with self.lock:
+                entry = self._find(guid)
+                if entry is None:
+                    return None
+
+                offset, length, usn = entry
+                if updateSequenceNum is not None and usn < updateSequenceNum:
+                    logging.debug("Cached note %s is stale: %s < %s", guid, usn, updateSequenceNum)
+                    return None
+
+                data = self._readRecord(guid, offset, length)
+                if data is None:
+                    return None
+        except (IOError, OSError), e:
+            logging.error("Can not read note cache %s: %s", self.path, e)
+            return None
+
+        return TSerialization.deserialize(Types.Note(), data, self.protocolFactory)
+
+    def put(self, note):
+        """ cache note, replacing an older copy """
+        data = TSerialization.serialize(note, self.protocolFactory)
+
+        try:
+            with self._locked():
+                with open(self.path, 'ab') as f:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell()
+                    f.write(RECORD.pack(note.guid, len(data)))
+                    f.write(data)
+
+                entry = (offset, len(data), note.updateSequenceNum or 0)
+                if offset + RECORD.size + len(data) > self.maxSize:
+                    entries = self._entries()
+                    entries[note.guid] = entry
+                    self._evict(entries)
+                else:
+                    self._append(note.guid, entry)
+        except (IOError, OSError), e:
+            logging.error("Can not write note cache %s: %s", self.path, e)
+
+    def remove(self, guid):
+        try:
+            with self._locked():
+                if self._find(guid) is not None:
+                    self._append(guid, REMOVED)
+        except (IOError, OSError), e:
+            logging.error("Can not write note cache %s: %s", self.path, e)
+
+    def clear(self):
+        try:
+            with self._locked():
+                for path in (self.path, self.indexPath, self.journalPath):
+                    if os.path.exists(path):
+                        os.remove(path)
+        except (IOError, OSError), e:
+            logging.error("Can not clear note cache %s: %s", self.path, e)
+
+    def __len__(self):
+        with self.lock:
+            return len(self._entries())
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """ self.lock, and the lock file other geeknote processes take to change the cache """
+        with self.lock:
+            with open(self.path + '.lock', 'a+') as lock:
+                ratelimit.lockFile(lock)
+                try:
+                    yield
+                finally:
+                    ratelimit.unlockFile(lock)
+
+    def _find(self, guid):
+        """ (offset, length, usn) of guid from the journal, else from the index """
+        journal = dict(self._journal())
+        if guid in journal:
+            entry = journal[guid]
+            return None if entry == REMOVED else entry
+        return self._search(guid)
+
+    def _search(self, guid):
+        """ binary search the index for guid, return (offset, length, usn) """
+        if not os.path.exists(self.indexPath):
+            return None
+
+        with open(self.indexPath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= len(self.magic):
+                return None
+            index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if index[:len(self.magic)] != self.magic:
+                return None
+
+            key = guid.ljust(36, '\x00')
+            lo, hi = 0, (len(index) - len(self.magic)) // ENTRY.size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                start = len(self.magic) + mid * ENTRY.size
+                entryGuid = index[start:start + 36]
+                if entryGuid < key:
+                    lo = mid + 1
+                elif entryGuid > key:
+                    hi = mid
+                else:
+                    return ENTRY.unpack_from(index, start)[1:]
+            return None
+        finally:
+            index.close()
+
+    def _readRecord(self, guid, offset, length):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset + RECORD.size + length > size:
+                return None
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            recordGuid, recordLength = RECORD.unpack_from(data, offset)
+            # the index may be behind the data file after an interrupted write
+            if recordGuid.rstrip('\x00') != guid or recordLength != length:
+                return None
+            start = offset + RECORD.size
+            return data[start:start + length]
+        finally:
+            data.close()
+
+    def _entries(self):
+        """ the whole index with the journal applied, as {guid: (offset, length, usn)} """
+        entries = dict(self._read(self.indexPath))
+        for guid, entry in self._journal():
+            if entry == REMOVED:
+                entries.pop(guid, None)
+            else:
+                entries[guid] = entry
+        return entries
+
+    def _journal(self):
+        return self._read(self.journalPath)
+
+    def _read(self, path):
+        """ the [(guid, (offset, length, usn))] of the index or journal file path """
+        if not os.path.exists(path):
+            return []
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(self.magic)] != self.magic:
+            return []
+
+        entries = []
+        for start in xrange(len(self.magic), len(data) - ENTRY.size + 1, ENTRY.size):
+            guid, offset, length, usn = ENTRY.unpack_from(data, start)
+            entries.append((guid.rstrip('\x00'), (offset, length, usn)))
+        return entries
+
+    def _append(self, guid, entry):
+        """ add entry to the journal, or merge them into the index when it is full """
+        journal = self._journal()
+        if len(journal) >= JOURNAL_SIZE:
+            entries = self._entries()
+            if entry == REMOVED:
+                entries.pop(guid, None)
+            else:
+                entries[guid] = entry
+            self._writeIndex(entries)
+            return
+
+        with open(self.journalPath, 'r+b' if os.path.exists(self.journalPath) else 'w+b') as f:
+            # also drops an entry cut short, or a journal of another protocol
+            f.write(self.magic)
+            f.seek(len(self.magic) + len(journal) * ENTRY.size)
+            f.truncate()
+            f.write(ENTRY.pack(guid, *entry))
+
+    def _writeIndex(self, entries):
+        chunks = [self.magic]
+        for guid in sorted(entries):
+            chunks.append(ENTRY.pack(guid, *entries[guid]))
+
+        with _replacing(self.indexPath) as f:
+            f.write(''.join(chunks))
+        # merged into the index
+        if os.path.exists(self.journalPath):
+            os.remove(self.journalPath)
+
+    def _evict(self, entries):
+        """ rewrite the data file with the newest notes filling at most half of maxSize """
+        keep = {}
+        size = 0
+        for guid, (offset, length, usn) in sorted(entries.items(), key=lambda item: -item[1][0]):
+            size += RECORD.size + length
+            if size > self.maxSize // 2:
+                break
+            keep[guid] = (offset, length, usn)
+
+        logging.debug("Evict %d of %d cached notes", len(entries) - len(keep), len(entries))
+
+        compacted = {}
+        with open(self.path, 'rb') as source:
+            with _replacing(self.path) as target:
+                for guid, (offset, length, usn) in sorted(keep.items(), key=lambda item: item[1][0]):
+                    source.seek(offset)
+                    record = source.read(RECORD.size + length)
+                    compacted[guid] = (target.tell(), length, usn)
+                    target.write(record)
+        self._writeIndex(compacted)
+
+
+@contextlib.contextmanager
+def _replacing(path):
+    """ a new file in the directory of path, renamed over path once written """
+    fd, tmpPath = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                   dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        # os.rename does not overwrite on Windows
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+    except:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
@@ -135,7 +135,8 @@ def showNote(note):
     separator("=", "META")
     printLine("Created: "+printDate(note.created).ljust(15, " ")+"Updated: "+printDate(note.updated).ljust(15, " "))
     separator("-", "CONTENT")
-    if note.tagNames:
+    # NoteMetadata found by a search has no tagNames
+    if getattr(note, 'tagNames', None):
         printLine("Tags: %s" % ', '.join(note.tagNames))
 
     printLine(editor.ENMLtoText(note.content))
@@ -156,6 +157,32 @@ def showUser(user, fullInfo):
         line('Upload limit end', time.strftime("%d.%m.%Y", time.gmtime(user.accounting.uploadLimitEnd / 1000 )) )
 
 
+@preloaderStop
+def showDiagnostics(info):
+    separator("#", "DIAGNOSTICS")
+    for key, value in info:
+        printLine("%s : %s" % (key.ljust(24, " "), value))
+
+
+@preloaderStop
+def showStats(methods):
+    separator("#", "EVERNOTE API CALLS")
+    if not methods:
+        printLine("No calls recorded yet.")
+        return
+
+    printLine("%-28s %6s %6s %9s %9s %10s %10s %7s" % (
+        'Method', 'Calls', 'Errors', 'Avg ms', 'Max ms', 'KB out', 'KB in', 'Retries'))
+    for method, totals in sorted(methods.items(), key=lambda item: -item[1]['seconds']):
+        printLine("%-28s %6d %6d %9.1f %9.1f %10.1f %10.1f %7d" % (
+            method, totals['calls'], totals['errors'],
+            totals['seconds'] / max(totals['calls'], 1) * 1000, totals['maxSeconds'] * 1000,
+            totals['bytesOut'] / 1024.0, totals['bytesIn'] / 1024.0, totals['retries']))
+        if totals['errorCodes']:
+            printLine("%-28s %s" % ('', ', '.join(
+                "%s: %d" % item for item in sorted(totals['errorCodes'].items()))))
+
+
 @preloaderStop
 def successMessage(message):
     """ Вывод сообщения """
@@ -176,22 +203,30 @@ def separator(symbol="", title=""):
         printLine(symbol*size+"\n")
 
 @preloaderStop
-def printList(listItems, title="", showSelector=False, showByStep=20, showUrl=False):
+def printList(listItems, title="", showSelector=False, showByStep=20, showUrl=False, total=None):
+    """
+    listItems may be any iterable, like the notes of a paginated search,
+    then total tells how many it yields
+    """
 
     if title:
         separator("=", title)
 
-    total = len(listItems)
+    if total is None:
+        total = len(listItems)
     printLine("Total found: %d" % total)
+    shown = []
     for key, item in enumerate(listItems):
         key += 1
+        if showSelector:
+            shown.append(item)
 
         printLine("%s : %s%s%s" % (
             str(key).rjust(3, " "),
             #print date
-            printDate(item.created).ljust(12, " ") if hasattr(item, 'created') else '',
+            printDate(item.created).ljust(12, " ") if getattr(item, 'created', None) is not None else '',
             #print title
-            item.title if hasattr(item, 'title') else item.name,
+            item.title if getattr(item, 'title', None) is not None else item.name,
             #print noteUrl
             " "+(">>> "+config.NOTE_URL % item.guid) if showUrl else '',))
 
@@ -205,8 +240,8 @@ def printList(listItems, title="", showSelector=False, showByStep=20, showUrl=Fa
         try:
             while True:
                 num = rawInput(": ")
-                if tools.checkIsInt(num) and  1 <= int(num) <= total:
-                    return listItems[int(num)-1]
+                if tools.checkIsInt(num) and  1 <= int(num) <= len(shown):
+                    return shown[int(num)-1]
                 if num == '0':
                     exit(1)
                 failureMessage('Incorrect number "%s", please try again:\n' % num)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import time
+import json
+import threading
+
+import config
+from log import logging
+
+import evernote.edam.error.ttypes as Errors
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# wait this long when a RATE_LIMIT_REACHED error carries no rateLimitDuration
+DEFAULT_DURATION = 60
+# a reduced rate grows back to the configured one over this many seconds
+RECOVERY_TIME = 3600.0
+# parked callers look at the shared state again at least this often
+POLL_INTERVAL = 5.0
+
+
+def isRateLimit(e):
+    return (isinstance(e, Errors.EDAMSystemException) and
+            e.errorCode == Errors.EDAMErrorCode.RATE_LIMIT_REACHED)
+
+
+class RateLimiter(object):
+    """
+    Paces the Evernote calls of one account.
+
+    A token bucket holding up to burst calls, refilled at rate calls per
+    second, paces calls before the service complains. When it answers
+    RATE_LIMIT_REACHED every caller is parked for rateLimitDuration, the
+    rate is halved and the call is repeated, at most retries times. The
+    rate grows back to the configured one within RECOVERY_TIME.
+
+    The bucket lives in a lock file, so threads and all geeknote
+    processes using the same file (the same APP_DIR, which holds one
+    account) share it.
+    """
+
+    def __init__(self, path=None, rate=None, burst=None, retries=None, onPark=None):
+        self.path = path or config.RATE_LIMIT_FILE
+        self.maxRate = float(rate or config.RATE_LIMIT_RATE)
+        self.burst = float(burst or config.RATE_LIMIT_BURST)
+        self.retries = retries if retries is not None else config.RATE_LIMIT_RETRIES
+        self.onPark = onPark
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ block until a call may be made, then take a token for it """
+        while True:
+            with self._state() as state:
+                now = time.time()
+                if state['parkedUntil'] > now:
+                    wait = state['parkedUntil'] - now
+                elif state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                else:
+                    wait = (1 - state['tokens']) / state['rate']
+            time.sleep(min(wait, POLL_INTERVAL))
+
+    def park(self, seconds):
+        """ hold all calls for seconds, the service refuses them meanwhile """
+        logging.warning("Evernote rate limit reached, waiting %d seconds", seconds)
+        if self.onPark:
+            self.onPark(seconds)
+        with self._state() as state:
+            state['parkedUntil'] = max(state['parkedUntil'], time.time() + seconds)
+            state['tokens'] = 0.0
+            state['rate'] = max(state['rate'] / 2, self.maxRate / 64)
+
+    def call(self, func, *args, **kwargs):
+        """ func(*args, **kwargs) paced, and repeated after a rate limit error """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Errors.EDAMSystemException, e:
+                if not isRateLimit(e):
+                    raise
+                # other callers wait even when this one gives up
+                self.park(e.rateLimitDuration or DEFAULT_DURATION)
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+
+    def _state(self):
+        return _SharedState(self)
+
+
+class _SharedState(object):
+    """ the bucket, read and written back under the thread and the file lock """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def __enter__(self):
+        limiter = self.limiter
+        limiter.lock.acquire()
+        try:
+            self.file = open(limiter.path, 'a+')
+            lockFile(self.file)
+        except:
+            limiter.lock.release()
+            raise
+
+        self.file.seek(0)
+        try:
+            self.state = json.loads(self.file.read())
+        except ValueError:
+            self.state = {'parkedUntil': 0.0, 'tokens': limiter.burst,
+                          'rate': limiter.maxRate, 'updated': time.time()}
+
+        # refill the bucket and recover the rate for the time passed
+        state = self.state
+        now = time.time()
+        elapsed = max(now - state['updated'], 0)
+        state['rate'] = min(limiter.maxRate, state['rate'] + limiter.maxRate * elapsed / RECOVERY_TIME)
+        state['tokens'] = min(limiter.burst, state['tokens'] + elapsed * state['rate'])
+        state['updated'] = now
+        return state
+
+    def __exit__(self, excType, excValue, traceback):
+        try:
+            if excType is None:
+                self.file.seek(0)
+                self.file.truncate()
+                self.file.write(json.dumps(self.state))
+                self.file.flush()
+            unlockFile(self.file)
+            self.file.close()
+        finally:
+            self.limiter.lock.release()
+
+
+def lockFile(f):
+    """ wait for the exclusive lock of the open file f, which other processes take too """
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def unlockFile(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ScheduledClient(object):
+    """
+    Wraps a UserStore.Client or NoteStore.Client, every service method
+    called through it goes through limiter.call(). send_*/recv_* and the
+    protocol attributes are passed through as they are.
+    """
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith(('_', 'send_', 'recv_')) or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._limiter.call(attr, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+
+        self.__dict__[name] = call
+        return call
+
+
+def schedule(client, limiter):
+    return ScheduledClient(client, limiter)
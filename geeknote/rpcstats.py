@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import json
+import atexit
+import threading
+import contextlib
+
+import config
+import ratelimit
+from log import logging
+
+import evernote.edam.error.ttypes as Errors
+
+
+def errorName(e):
+    """ EDAMErrorCode name of an Evernote error, class name of anything else """
+    errorCode = getattr(e, 'errorCode', None)
+    if errorCode is not None:
+        return Errors.EDAMErrorCode._VALUES_TO_NAMES.get(errorCode, str(errorCode))
+    return e.__class__.__name__
+
+
+def _counters(trans):
+    """ bytes sent, bytes received and retries of a THttpClient so far """
+    return (getattr(trans, 'bytes_out_comp', 0),
+            getattr(trans, 'bytes_in_comp', 0),
+            getattr(trans, 'retries', 0))
+
+
+class RpcStats(object):
+    """
+    Per method totals of Evernote calls: count, errors by code, wall time,
+    bytes on the wire and connection retries.
+
+    Totals of this process are kept in memory and added to the ones in
+    path by save(), which the command line tools run at exit. With
+    tracePath every call is also appended to that file as a JSON line.
+    """
+
+    def __init__(self, path=None, tracePath=None):
+        self.path = path or config.RPC_STATS
+        self.tracePath = tracePath if tracePath is not None else config.RPC_TRACE
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    @contextlib.contextmanager
+    def measure(self, method, trans):
+        """ record the call made in the with block over transport trans """
+        before = _counters(trans)
+        start = time.time()
+        error = None
+        try:
+            yield
+        except Exception, e:
+            error = errorName(e)
+            raise
+        finally:
+            after = _counters(trans)
+            self.record(method, time.time() - start, after[0] - before[0],
+                        after[1] - before[1], after[2] - before[2], error)
+
+    def record(self, method, seconds, bytesOut, bytesIn, retries=0, error=None):
+        with self.lock:
+            totals = self.methods.setdefault(method, _empty())
+            _add(totals, {
+                'calls': 1,
+                'errors': 1 if error else 0,
+                'seconds': seconds,
+                'maxSeconds': seconds,
+                'bytesOut': bytesOut,
+                'bytesIn': bytesIn,
+                'retries': retries,
+                'errorCodes': {error: 1} if error else {},
+            })
+
+            if self.tracePath:
+                trace = {'time': time.time(), 'method': method, 'seconds': round(seconds, 6),
+                         'bytesOut': bytesOut, 'bytesIn': bytesIn, 'retries': retries,
+                         'error': error}
+                try:
+                    with open(self.tracePath, 'a') as f:
+                        f.write(json.dumps(trace) + '\n')
+                except IOError, e:
+                    logging.error("Can not write RPC trace %s: %s", self.tracePath, e)
+
+    def load(self):
+        """ totals saved by previous runs """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError:
+            logging.error("Broken RPC statistics in %s", self.path)
+            return {}
+
+    def totals(self):
+        """ saved and unsaved totals, {method: totals} """
+        methods = self.load()
+        with self.lock:
+            for method, totals in self.methods.items():
+                _add(methods.setdefault(method, _empty()), totals)
+        return methods
+
+    def save(self):
+        with self.lock:
+            if not self.methods:
+                return
+            methods, self.methods = self.methods, {}
+
+        tmpPath = self.path + '.tmp'
+        try:
+            # other geeknote processes add their totals to the same file
+            with open(self.path + '.lock', 'a+') as lock:
+                ratelimit.lockFile(lock)
+                try:
+                    saved = self.load()
+                    for method, totals in methods.items():
+                        _add(saved.setdefault(method, _empty()), totals)
+
+                    with open(tmpPath, 'w') as f:
+                        json.dump(saved, f)
+                    if os.name == 'nt' and os.path.exists(self.path):
+                        os.remove(self.path)
+                    os.rename(tmpPath, self.path)
+                finally:
+                    ratelimit.unlockFile(lock)
+        except (IOError, OSError), e:
+            logging.error("Can not save RPC statistics to %s: %s", self.path, e)
+
+    def reset(self):
+        with self.lock:
+            self.methods = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _empty():
+    return {'calls': 0, 'errors': 0, 'seconds': 0.0, 'maxSeconds': 0.0,
+            'bytesOut': 0, 'bytesIn': 0, 'retries': 0, 'errorCodes': {}}
+
+
+def _add(totals, other):
+    for key in ('calls', 'errors', 'seconds', 'bytesOut', 'bytesIn', 'retries'):
+        totals[key] += other[key]
+    totals['maxSeconds'] = max(totals['maxSeconds'], other['maxSeconds'])
+    for code, count in other['errorCodes'].items():
+        totals['errorCodes'][code] = totals['errorCodes'].get(code, 0) + count
+
+
+class InstrumentedClient(object):
+    """
+    Wraps a UserStore.Client or NoteStore.Client, every service method
+    called through it is recorded in stats. send_*/recv_* and the
+    protocol attributes are passed through as they are.
+    """
+
+    def __init__(self, client, stats=None):
+        self._client = client
+        self._stats = stats or globalStats
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith(('_', 'send_', 'recv_')) or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._stats.measure(name, self._client._iprot.trans):
+                return attr(*args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+
+        self.__dict__[name] = call
+        return call
+
+
+def instrument(client, stats=None):
+    return InstrumentedClient(client, stats)
+
+
+globalStats = RpcStats()
+
+
+def saveAtExit():
+    """ add the calls of this process to the saved totals when it exits """
+    atexit.register(lambda: globalStats.save())
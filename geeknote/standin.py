@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os, sys
+import time
+import threading
+import SocketServer
+import BaseHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append( os.path.join(PROJECT_ROOT, 'lib') )
+
+from thrift.protocol import TBinaryProtocol
+from thrift.server import THttpServer
+
+
+class StandinHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server which counts accepted TCP connections.
+    handshakeDelay (seconds) is slept once per new connection to emulate
+    the TCP + TLS handshake round trips of a remote endpoint.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    handshakeDelay = 0
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def finish_request(self, request, client_address):
+        if self.handshakeDelay:
+            time.sleep(self.handshakeDelay)
+        BaseHTTPServer.HTTPServer.finish_request(self, request, client_address)
+
+
+class Standin(object):
+    """
+    Local stand-in for an Evernote endpoint.
+    Serves a Thrift processor over HTTP on 127.0.0.1, used by tests and benchmarks.
+    """
+
+    def __init__(self, processor, path='/', handshakeDelay=0,
+                 protocolFactory=None, compress=False):
+        if protocolFactory is None:
+            protocolFactory = TBinaryProtocol.TBinaryProtocolFactory()
+
+        self.path = path
+        self.server = THttpServer.THttpServer(processor, ('127.0.0.1', 0),
+                                              protocolFactory,
+                                              server_class=StandinHTTPServer,
+                                              compress=compress)
+        self.server.httpd.handshakeDelay = handshakeDelay
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.httpd.server_address
+        return "http://%s:%d%s" % (host, port, self.path)
+
+    @property
+    def connections(self):
+        return self.server.httpd.connections
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.httpd.shutdown()
+        self.server.httpd.server_close()
+        self.thread.join()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os, sys
+import time
 import datetime
 import pickle
 
@@ -12,6 +13,9 @@ from sqlalchemy.orm import sessionmaker
 import logging
 import config
 
+from thrift import TSerialization
+from notecache import CACHE_PROTOCOLS
+
 db_path = os.path.join(config.APP_DIR, 'database.db')
 engine = create_engine('sqlite:///' + db_path)
 Base = declarative_base()
@@ -166,6 +170,46 @@ class Storage(object):
         return False if something wrong
         """
         return self.getUserprop('info')
+
+    @logging
+    def setBootstrap(self, bootstrap):
+        """
+        Set what connecting to Evernote needs besides the oAuth token:
+        note store url, version check result, shard. Bootstrap must be an instanse of dict
+        The time of the first call is kept to expire it
+        return True if all done
+        return False if something wrong
+        """
+        if not isinstance(bootstrap, dict):
+            raise Exception("Wrong bootstrap")
+
+        bootstrap.setdefault('created', time.time())
+        return self.setUserprop('bootstrap', bootstrap)
+
+    @logging
+    def getBootstrap(self, ttl):
+        """
+        Get the bootstrap of the user
+        return dict if it was set less than ttl seconds ago
+        return None if there is not bootstrap or it has expired
+        return False if something wrong
+        """
+        bootstrap = self.getUserprop('bootstrap')
+        if bootstrap and time.time() - bootstrap['created'] < ttl:
+            return bootstrap
+        return None
+
+    @logging
+    def removeBootstrap(self):
+        """
+        Remove the bootstrap, the next connection asks Evernote again
+        return True if all done
+        return False if something wrong
+        """
+        for item in self.session.query(Userprop).filter_by(key='bootstrap').all():
+            self.session.delete(item)
+        self.session.commit()
+        return True
     
     @logging   
     def getUserprops(self):
@@ -364,7 +408,15 @@ class Storage(object):
         """            
         for item in self.session.query(Search).all():
             self.session.delete(item)
-            
+
+        # Thrift structs, like the NotesMetadataList of a search, are stored serialized,
+        # loading them back is much cheaper than unpickling. The protocol name is kept
+        # as config.CACHE_PROTOCOL may change.
+        if hasattr(search_obj, 'thrift_spec'):
+            search_obj = (search_obj.__class__,
+                          TSerialization.serialize(search_obj, CACHE_PROTOCOLS[config.CACHE_PROTOCOL]),
+                          config.CACHE_PROTOCOL)
+
         search = pickle.dumps(search_obj)
         instance = Search(search)
         self.session.add(instance)
@@ -381,4 +433,8 @@ class Storage(object):
         return False if something wrong
         """
         search = self.session.query(Search).first()
-        return pickle.loads(search.search_obj)
+        search_obj = pickle.loads(search.search_obj)
+        if isinstance(search_obj, tuple):
+            cls, data, protocol = search_obj
+            search_obj = TSerialization.deserialize(cls(), data, CACHE_PROTOCOLS[protocol])
+        return search_obj
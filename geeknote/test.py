@@ -24,5 +24,44 @@ suite.addTest(geeknoteTest.suite())
 from unit import editorTest
 suite.addTest(editorTest.suite())
 
+from unit import httpClientTest
+suite.addTest(httpClientTest.suite())
+
+from unit import transportTest
+suite.addTest(transportTest.suite())
+
+from unit import codecTest
+suite.addTest(codecTest.suite())
+
+from unit import asyncnoteTest
+suite.addTest(asyncnoteTest.suite())
+
+from unit import notecacheTest
+suite.addTest(notecacheTest.suite())
+
+from unit import rpcstatsTest
+suite.addTest(rpcstatsTest.suite())
+
+from unit import ratelimitTest
+suite.addTest(ratelimitTest.suite())
+from unit import coalesceTest
+suite.addTest(coalesceTest.suite())
+from unit import fakeserviceTest
+suite.addTest(fakeserviceTest.suite())
+from unit import bootstrapTest
+suite.addTest(bootstrapTest.suite())
+from unit import searchTest
+suite.addTest(searchTest.suite())
+from unit import mirrorTest
+suite.addTest(mirrorTest.suite())
+from unit import namesTest
+suite.addTest(namesTest.suite())
+from unit import bulkTest
+suite.addTest(bulkTest.suite())
+from unit import updateTest
+suite.addTest(updateTest.suite())
+from unit import gnsyncTest
+suite.addTest(gnsyncTest.suite())
+
 
 unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.standin import Standin
+from geeknote.geeknote import GeekNote
+from geeknote.asyncnote import AsyncGeekNote, NoteStorePool
+from geeknote.unit.bootstrapTest import LocalFilesCase
+import unittest
+import threading
+import time
+
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class NoteStoreHandler(NoteStore.Iface):
+
+    def __init__(self, delay):
+        self.delay = delay
+        # when set, calls wait for it instead of sleeping
+        self.gate = None
+        self.lock = threading.Condition()
+        self.inFlight = 0
+        self.maxInFlight = 0
+
+    def waitInFlight(self, calls, timeout=5):
+        """ wait until calls are in flight at once, return how many are """
+        deadline = time.time() + timeout
+        with self.lock:
+            while self.inFlight < calls and time.time() < deadline:
+                self.lock.wait(deadline - time.time())
+            return self.inFlight
+
+    def getNote(self, authenticationToken, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        with self.lock:
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+            self.lock.notify_all()
+        try:
+            if self.gate:
+                self.gate.wait()
+            else:
+                time.sleep(self.delay)
+            if guid == "missing":
+                raise Errors.EDAMNotFoundException(identifier="Note.guid", key=guid)
+            return Types.Note(guid=guid, title="note " + guid,
+                              content="<en-note/>" if withContent else None)
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+
+    def updateNote(self, authenticationToken, note):
+        note.updateSequenceNum = 2
+        return note
+
+
+class GeekNoteOver(GeekNote):
+    def __init__(self, noteStoreUrl):
+        self.noteStoreUrl = noteStoreUrl
+        self.authToken = "token"
+
+    def getNoteStoreUrl(self):
+        return self.noteStoreUrl
+
+
+class testNoteStorePool(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = NoteStoreHandler(0.2)
+        self.standin = Standin(NoteStore.Processor(self.handler), '/edam/note').start()
+        self.pool = NoteStorePool(self.standin.url, workers=8)
+
+    def tearDown(self):
+        self.pool.close()
+        self.standin.stop()
+
+    def testInFlight(self):
+        guids = ["guid-%d" % i for i in range(16)]
+        self.handler.gate = threading.Event()
+        futures = [self.pool.submit('getNote', "token", guid, False, False, False, False) for guid in guids]
+
+        # every worker is held in a call, the other calls wait for one of them
+        self.assertEqual(self.handler.waitInFlight(8), 8)
+        self.assertEqual(self.handler.waitInFlight(9, timeout=0.2), 8)
+        self.assertEqual(len([future for future in futures if future.done()]), 0)
+        self.handler.gate.set()
+
+        self.assertEqual([future.result().guid for future in futures], guids)
+        self.assertEqual(self.handler.maxInFlight, 8)
+        self.assertEqual(self.standin.connections, 8)
+
+    def testException(self):
+        missing = self.pool.submit('getNote', "token", "missing", False, False, False, False)
+        found = self.pool.submit('getNote', "token", "guid", False, False, False, False)
+        self.assertRaises(Errors.EDAMNotFoundException, missing.result)
+        self.assertEqual(missing.exception().key, "missing")
+        self.assertEqual(found.result().guid, "guid")
+
+    def testClientError(self):
+        def protocolFactory(noteStoreUrl, httpPool):
+            raise ValueError("no protocol")
+        pool = NoteStorePool(self.standin.url, workers=2, protocolFactory=protocolFactory)
+        try:
+            futures = [pool.submit('getNote', "token", "guid", False, False, False, False) for i in range(4)]
+            self.assertEqual([str(future.exception(5)) for future in futures], ["no protocol"] * 4)
+        finally:
+            pool.close()
+
+    def testResultTimeout(self):
+        future = self.pool.submit('getNote', "token", "guid", False, False, False, False)
+        self.assertRaises(RuntimeError, future.result, 0.01)
+        self.assertEqual(future.result().guid, "guid")
+
+
+class testAsyncGeekNote(LocalFilesCase):
+
+    def setUp(self):
+        super(testAsyncGeekNote, self).setUp()
+        self.standin = Standin(NoteStore.Processor(NoteStoreHandler(0)), '/edam/note').start()
+        self.evernote = AsyncGeekNote(GeekNoteOver(self.standin.url), workers=2)
+
+    def tearDown(self):
+        self.evernote.close()
+        self.standin.stop()
+        super(testAsyncGeekNote, self).tearDown()
+
+    def testGetNotes(self):
+        notes = self.evernote.getNotes(["a", "b", "c"], with_content=True)
+        self.assertEqual([note.title for note in notes], ["note a", "note b", "note c"])
+        self.assertEqual(notes[0].content, "<en-note/>")
+
+    def testUpdateNote(self):
+        note = self.evernote.updateNote(Types.Note(guid="a", title="title")).result()
+        self.assertEqual(note.updateSequenceNum, 2)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testNoteStorePool))
+    suite.addTest(unittest.makeSuite(testAsyncGeekNote))
+    return suite
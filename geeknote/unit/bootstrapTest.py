@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote
+from geeknote.fakeservice import FakeEvernote
+from geeknote.ratelimit import RateLimiter
+from geeknote.notecache import NoteCache
+from geeknote import storage
+from geeknote import rpcstats
+from geeknote import config
+import unittest
+import tempfile
+import shutil
+import time
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+import evernote.edam.type.ttypes as Types
+
+
+class LocalFilesCase(unittest.TestCase):
+    """ the files GeekNote keeps in APP_DIR go to the temporary directory self.dir """
+
+    FILES = ('NOTE_CACHE', 'RATE_LIMIT_FILE', 'RPC_STATS', 'MIRROR_FILE')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.savedFiles = dict((name, getattr(config, name)) for name in self.FILES)
+        for name in self.FILES:
+            setattr(config, name, os.path.join(self.dir, os.path.basename(getattr(config, name))))
+
+        self.savedGlobals = (GeekNote.noteCache, GeekNote.rateLimiter, rpcstats.globalStats)
+        # made again from config when first used
+        GeekNote.noteCache = GeekNote.rateLimiter = None
+        rpcstats.globalStats = rpcstats.RpcStats()
+
+    def tearDown(self):
+        GeekNote.noteCache, GeekNote.rateLimiter, rpcstats.globalStats = self.savedGlobals
+        for name, value in self.savedFiles.items():
+            setattr(config, name, value)
+        shutil.rmtree(self.dir)
+
+
+class GeekNoteCase(LocalFilesCase):
+    """ GeekNote connected to a FakeEvernote, with its local files in a temporary directory """
+
+    def setUp(self):
+        super(GeekNoteCase, self).setUp()
+        self.saved = dict((name, getattr(GeekNote, name)) for name in
+                          ('userStoreUri', 'userStore', 'noteStore', 'storage',
+                           'bootstrap', 'mirror', 'mirrorSynced', 'updateCount'))
+        self.engine = storage.engine
+        # one in-memory database for all threads: a session collected on a
+        # worker thread must not drop the connection, and the data, of this one
+        storage.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                       connect_args={'check_same_thread': False})
+
+        self.fake = FakeEvernote().start()
+        self.fake.noteStore.createNote(self.fake.token, Types.Note(title="Meeting", content="<en-note/>"))
+
+        GeekNote.userStoreUri = self.fake.userStoreUrl
+        GeekNote.storage = storage.Storage()
+        GeekNote.storage.createUser(self.fake.token, Types.User(id=1))
+        GeekNote.rateLimiter = RateLimiter(os.path.join(self.dir, "ratelimit.lock"))
+        GeekNote.noteCache = NoteCache(os.path.join(self.dir, "notes.cache"))
+        self.restart()
+
+    def tearDown(self):
+        if GeekNote.mirror:
+            GeekNote.mirror.close()
+        for name, value in self.saved.items():
+            setattr(GeekNote, name, value)
+        storage.engine = self.engine
+        GeekNote.httpPool.clear()
+        self.fake.stop()
+        super(GeekNoteCase, self).tearDown()
+
+    def restart(self):
+        """ forget the connections, as a new geeknote process would """
+        GeekNote.userStore = GeekNote.noteStore = GeekNote.bootstrap = GeekNote.mirror = None
+        GeekNote.mirrorSynced = False
+        GeekNote.updateCount = None
+        self.fake.calls.clear()
+
+
+class testBootstrap(GeekNoteCase):
+
+    def testWarm(self):
+        GeekNote().findNotes("Meeting", 10)
+        self.assertEqual(sorted(self.fake.calls), ['checkVersion', 'findNotesMetadata', 'getNoteStoreUrl'])
+        bootstrap = GeekNote.storage.getBootstrap(60)
+        self.assertEqual((bootstrap['noteStoreUrl'], bootstrap['shardId'], bootstrap['versionOK']),
+                         (self.fake.noteStoreUrl, 's1', True))
+
+        self.restart()
+        self.assertEqual(GeekNote().findNotes("Meeting", 10).totalNotes, 1)
+        self.assertEqual(self.fake.calls, {'findNotesMetadata': 1})
+
+    def testExpired(self):
+        GeekNote().findNotes("Meeting", 10)
+        self.assertEqual(GeekNote.storage.getBootstrap(0), None)
+
+        bootstrap = GeekNote.storage.getBootstrap(60)
+        bootstrap['created'] = time.time() - config.BOOTSTRAP_TTL - 1
+        GeekNote.storage.setBootstrap(bootstrap)
+        self.restart()
+        GeekNote().findNotes("Meeting", 10)
+        self.assertEqual(sorted(self.fake.calls), ['checkVersion', 'findNotesMetadata', 'getNoteStoreUrl'])
+
+    def testAuthError(self):
+        GeekNote().findNotes("Meeting", 10)
+        self.restart()
+
+        # an invalid token drops the bootstrap
+        GeekNote.storage.setUserprop('oAuthToken', "invalid")
+        self.assertEqual(GeekNote().findNotes("Meeting", 10), False)
+        self.assertEqual(GeekNote.bootstrap, None)
+        self.assertEqual(GeekNote.storage.getBootstrap(60), None)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testBootstrap))
+    return suite
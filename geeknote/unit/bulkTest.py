@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote
+from geeknote.unit.bootstrapTest import GeekNoteCase
+from geeknote.ratelimit import RateLimiter
+import unittest
+import threading
+import time
+import os
+
+import evernote.edam.type.ttypes as Types
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.error.ttypes as Errors
+
+
+class testBulk(GeekNoteCase):
+
+    def testCreateNotes(self):
+        # calls are held at the service until as many as there are workers wait at once
+        lock = threading.Condition()
+        waiting = {'now': 0, 'most': 0}
+
+        def hold(authenticationToken, note):
+            with lock:
+                waiting['now'] += 1
+                waiting['most'] = max(waiting['most'], waiting['now'])
+                lock.notify_all()
+                deadline = time.time() + 5
+                while waiting['most'] < 4 and time.time() < deadline:
+                    lock.wait(deadline - time.time())
+                waiting['now'] -= 1
+        self.fake.latency = {'createNote': hold}
+
+        notes = [dict(title="Note %d" % i, content="<en-note/>") for i in range(8)]
+        notes[3]['notebook'] = "no-such-notebook"
+        notes.append(Types.Note(title="Struct", content="<en-note/>"))
+
+        results = GeekNote().createNotes(iter(notes), workers=4)
+        self.assertEqual(waiting['most'], 4)
+
+        self.assertEqual([getattr(note, 'title', None) for note in results],
+                         ["Note 0", "Note 1", "Note 2", None, "Note 4", "Note 5", "Note 6", "Note 7", "Struct"])
+        self.assertTrue(isinstance(results[3], Errors.EDAMNotFoundException))
+        self.assertEqual(self.fake.calls['createNote'], 9)
+
+    def testUpdateNotes(self):
+        created = GeekNote().createNotes([dict(title="Note %d" % i, content="<en-note/>") for i in range(3)])
+        GeekNote().loadNoteContent(created[0])
+        updates = [dict(guid=note.guid, title="Renamed %d" % i) for i, note in enumerate(created)]
+        updates[1] = Types.Note(guid=created[1].guid, title="Struct")
+
+        results = GeekNote().updateNotes(updates)
+        self.assertEqual([note.title for note in results], ["Renamed 0", "Struct", "Renamed 2"])
+        self.assertEqual(GeekNote.noteCache.get(created[0].guid, created[0].updateSequenceNum), None)
+
+    def testReadAfter(self):
+        note = GeekNote().createNote("Note", "<en-note/>")
+        self.assertEqual(GeekNote().getNote(note.guid).title, "Note")
+        GeekNote().updateNotes([dict(guid=note.guid, title="Renamed")])
+        self.assertEqual(GeekNote().getNote(note.guid).title, "Renamed")
+
+    def testRecords(self):
+        note = GeekNote().createNote("Note", "<en-note/>")
+        metadata = NoteStore.NoteMetadata(guid=note.guid, title="Renamed")
+        self.assertRaises(TypeError, GeekNote().updateNotes, [metadata])
+        self.assertRaises(TypeError, GeekNote().createNotes, [metadata])
+        self.assertEqual(self.fake.calls.get('updateNote'), None)
+
+    def testRateLimit(self):
+        self.fake.rateLimit = (3, 1)
+        GeekNote.rateLimiter = RateLimiter(os.path.join(self.dir, "ratelimit.lock"), rate=100, burst=10)
+        results = GeekNote().createNotes([dict(title="Note %d" % i, content="<en-note/>") for i in range(5)])
+        self.assertEqual([note.title for note in results], ["Note %d" % i for i in range(5)])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testBulk))
+    return suite
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.coalesce import CoalescingClient
+import unittest
+import threading
+import time
+
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class NoteStoreOver(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+        self._iprot = "protocol"
+
+    def listNotebooks(self, authenticationToken):
+        self.calls.append('listNotebooks')
+        time.sleep(self.delay)
+        return [Types.Notebook(guid="nb-%d" % len(self.calls), name="notebook")]
+
+    def getNote(self, authenticationToken, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        self.calls.append('getNote')
+        if guid == "missing":
+            raise Errors.EDAMNotFoundException(identifier="Note.guid", key=guid)
+        return Types.Note(guid=guid, content="<en-note/>" if withContent else None)
+
+    def getNoteContent(self, authenticationToken, guid):
+        self.calls.append('getNoteContent')
+        return "<en-note/>"
+
+    def createNotebook(self, authenticationToken, notebook):
+        self.calls.append('createNotebook')
+        return notebook
+
+
+class testCoalescingClient(unittest.TestCase):
+
+    def setUp(self):
+        self.noteStore = NoteStoreOver()
+        self.client = CoalescingClient(self.noteStore, window=10)
+
+    def testRepeated(self):
+        first = self.client.listNotebooks("token")
+        second = self.client.listNotebooks("token")
+        self.assertEqual(first, second)
+        self.assertEqual(self.noteStore.calls, ['listNotebooks'])
+
+        # callers get their own copies
+        second[0].name = "renamed"
+        self.assertEqual(self.client.listNotebooks("token")[0].name, "notebook")
+
+    def testArguments(self):
+        self.client.getNote("token", "a", False, False, False, False)
+        self.client.getNote("token", "a", True, False, False, False)
+        self.client.getNote("token", "a", True, False, False, False)
+        self.assertEqual(self.noteStore.calls, ['getNote', 'getNote'])
+
+    def testInFlight(self):
+        self.noteStore.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client.listNotebooks("token")))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.noteStore.calls, ['listNotebooks'])
+
+    def testWindow(self):
+        client = CoalescingClient(self.noteStore, window=0.1)
+        client.listNotebooks("token")
+        time.sleep(0.2)
+        self.assertEqual(client.listNotebooks("token")[0].guid, "nb-2")
+
+    def testInvalidate(self):
+        self.client.listNotebooks("token")
+        self.client.createNotebook("token", Types.Notebook(name="new"))
+        self.assertEqual(self.client.listNotebooks("token")[0].guid, "nb-3")
+
+    def testNotCoalesced(self):
+        self.client.getNoteContent("token", "a")
+        self.client.getNoteContent("token", "a")
+        self.assertEqual(self.noteStore.calls, ['getNoteContent', 'getNoteContent'])
+        self.assertEqual(self.client._iprot, "protocol")
+
+    def testError(self):
+        for i in range(2):
+            self.assertRaises(Errors.EDAMNotFoundException,
+                              self.client.getNote, "token", "missing", False, False, False, False)
+        # failures are not reused
+        self.assertEqual(self.noteStore.calls, ['getNote', 'getNote'])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testCoalescingClient))
+    return suite
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import pickle
+
+from thrift import TSerialization
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.protocol import TCodec
+from thrift.transport import TTransport
+import evernote.edam.type.ttypes as Types
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.error.ttypes as Errors
+
+
+def fullNote(i):
+    return Types.Note(
+        guid="guid-%d" % i, title="title %d" % i, content="<en-note>%d</en-note>" % i,
+        contentHash="\x00\xff" * 8, contentLength=20, created=-1300000000000 - i,
+        active=bool(i % 2), updateSequenceNum=i, tagGuids=["tag-1", "tag-2"],
+        resources=[Types.Resource(guid="res-%d" % i, width=-5, height=32767,
+                                  data=Types.Data(body="\x00" * 10, size=10))],
+        attributes=Types.NoteAttributes(
+            latitude=55.75, longitude=-37.62, author="geeknote",
+            applicationData=Types.LazyMap(keysOnly=set(["a", "b"]),
+                                          fullMap={"a": "1", "b": "2"})))
+
+
+def generated(func):
+    """ run func against the generated read/write code """
+    TCodec.enabled = False
+    try:
+        return func()
+    finally:
+        TCodec.enabled = True
+
+
+class testCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = TBinaryProtocol.TBinaryProtocolFactory()
+        self.notes = NoteStore.NoteList(startIndex=0, totalNotes=3,
+                                        notes=[fullNote(i) for i in range(3)],
+                                        stoppedWords=["the"], updateCount=5)
+
+    def serialize(self, obj):
+        return TSerialization.serialize(obj, self.factory)
+
+    def deserialize(self, obj, data):
+        return TSerialization.deserialize(obj, data, self.factory)
+
+    def testEncode(self):
+        expected = generated(lambda: self.serialize(self.notes))
+        self.assertEqual(self.serialize(self.notes), expected)
+
+    def testDecode(self):
+        data = generated(lambda: self.serialize(self.notes))
+        expected = generated(lambda: self.deserialize(NoteStore.NoteList(), data))
+        result = self.deserialize(NoteStore.NoteList(), data)
+        self.assertEqual(result, expected)
+        self.assertEqual(result, self.notes)
+        self.assertEqual(result.notes[0].attributes.applicationData.keysOnly, set(["a", "b"]))
+
+    def testCached(self):
+        self.serialize(self.notes)
+        encoder = TCodec.encoders[Types.Note]
+        self.serialize(fullNote(1))
+        self.assertTrue(TCodec.encoders[Types.Note] is encoder)
+
+    def testSkipUnknown(self):
+        # a Note read as a Notebook: unknown fields and mismatched types are skipped
+        data = self.serialize(fullNote(1))
+        expected = generated(lambda: self.deserialize(Types.Notebook(), data))
+        self.assertEqual(self.deserialize(Types.Notebook(), data), expected)
+        self.assertEqual(expected.guid, "guid-1")
+
+    def testException(self):
+        error = Errors.EDAMSystemException(errorCode=Errors.EDAMErrorCode.SHARD_UNAVAILABLE,
+                                           message="try again")
+        result = self.deserialize(Errors.EDAMSystemException(), self.serialize(error))
+        self.assertEqual((result.errorCode, result.message), (12, "try again"))
+
+
+class testCompactCodec(testCodec):
+
+    def setUp(self):
+        testCodec.setUp(self)
+        self.factory = TCompactProtocol.TCompactProtocolFactory()
+
+    def testCached(self):
+        self.serialize(self.notes)
+        encoder = TCodec.compactEncoders[Types.Note]
+        self.serialize(fullNote(1))
+        self.assertTrue(TCodec.compactEncoders[Types.Note] is encoder)
+
+    def testValues(self):
+        # long field id gaps, bool fields and list items, large and negative varints
+        state = NoteStore.SyncState(currentTime=1 << 40, fullSyncBefore=-1, updateCount=300,
+                                    uploaded=-(1 << 62))
+        spec = NoteStore.NotesMetadataResultSpec(includeTitle=True, includeContentLength=False,
+                                                 includeAttributes=True)
+        notebook = Types.Notebook(guid="nb", defaultNotebook=False,
+                                  publishing=Types.Publishing(uri="uri", ascending=True))
+        for obj in (state, spec, notebook, Types.Note(guid="g", tagGuids=["t"] * 20)):
+            data = self.serialize(obj)
+            self.assertEqual(data, generated(lambda: self.serialize(obj)))
+            self.assertEqual(self.deserialize(obj.__class__(), data), obj)
+
+    def testBufferBoundaries(self):
+        data = self.serialize(self.notes)
+        for size in (7, 64, 100):
+            trans = TTransport.TBufferedTransport(TTransport.TMemoryBuffer(data), size)
+            result = NoteStore.NoteList()
+            result.read(TCompactProtocol.TCompactProtocol(trans))
+            self.assertEqual(result, self.notes)
+
+    def testVarint(self):
+        for n in (0, 1, 127, 128, 16383, 16384, 1 << 35, (1 << 64) - 1):
+            data = TCompactProtocol.encodeVarint(n)
+            self.assertEqual(TCompactProtocol.readVarint(TTransport.TMemoryBuffer(data)), n)
+            self.assertEqual(TCodec.reader(TTransport.TMemoryBuffer(data)).varint(), n)
+
+
+class testLazy(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = getattr(TCodec.lazyClasses.get(Types.Note), '_lazyFields', ())
+        TCodec.lazy(Types.Note, ('content', 'resources', 'attributes'))
+        self.factory = TBinaryProtocol.TBinaryProtocolFactory()
+        self.notes = NoteStore.NoteList(startIndex=0, totalNotes=3,
+                                        notes=[fullNote(i) for i in range(3)])
+        self.data = TSerialization.serialize(self.notes, self.factory)
+
+    def tearDown(self):
+        TCodec.lazy(Types.Note, self.previous)
+
+    def decode(self):
+        return TSerialization.deserialize(NoteStore.NoteList(), self.data, self.factory)
+
+    def testDeferred(self):
+        note = self.decode().notes[1]
+        self.assertIsInstance(note, Types.Note)
+        self.assertEqual(note.title, "title 1")
+        self.assertEqual(note.tagGuids, ["tag-1", "tag-2"])
+        self.assertIsInstance(note.__dict__['content'], TCodec._Raw)
+        self.assertIsInstance(note.__dict__['resources'], TCodec._Raw)
+
+        self.assertEqual(note.content, "<en-note>1</en-note>")
+        self.assertEqual(note.__dict__['content'], "<en-note>1</en-note>")
+        self.assertEqual(note.resources[0].data.body, "\x00" * 10)
+        self.assertEqual(note.attributes.applicationData.fullMap, {"a": "1", "b": "2"})
+
+    def testAssign(self):
+        note = self.decode().notes[0]
+        note.content = "<en-note/>"
+        self.assertEqual(note.content, "<en-note/>")
+
+    def testCompare(self):
+        result = self.decode()
+        self.assertEqual(result, self.notes)
+        self.assertEqual(self.notes, self.decode())
+        self.assertNotEqual(result.notes[0], result.notes[1])
+        self.assertTrue(repr(result.notes[0]).startswith("Note("))
+
+    def testPickle(self):
+        note = pickle.loads(pickle.dumps(self.decode().notes[2], 2))
+        self.assertEqual(note.__class__, Types.Note)
+        self.assertEqual(note, fullNote(2))
+
+    def testEncode(self):
+        self.assertEqual(TSerialization.serialize(self.decode(), self.factory), self.data)
+
+    def testBufferBoundaries(self):
+        # fields which cross a refill of the read buffer are decoded eagerly
+        for size in (7, 64, 100):
+            trans = TTransport.TBufferedTransport(TTransport.TMemoryBuffer(self.data), size)
+            result = NoteStore.NoteList()
+            result.read(TBinaryProtocol.TBinaryProtocol(trans))
+            self.assertEqual(result, self.notes)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testCodec))
+    suite.addTest(unittest.makeSuite(testCompactCodec))
+    suite.addTest(unittest.makeSuite(testLazy))
+    return suite
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.fakeservice import FakeEvernote
+from geeknote.ratelimit import RateLimiter, ScheduledClient
+import unittest
+import tempfile
+import hashlib
+import shutil
+import time
+import os
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+import evernote.edam.userstore.UserStore as UserStore
+import evernote.edam.userstore.constants as UserStoreConstants
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+def client(service, url):
+    return service.Client(TBinaryProtocol.TBinaryProtocol(THttpClient.THttpClient(url)))
+
+
+class testFakeEvernote(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeEvernote().start()
+        self.token = self.fake.token
+        self.userStore = client(UserStore, self.fake.userStoreUrl)
+        self.noteStore = client(NoteStore, self.userStore.getNoteStoreUrl(self.token))
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def createNote(self, title, content="<en-note/>", **kwargs):
+        return self.noteStore.createNote(self.token, Types.Note(title=title, content=content, **kwargs))
+
+    def testUserStore(self):
+        self.assertTrue(self.userStore.checkVersion("test", UserStoreConstants.EDAM_VERSION_MAJOR,
+                                                    UserStoreConstants.EDAM_VERSION_MINOR))
+        self.assertFalse(self.userStore.checkVersion("test", UserStoreConstants.EDAM_VERSION_MAJOR + 1, 0))
+        self.assertEqual(self.userStore.getUser(self.token).shardId, "s1")
+        self.assertEqual(self.noteStore.getDefaultNotebook(self.token).name, "My Notebook")
+
+    def testNotebooksAndTags(self):
+        notebook = self.noteStore.createNotebook(self.token, Types.Notebook(name="Work"))
+        self.assertEqual([nb.name for nb in self.noteStore.listNotebooks(self.token)],
+                         ["My Notebook", "Work"])
+        self.assertRaises(Errors.EDAMUserException, self.noteStore.createNotebook,
+                          self.token, Types.Notebook(name="work"))
+
+        usn = self.noteStore.updateNotebook(self.token, Types.Notebook(guid=notebook.guid, name="Job"))
+        self.assertTrue(usn > notebook.updateSequenceNum)
+        self.assertEqual(self.noteStore.getNotebook(self.token, notebook.guid).name, "Job")
+
+        tag = self.noteStore.createTag(self.token, Types.Tag(name="todo"))
+        self.noteStore.expungeTag(self.token, tag.guid)
+        self.noteStore.expungeNotebook(self.token, notebook.guid)
+        self.assertEqual(self.noteStore.listTags(self.token), [])
+        self.assertRaises(Errors.EDAMNotFoundException, self.noteStore.getNotebook,
+                          self.token, notebook.guid)
+
+    def testNotes(self):
+        content = "<en-note>Buy milk</en-note>"
+        note = self.createNote("Shopping", content, tagNames=["home"])
+        self.assertEqual(note.content, None)
+        self.assertEqual(note.contentHash, hashlib.md5(content).digest())
+        self.assertEqual([tag.name for tag in self.noteStore.listTags(self.token)], ["home"])
+        self.assertEqual(self.noteStore.getNote(self.token, note.guid, True, False, False, False).content,
+                         content)
+
+        updated = self.noteStore.updateNote(self.token, Types.Note(guid=note.guid, title="Groceries"))
+        self.assertTrue(updated.updateSequenceNum > note.updateSequenceNum)
+        self.assertEqual(self.noteStore.getNoteContent(self.token, note.guid), content)
+        self.assertEqual(self.noteStore.getNoteTagNames(self.token, note.guid), ["home"])
+
+        self.noteStore.deleteNote(self.token, note.guid)
+        found = self.noteStore.findNotes(self.token, NoteStore.NoteFilter(), 0, 10)
+        self.assertEqual(found.totalNotes, 0)
+
+    def testResources(self):
+        body = "\x89PNG" + "x" * 1000
+        resource = Types.Resource(mime="image/png", data=Types.Data(body=body))
+        note = self.createNote("Picture", resources=[resource])
+
+        guid = note.resources[0].guid
+        self.assertEqual(note.resources[0].data.body, None)
+        self.assertEqual(note.resources[0].data.size, len(body))
+        self.assertEqual(self.noteStore.getResourceData(self.token, guid), body)
+
+    def testSearch(self):
+        work = self.noteStore.createNotebook(self.token, Types.Notebook(name="Work"))
+        self.createNote("Meeting notes", "<en-note>budget review</en-note>",
+                        notebookGuid=work.guid, tagNames=["project"])
+        self.createNote("Shopping", "<en-note>milk and budget</en-note>")
+        self.createNote("Travel", "<en-note>tickets</en-note>", tagNames=["projection"])
+
+        def search(words):
+            noteFilter = NoteStore.NoteFilter(words=words, order=Types.NoteSortOrder.TITLE, ascending=True)
+            return [note.title for note in self.noteStore.findNotes(self.token, noteFilter, 0, 10).notes]
+
+        self.assertEqual(search("budget"), ["Meeting notes", "Shopping"])
+        self.assertEqual(search("budget -notebook:Work"), ["Shopping"])
+        self.assertEqual(search("tag:project"), ["Meeting notes"])
+        self.assertEqual(search("tag:proj*"), ["Meeting notes", "Travel"])
+        self.assertEqual(search('intitle:"meeting notes"'), ["Meeting notes"])
+        self.assertEqual(search("any: milk tickets"), ["Shopping", "Travel"])
+
+        spec = NoteStore.NotesMetadataResultSpec(includeTitle=True)
+        result = self.noteStore.findNotesMetadata(self.token, NoteStore.NoteFilter(words="budget"), 0, 1, spec)
+        self.assertEqual(result.totalNotes, 2)
+        self.assertEqual(len(result.notes), 1)
+        self.assertTrue(result.notes[0].title)
+        self.assertEqual(result.notes[0].created, None)
+
+    def testSync(self):
+        notes = [self.createNote("Note %d" % i) for i in range(5)]
+        self.noteStore.expungeNote(self.token, notes[0].guid)
+        state = self.noteStore.getSyncState(self.token)
+
+        # read the account in chunks of 2 entries
+        usn, seen, expunged = 0, [], []
+        while usn < state.updateCount:
+            chunk = self.noteStore.getSyncChunk(self.token, usn, 2, False)
+            seen += [note.guid for note in chunk.notes or []]
+            expunged += chunk.expungedNotes or []
+            usn = chunk.chunkHighUSN
+        self.assertEqual(seen, [note.guid for note in notes[1:]])
+        self.assertEqual(expunged, [notes[0].guid])
+
+        chunk = self.noteStore.getSyncChunk(self.token, 0, 100, True)
+        self.assertEqual(chunk.expungedNotes, None)
+        self.assertEqual(len(chunk.notebooks), 1)
+
+    def testAuth(self):
+        self.fake.expire()
+        try:
+            self.noteStore.listNotebooks(self.token)
+        except Errors.EDAMUserException, e:
+            self.assertEqual(e.errorCode, Errors.EDAMErrorCode.AUTH_EXPIRED)
+        else:
+            self.fail("EDAMUserException not raised")
+
+
+class testFakeEvernoteLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.fake.stop()
+        shutil.rmtree(self.dir)
+
+    def testLatency(self):
+        self.fake = FakeEvernote(latency={'listTags': 0.2}).start()
+        noteStore = client(NoteStore, self.fake.noteStoreUrl)
+        start = time.time()
+        noteStore.listNotebooks(self.fake.token)
+        self.assertTrue(time.time() - start < 0.2)
+        noteStore.listTags(self.fake.token)
+        self.assertTrue(time.time() - start > 0.2)
+        self.assertEqual(self.fake.calls, {'listNotebooks': 1, 'listTags': 1})
+
+    def testRateLimit(self):
+        self.fake = FakeEvernote(rateLimit=(2, 1)).start()
+        noteStore = client(NoteStore, self.fake.noteStoreUrl)
+        noteStore.listTags(self.fake.token)
+        noteStore.listTags(self.fake.token)
+        try:
+            noteStore.listTags(self.fake.token)
+        except Errors.EDAMSystemException, e:
+            self.assertEqual(e.errorCode, Errors.EDAMErrorCode.RATE_LIMIT_REACHED)
+            self.assertEqual(e.rateLimitDuration, 1)
+        else:
+            self.fail("EDAMSystemException not raised")
+
+        # a scheduled client waits for the window to pass
+        limiter = RateLimiter(os.path.join(self.dir, "ratelimit.lock"), rate=100, burst=10)
+        self.assertEqual(ScheduledClient(noteStore, limiter).listTags(self.fake.token), [])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testFakeEvernote))
+    suite.addTest(unittest.makeSuite(testFakeEvernoteLimits))
+    return suite
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from geeknote.geeknote import *
+from geeknote.unit.bootstrapTest import LocalFilesCase
 import unittest
 from geeknote import tools
 from geeknote import editor
@@ -19,9 +20,10 @@ class NotesOver(Notes):
         self.evernote = GeekNoteOver()
 
 
-class testNotes(unittest.TestCase):
+class testNotes(LocalFilesCase):
 
     def setUp(self):
+        super(testNotes, self).setUp()
         self.notes = NotesOver()
         self.testNote = tools.Struct(title="note title")
 
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote
+from geeknote.unit.bootstrapTest import GeekNoteCase
+from geeknote import gnsync
+from geeknote import editor
+import unittest
+import time
+import os
+
+import evernote.edam.notestore.NoteStore as NoteStore
+
+
+class testGNSync(GeekNoteCase):
+
+    def setUp(self):
+        super(testGNSync, self).setUp()
+        self.path = os.path.join(self.dir, "notes")
+        os.mkdir(self.path)
+
+    def write(self, name, text, mode="w"):
+        path = os.path.join(self.path, name)
+        with open(path, mode) as f:
+            f.write(text)
+        # newer than the note on the service
+        later = time.time() + 60
+        os.utime(path, (later, later))
+
+    def sync(self):
+        gnsync.GNSync(None, self.path, "*.md", "markdown").sync()
+
+    def stored(self, title):
+        return [note for note in self.fake.noteStore.notes.values() if note.title == title][0]
+
+    def testUpdate(self):
+        self.write("Todo.md", "Buy milk\n")
+        self.sync()
+        guid = self.stored("Todo").guid
+
+        self.write("Todo.md", "Buy bread\n", "a")
+        self.sync()
+        note = self.stored("Todo")
+        self.assertEqual(note.guid, guid)
+        self.assertTrue("Buy bread" in note.content)
+
+    def testSync(self):
+        self.write("Todo.md", "Buy milk\n")
+        self.sync()
+
+        # one update and one create go out together
+        self.restart()
+        self.write("Todo.md", "Buy bread\n", "a")
+        self.write("Ideas.md", "Paint the fence\n")
+        self.sync()
+        self.assertEqual((self.fake.calls['updateNote'], self.fake.calls['createNote']), (1, 1))
+        self.assertTrue("Buy bread" in self.stored("Todo").content)
+        self.assertTrue("Paint the fence" in self.stored("Ideas").content)
+
+    def testUpdateMetadata(self):
+        note = GeekNote().createNote("Todo", editor.textToENML("Buy milk"))
+        metadata = NoteStore.NoteMetadata(guid=note.guid, title="Todo", updated=note.updated)
+        filedata = {'title': "Todo", 'content': editor.wrapENML("<p>Buy bread</p>"),
+                    'mtime': note.updated + 1000}
+
+        sent = gnsync.GNSync(None, self.path, "*.md", "markdown")._update_note(filedata, metadata)
+        GeekNote().updateNotes([sent])
+        self.assertTrue("Buy bread" in self.stored("Todo").content)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testGNSync))
+    return suite
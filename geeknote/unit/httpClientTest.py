@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.standin import Standin
+from geeknote.geeknote import GeekNote
+from geeknote.unit.bootstrapTest import LocalFilesCase
+import unittest
+import socket
+import threading
+import time
+
+from thrift.Thrift import TMessageType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+from thrift.transport import TTransport
+import evernote.edam.userstore.UserStore as UserStore
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class UserStoreHandler(UserStore.Iface):
+
+    def checkVersion(self, clientName, edamVersionMajor, edamVersionMinor):
+        if clientName == "slow":
+            time.sleep(0.5)
+        return True
+
+    def getNoteStoreUrl(self, authenticationToken):
+        return "http://127.0.0.1/edam/note/" + authenticationToken
+
+
+class NoteStoreHandler(NoteStore.Iface):
+
+    def findNotes(self, authenticationToken, filter, offset, maxNotes):
+        notes = [Types.Note(guid="guid-%d" % i, title="note %d" % i, created=i,
+                            tagGuids=["tag-%d" % i], attributes=Types.NoteAttributes(source="unit"))
+                 for i in range(offset, offset + maxNotes)]
+        return NoteStore.NoteList(startIndex=offset, totalNotes=len(notes), notes=notes)
+
+    def createNote(self, authenticationToken, note):
+        note.guid = "created-guid"
+        return note
+
+    def getResourceData(self, authenticationToken, guid):
+        if guid == "missing":
+            raise Errors.EDAMNotFoundException(identifier="Resource.guid", key=guid)
+        return "".join(chr(i % 256) for i in range(int(guid)))
+
+
+class BinaryProtocol(TBinaryProtocol.TBinaryProtocol):
+
+    def readString(self):
+        buff = bytearray(self.readI32())
+        self.trans.readInto(buff)
+        return str(buff)
+
+
+class testHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = Standin(UserStore.Processor(UserStoreHandler()), '/edam/user').start()
+
+    def tearDown(self):
+        self.standin.stop()
+
+    def client(self, pool=None):
+        transport = THttpClient.THttpClient(self.standin.url, pool=pool)
+        return UserStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+
+    def testKeepAlive(self):
+        client = self.client()
+        for i in range(5):
+            self.assertTrue(client.checkVersion("test", 1, 25))
+        self.assertEqual(self.standin.connections, 1)
+
+    def testSharedPool(self):
+        pool = THttpClient.THttpConnectionPool()
+        first, second = self.client(pool), self.client(pool)
+        for i in range(3):
+            self.assertTrue(first.checkVersion("test", 1, 25))
+            self.assertEqual(second.getNoteStoreUrl("token"), "http://127.0.0.1/edam/note/token")
+        self.assertEqual(self.standin.connections, 1)
+
+    def testEmptyPool(self):
+        client = self.client(THttpClient.THttpConnectionPool(maxsize=0))
+        for i in range(3):
+            self.assertTrue(client.checkVersion("test", 1, 25))
+        self.assertEqual(self.standin.connections, 3)
+
+    def testReadTimeout(self):
+        transport = THttpClient.THttpClient(self.standin.url)
+        transport.setReadTimeout(100)
+        client = UserStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+        try:
+            client.checkVersion("slow", 1, 25)
+            self.fail("timeout expected")
+        except TTransport.TTransportException, e:
+            self.assertEqual(e.type, TTransport.TTransportException.TIMED_OUT)
+        self.assertEqual(socket.getdefaulttimeout(), None)
+        # the client recovers on a new connection
+        self.assertTrue(client.checkVersion("test", 1, 25))
+
+    def testTimeoutPerThread(self):
+        results = {}
+
+        def call(name, timeout):
+            transport = THttpClient.THttpClient(self.standin.url)
+            transport.setReadTimeout(timeout)
+            client = UserStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+            try:
+                results[timeout] = client.checkVersion(name, 1, 25)
+            except TTransport.TTransportException, e:
+                results[timeout] = e.type
+
+        threads = [threading.Thread(target=call, args=("slow", 100)),
+                   threading.Thread(target=call, args=("slow", 5000))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {100: TTransport.TTransportException.TIMED_OUT, 5000: True})
+
+
+class ScriptedServer(object):
+    """
+    HTTP server on 127.0.0.1 which answers checkVersion as actions say, one
+    action per request: 'reply' keeps the connection open, 'close' closes it
+    after the reply and 'drop' closes it without one.
+    """
+
+    def __init__(self, actions):
+        self.actions = list(actions)
+        self.requests = 0
+        self.connections = 0
+        self.closed = threading.Event()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.url = "http://127.0.0.1:%d/edam/user" % self.sock.getsockname()[1]
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        while self.actions:
+            try:
+                conn, address = self.sock.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            request = conn.makefile('rb')
+            while self.actions and self.readRequest(request):
+                action = self.actions.pop(0)
+                if action != 'drop':
+                    conn.sendall(self.reply())
+                if action != 'reply':
+                    break
+            request.close()
+            conn.close()
+            self.closed.set()
+
+    def readRequest(self, request):
+        length = None
+        line = request.readline()
+        if not line:
+            return False
+        while line.strip():
+            name, _, value = line.partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+            line = request.readline()
+        request.read(length)
+        self.requests += 1
+        return True
+
+    def reply(self):
+        buf = TTransport.TMemoryBuffer()
+        protocol = TBinaryProtocol.TBinaryProtocol(buf)
+        protocol.writeMessageBegin('checkVersion', TMessageType.REPLY, 0)
+        UserStore.checkVersion_result(success=True).write(protocol)
+        protocol.writeMessageEnd()
+        body = buf.getvalue()
+        return ("HTTP/1.1 200 OK\r\nContent-Type: application/x-thrift\r\n"
+                "Content-Length: %d\r\n\r\n%s" % (len(body), body))
+
+    def stop(self):
+        self.sock.close()
+
+
+class testHttpClientRetry(unittest.TestCase):
+
+    def client(self, server):
+        self.transport = THttpClient.THttpClient(server.url)
+        return UserStore.Client(TBinaryProtocol.TBinaryProtocol(self.transport))
+
+    def testDroppedIdle(self):
+        server = ScriptedServer(['close', 'reply'])
+        client = self.client(server)
+        self.assertTrue(client.checkVersion("test", 1, 25))
+        server.closed.wait(5)
+
+        # the closed connection is left in the pool, a new one is opened
+        self.assertTrue(client.checkVersion("test", 1, 25))
+        self.assertEqual((server.connections, server.requests, self.transport.retries), (2, 2, 0))
+        server.stop()
+
+    def testNotRepeated(self):
+        server = ScriptedServer(['reply', 'drop', 'reply'])
+        client = self.client(server)
+        self.assertTrue(client.checkVersion("test", 1, 25))
+
+        # the request went out, it may have been carried out
+        self.assertRaises(TTransport.TTransportException, client.checkVersion, "test", 1, 25)
+        self.assertEqual((server.requests, self.transport.retries), (2, 0))
+        self.assertTrue(client.checkVersion("test", 1, 25))
+        server.stop()
+
+
+class testHttpClientBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = Standin(NoteStore.Processor(NoteStoreHandler()), '/edam/note').start()
+
+    def tearDown(self):
+        self.standin.stop()
+
+    def findNotes(self, protocolClass, rbuf_size=THttpClient.THttpClient.DEFAULT_BUFFER):
+        transport = THttpClient.THttpClient(self.standin.url, rbuf_size=rbuf_size)
+        client = NoteStore.Client(protocolClass(transport))
+        return client.findNotes("token", NoteStore.NoteFilter(), 10, 500)
+
+    def testCReadable(self):
+        transport = THttpClient.THttpClient(self.standin.url)
+        self.assertIsInstance(transport, TTransport.CReadableTransport)
+
+    def testAcceleratedDecode(self):
+        expected = self.findNotes(TBinaryProtocol.TBinaryProtocol)
+        result = self.findNotes(TBinaryProtocol.TBinaryProtocolAccelerated)
+        self.assertEqual(len(result.notes), 500)
+        self.assertEqual(result, expected)
+
+    def testReadInto(self):
+        transport = THttpClient.THttpClient(self.standin.url, rbuf_size=7)
+        client = NoteStore.Client(BinaryProtocol(transport))
+        data = client.getResourceData("token", "300000")
+        self.assertEqual(data, "".join(chr(i % 256) for i in range(300000)))
+        self.assertEqual(client.getResourceData("token", "3"), "\x00\x01\x02")
+
+    def testSmallBuffer(self):
+        result = self.findNotes(TBinaryProtocol.TBinaryProtocolAccelerated, rbuf_size=7)
+        self.assertEqual(result.notes[-1].guid, "guid-509")
+        self.assertEqual(result.notes[-1].attributes.source, "unit")
+
+
+class WriteLog(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+
+class GeekNoteOver(GeekNote):
+    def __init__(self, noteStore):
+        self.noteStore = noteStore
+        self.authToken = "token"
+
+    def getNoteStore(self):
+        return self.noteStore
+
+
+class testDownloadResource(LocalFilesCase):
+
+    def setUp(self):
+        super(testDownloadResource, self).setUp()
+        self.standin = Standin(NoteStore.Processor(NoteStoreHandler()), '/edam/note').start()
+        transport = THttpClient.THttpClient(self.standin.url)
+        self.noteStore = NoteStore.Client(TBinaryProtocol.TBinaryProtocolAccelerated(transport))
+        self.geeknote = GeekNoteOver(self.noteStore)
+
+    def tearDown(self):
+        self.standin.stop()
+        super(testDownloadResource, self).tearDown()
+
+    def testChunks(self):
+        fileobj = WriteLog()
+        self.assertEqual(self.geeknote.downloadResource("300000", fileobj, chunkSize=65536), 300000)
+        self.assertEqual([len(chunk) for chunk in fileobj.chunks], [65536] * 4 + [37856])
+        self.assertEqual("".join(fileobj.chunks), self.noteStore.getResourceData("token", "300000"))
+
+    def testEmpty(self):
+        fileobj = WriteLog()
+        self.assertEqual(self.geeknote.downloadResource("0", fileobj), 0)
+        self.assertEqual(fileobj.chunks, [])
+
+    def testNotFound(self):
+        self.noteStore.send_getResourceData("token", "missing")
+        try:
+            self.geeknote._recvBinary(self.noteStore._iprot, NoteStore.getResourceData_result,
+                                      WriteLog(), 1024)
+            self.fail("EDAMNotFoundException expected")
+        except Errors.EDAMNotFoundException, e:
+            self.assertEqual(e.key, "missing")
+        # the reply was consumed, the connection is usable
+        self.assertEqual(self.noteStore.getResourceData("token", "3"), "\x00\x01\x02")
+        self.assertEqual(self.standin.connections, 1)
+
+
+class testHttpClientCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = Standin(NoteStore.Processor(NoteStoreHandler()), '/edam/note', compress=True).start()
+
+    def tearDown(self):
+        self.standin.stop()
+
+    def client(self, compress=True):
+        self.transport = THttpClient.THttpClient(self.standin.url, compress=compress)
+        return NoteStore.Client(TBinaryProtocol.TBinaryProtocolAccelerated(self.transport))
+
+    def testCompressedReply(self):
+        expected = self.client(compress=False).findNotes("token", NoteStore.NoteFilter(), 0, 300)
+        self.assertEqual(self.transport.bytes_in, self.transport.bytes_in_comp)
+
+        client = self.client()
+        for i in range(3):
+            self.assertEqual(client.findNotes("token", NoteStore.NoteFilter(), 0, 300), expected)
+        self.assertTrue(self.transport.bytes_in_comp * 5 < self.transport.bytes_in)
+        self.assertEqual(self.standin.connections, 2)
+
+    def testCompressedRequest(self):
+        content = "<en-note>%s</en-note>" % ("<div>compressible line</div>" * 2000)
+        note = self.client().createNote("token", Types.Note(title="big", content=content))
+        self.assertEqual(note.guid, "created-guid")
+        self.assertEqual(note.content, content)
+        self.assertTrue(self.transport.bytes_out_comp * 5 < self.transport.bytes_out)
+
+    def testSmallRequest(self):
+        self.client().findNotes("token", NoteStore.NoteFilter(), 0, 1)
+        self.assertEqual(self.transport.bytes_out, self.transport.bytes_out_comp)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testHttpClient))
+    suite.addTest(unittest.makeSuite(testHttpClientRetry))
+    suite.addTest(unittest.makeSuite(testHttpClientBuffer))
+    suite.addTest(unittest.makeSuite(testHttpClientCompression))
+    suite.addTest(unittest.makeSuite(testDownloadResource))
+    return suite
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote, Notes
+from geeknote.mirror import Mirror
+from geeknote.unit.bootstrapTest import GeekNoteCase
+from geeknote import mirror as mirrorModule
+from geeknote import out
+import unittest
+import time
+import os
+
+import evernote.edam.type.ttypes as Types
+
+
+class testMirror(GeekNoteCase):
+
+    def setUp(self):
+        super(testMirror, self).setUp()
+        self.token = self.fake.token
+        self.noteStore = self.fake.noteStore
+        self.work = self.noteStore.createNotebook(self.token, Types.Notebook(name="Work"))
+        self.note = self.noteStore.createNote(self.token, Types.Note(
+            title="Budget", content="<en-note>numbers</en-note>", notebookGuid=self.work.guid,
+            tagNames=["finance"]))
+
+    def testNoMirror(self):
+        self.assertEqual([nb.name for nb in GeekNote().findNotebooks()], ["My Notebook", "Work"])
+        self.assertEqual(self.fake.calls, {'checkVersion': 1, 'getNoteStoreUrl': 1, 'listNotebooks': 1})
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "mirror.db")))
+
+    def testSync(self):
+        GeekNote().createMirror()
+        GeekNote().syncMirror()
+        self.restart()
+
+        # nothing changed, a single getSyncState
+        self.assertEqual([nb.name for nb in GeekNote().findNotebooks()], ["My Notebook", "Work"])
+        self.assertEqual([tag.name for tag in GeekNote().findTags()], ["finance"])
+        self.assertEqual(self.fake.calls, {'getSyncState': 1})
+
+        # only the changes are fetched
+        self.noteStore.updateNotebook(self.token, Types.Notebook(guid=self.work.guid, name="Job"))
+        self.noteStore.expungeTag(self.token, self.noteStore.listTags(self.token)[0].guid)
+        self.noteStore.deleteNote(self.token, self.note.guid)
+        self.restart()
+        self.assertEqual([nb.name for nb in GeekNote().findNotebooks()], ["Job", "My Notebook"])
+        self.assertEqual(GeekNote().findTags(), [])
+        self.assertEqual(self.fake.calls, {'getSyncState': 1, 'getFilteredSyncChunk': 1})
+        mirror = GeekNote().getMirror()
+        self.assertEqual([note.title for note in mirror.findNotes().notes], ["Meeting"])
+        self.assertEqual(mirror.updateCount, self.noteStore.getSyncState(self.token).updateCount)
+
+    def testChunks(self):
+        for i in range(5):
+            self.noteStore.createNote(self.token, Types.Note(title="Note %d" % i, content="<en-note/>"))
+        mirror = Mirror(os.path.join(self.dir, "chunks.db"))
+        self.assertEqual(mirror.sync(GeekNote().getNoteStore(), self.token, chunkSize=2), 10)
+        self.assertEqual(self.fake.calls['getFilteredSyncChunk'], 5)
+        self.assertEqual(mirror.findNotes(title="note ", count=2).totalNotes, 5)
+        self.assertEqual(mirror.getNote(self.note.guid).tagGuids, self.note.tagGuids)
+        self.assertEqual(len(mirror.findNotes(tagGuid=self.note.tagGuids[0]).notes), 1)
+        self.assertEqual(len(mirror.findNotes(notebookGuid=self.work.guid).notes), 1)
+        mirror.close()
+
+    def testAccountChanges(self):
+        GeekNote().createMirror()
+        GeekNote().createNotebook("Home")
+        self.assertEqual([nb.name for nb in GeekNote().findNotebooks()], ["Home", "My Notebook", "Work"])
+
+    def testContent(self):
+        GeekNote().createMirror(keepContent=True)
+        GeekNote().syncMirror()
+        self.assertEqual(self.fake.calls['getNoteContent'], 2)
+        self.restart()
+
+        # show reads the note from the mirror
+        note = Notes()._searchNote("budg")
+        GeekNote().loadNoteContent(note)
+        self.assertEqual(note.content, "<en-note>numbers</en-note>")
+        self.assertEqual(self.fake.calls, {'getSyncState': 1})
+
+        # a new title keeps the content, new content is downloaded again
+        self.noteStore.updateNote(self.token, Types.Note(guid=self.note.guid, title="Budget 2015"))
+        self.restart()
+        GeekNote().syncMirror()
+        self.assertFalse('getNoteContent' in self.fake.calls)
+
+        self.noteStore.updateNote(self.token, Types.Note(guid=self.note.guid, content="<en-note>more</en-note>"))
+        self.restart()
+        GeekNote().syncMirror()
+        self.assertEqual(self.fake.calls['getNoteContent'], 1)
+        self.assertEqual(GeekNote().getMirror().staleContent(), [])
+
+    def testSearch(self):
+        self.noteStore.createNote(self.token, Types.Note(
+            title="Trip", content="<en-note>Budget for <b>flights</b></en-note>", tagNames=["travel", "finance"]))
+        GeekNote().createMirror(keepContent=True)
+        mirror = GeekNote().syncMirror()
+
+        def search(words):
+            return sorted(note.title for note in mirror.search(words).notes)
+
+        self.assertEqual(search("budget"), ["Budget", "Trip"])
+        self.assertEqual(search("flights"), ["Trip"])
+        self.assertEqual(search("fli*"), ["Trip"])
+        self.assertEqual(search("intitle:budget"), ["Budget"])
+        self.assertEqual(search("-intitle:budget budget"), ["Trip"])
+        self.assertEqual(search('notebook:"work"'), ["Budget"])
+        self.assertEqual(search('-notebook:"Work" tag:"finance"'), ["Trip"])
+        self.assertEqual(search('tag:"trav*"'), ["Trip"])
+        self.assertEqual(search("any: flights numbers"), ["Budget", "Trip"])
+        self.assertEqual(search("intitle:*"), ["Budget", "Meeting", "Trip"])
+        tomorrow = time.strftime("%Y%m%d", time.localtime(time.time() + 24 * 3600))
+        self.assertEqual(search("created:19990101 -created:%s" % tomorrow), ["Budget", "Meeting", "Trip"])
+        self.assertEqual(search("created:%s" % tomorrow), [])
+        self.assertRaises(ValueError, mirror.search, "source:mail")
+
+        # the index follows renames, changed content and expunged tags
+        self.noteStore.updateNotebook(self.token, Types.Notebook(guid=self.work.guid, name="Office"))
+        self.noteStore.updateNote(self.token, Types.Note(guid=self.note.guid, content="<en-note>totals</en-note>"))
+        self.noteStore.expungeTag(self.token, self.note.tagGuids[0])
+        GeekNote.mirrorSynced = False
+        GeekNote().syncMirror()
+        self.assertEqual(search("office"), ["Budget"])
+        self.assertEqual(search("totals"), ["Budget"])
+        self.assertEqual(search("numbers"), [])
+        self.assertEqual(search("tag:finance"), [])
+
+        # the same results without FTS5
+        mirror.close()
+        fts5 = mirrorModule.FTS5
+        mirrorModule.FTS5 = False
+        try:
+            mirror = Mirror(os.path.join(self.dir, "like.db"))
+            mirror.sync(GeekNote().getNoteStore(), self.token)
+            for guid, usn in mirror.staleContent():
+                mirror.setContent(guid, usn, self.noteStore.getNoteContent(self.token, guid))
+            self.assertEqual(search("budget"), ["Budget", "Trip"])
+            self.assertEqual(search("-intitle:budget fli*"), ["Trip"])
+            self.assertEqual(search("office"), ["Budget"])
+            mirror.close()
+        finally:
+            mirrorModule.FTS5 = fts5
+            GeekNote.mirror = None
+
+    def testFindLocal(self):
+        GeekNote().createMirror()
+        GeekNote().syncMirror()
+        self.restart()
+
+        printed = []
+        printLine = out.printLine
+        out.printLine = lambda line, end=None: printed.append(line)
+        try:
+            Notes().find(search="budg*", local=True)
+        finally:
+            out.printLine = printLine
+        self.assertEqual(self.fake.calls, {})
+        self.assertTrue("Total found: 1" in printed)
+        self.assertEqual([note.title for note in GeekNote.storage.getSearch().notes], ["Budget"])
+
+    def testRemove(self):
+        GeekNote().createMirror()
+        GeekNote().removeMirror()
+        self.assertEqual(GeekNote().getMirror(), None)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "mirror.db")))
+
+    def testLogout(self):
+        GeekNote().createMirror()
+        GeekNote().syncMirror()
+        GeekNote().loadNoteContent(Notes()._searchNote("meeting"))
+        self.assertEqual(len(GeekNote.noteCache), 1)
+
+        GeekNote().removeUser()
+        self.assertEqual(GeekNote.mirror, None)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "mirror.db")))
+        self.assertEqual(len(GeekNote.noteCache), 0)
+
+    def testOtherUser(self):
+        GeekNote().createMirror()
+        GeekNote().syncMirror()
+        self.restart()
+
+        # another account starts over from USN 0
+        GeekNote.storage.createUser(self.token, Types.User(id=2))
+        self.assertEqual([nb.name for nb in GeekNote().findNotebooks()], ["My Notebook", "Work"])
+        self.assertEqual(self.fake.calls['getFilteredSyncChunk'], 1)
+        self.assertEqual(GeekNote().getMirror().getState('userId'), 2)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testMirror))
+    return suite
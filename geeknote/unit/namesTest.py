@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote, Notebooks, Tags
+from geeknote.unit.bootstrapTest import GeekNoteCase
+import unittest
+
+import evernote.edam.type.ttypes as Types
+
+
+class testNames(GeekNoteCase):
+
+    def setUp(self):
+        super(testNames, self).setUp()
+        self.token = self.fake.token
+        self.noteStore = self.fake.noteStore
+        self.work = self.noteStore.createNotebook(self.token, Types.Notebook(name="Work"))
+        self.todo = self.noteStore.createTag(self.token, Types.Tag(name="todo"))
+        GeekNote().getNoteStoreUrl()
+        self.restart()
+
+    def testCached(self):
+        default = self.noteStore.getDefaultNotebook(self.token)
+        self.assertEqual(GeekNote().getNotebookGuids(), {"My Notebook": default.guid, "Work": self.work.guid})
+        self.assertEqual(self.fake.calls, {'getSyncState': 1, 'listNotebooks': 1})
+
+        self.restart()
+        self.assertEqual(Notebooks().getNoteGUID("Work"), self.work.guid)
+        self.assertEqual(Notebooks()._searchNotebook("Work").guid, self.work.guid)
+        self.assertEqual(Tags()._searchTag("todo").guid, self.todo.guid)
+        self.assertEqual(self.fake.calls, {'getSyncState': 1, 'listTags': 1})
+
+        # changed by another client
+        self.noteStore.updateNotebook(self.token, Types.Notebook(guid=self.work.guid, name="Job"))
+        self.restart()
+        self.assertEqual(Notebooks().getNoteGUID("Job"), self.work.guid)
+        self.assertEqual(Notebooks().getNoteGUID("Work"), None)
+        self.assertEqual(self.fake.calls, {'getSyncState': 1, 'listNotebooks': 1})
+
+    def testChangedHere(self):
+        GeekNote().getNotebookGuids()
+        GeekNote().getTagGuids()
+        home = GeekNote().createNotebook("Домашние")
+        GeekNote().updateTag(self.todo.guid, "done")
+        GeekNote().createNote("Plan", "<en-note/>", notebook=home.guid)
+        self.restart()
+
+        # the names were updated in place, and are still current for the next process
+        self.assertEqual(GeekNote().getNotebookGuids()["Домашние"], home.guid)
+        self.assertEqual(GeekNote().getTagGuids(), {"done": self.todo.guid})
+        self.assertEqual(self.fake.calls, {'getSyncState': 1})
+
+        GeekNote().removeNotebook(home.guid)
+        self.assertFalse("Домашние" in GeekNote().getNotebookGuids())
+
+        # a note with tags may have created some
+        GeekNote().createNote("Plan", "<en-note/>", tags=["new"])
+        self.restart()
+        self.assertEqual(sorted(GeekNote().getTagGuids()), ["done", "new"])
+        self.assertEqual(self.fake.calls, {'getSyncState': 1, 'listTags': 1})
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testNames))
+    return suite
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.notecache import NoteCache, JOURNAL_SIZE
+from geeknote.geeknote import GeekNote
+from geeknote.unit.bootstrapTest import LocalFilesCase
+import unittest
+import threading
+import shutil
+import tempfile
+import os
+
+import evernote.edam.type.ttypes as Types
+
+
+def note(i, usn=1, size=100):
+    return Types.Note(guid="%08d-0000-4000-8000-000000000000" % i, title="note %d" % i,
+                      content="<en-note>%s</en-note>" % ("x" * size), updateSequenceNum=usn,
+                      attributes=Types.NoteAttributes(source="unit"))
+
+
+class NoteStoreOver(object):
+    def __init__(self):
+        self.calls = 0
+
+    def getNoteContent(self, authenticationToken, guid):
+        self.calls += 1
+        return "<en-note>remote %d</en-note>" % self.calls
+
+    def updateNote(self, authenticationToken, note):
+        return note
+
+
+class GeekNoteOver(GeekNote):
+    def __init__(self, noteCache):
+        self.noteStore = NoteStoreOver()
+        self.noteCache = noteCache
+
+    def getNoteStore(self):
+        return self.noteStore
+
+    def getNoteCache(self):
+        return self.noteCache
+
+
+class testNoteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = NoteCache(os.path.join(self.dir, "notes.cache"), maxSize=10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testGet(self):
+        self.assertEqual(self.cache.get(note(1).guid), None)
+        for i in range(20):
+            self.cache.put(note(i))
+        for i in range(20):
+            self.assertEqual(self.cache.get(note(i).guid), note(i))
+        self.assertEqual(self.cache.get("missing"), None)
+
+        # the index is on disk
+        self.assertEqual(NoteCache(self.cache.path).get(note(7).guid).title, "note 7")
+
+    def testStale(self):
+        self.cache.put(note(1, usn=5))
+        self.assertEqual(self.cache.get(note(1).guid, 5).updateSequenceNum, 5)
+        self.assertEqual(self.cache.get(note(1).guid, 6), None)
+
+        self.cache.put(note(1, usn=6))
+        self.assertEqual(self.cache.get(note(1).guid, 6).updateSequenceNum, 6)
+        self.assertEqual(len(self.cache), 1)
+
+    def testRemove(self):
+        self.cache.put(note(1))
+        self.cache.put(note(2))
+        self.cache.remove(note(1).guid)
+        self.assertEqual(self.cache.get(note(1).guid), None)
+        self.assertEqual(self.cache.get(note(2).guid), note(2))
+
+    def testEvict(self):
+        for i in range(30):
+            self.cache.put(note(i, size=1000))
+        self.assertTrue(os.path.getsize(self.cache.path) <= 10000)
+        # the newest notes survive
+        self.assertEqual(self.cache.get(note(29).guid), note(29, size=1000))
+        self.assertEqual(self.cache.get(note(0).guid), None)
+        self.assertTrue(0 < len(self.cache) < 10)
+
+    def testIndexBehindData(self):
+        self.cache.put(note(1))
+        journal = open(self.cache.journalPath, 'rb').read()
+        self.cache.clear()
+        self.cache.put(note(2))
+        open(self.cache.journalPath, 'wb').write(journal)
+        self.assertEqual(self.cache.get(note(1).guid), None)
+
+    def testJournal(self):
+        self.cache.maxSize = 10 ** 6
+        for i in range(JOURNAL_SIZE + 10):
+            self.cache.put(note(i))
+        self.cache.remove(note(3).guid)
+        # merged into the index once, the rest is in the journal
+        self.assertTrue(os.path.exists(self.cache.indexPath))
+        self.assertEqual(len(self.cache._journal()), 10)
+
+        cache = NoteCache(self.cache.path)
+        self.assertEqual(cache.get(note(3).guid), None)
+        self.assertEqual(cache.get(note(5).guid), note(5))
+        self.assertEqual(cache.get(note(JOURNAL_SIZE + 5).guid), note(JOURNAL_SIZE + 5))
+        self.assertEqual(len(cache), JOURNAL_SIZE + 9)
+
+    def testConcurrentPut(self):
+        # as several geeknote processes would, each with a cache of its own
+        def run(first):
+            cache = NoteCache(self.cache.path)
+            for i in range(first, first + 50):
+                cache.put(note(i))
+        threads = [threading.Thread(target=run, args=(i * 50,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.cache), 200)
+        self.assertEqual(self.cache.get(note(123).guid), note(123))
+        self.assertEqual([name for name in os.listdir(self.dir) if name.endswith('.tmp')], [])
+
+    def testUnwritable(self):
+        cache = NoteCache(os.path.join(self.dir, "missing", "notes.cache"))
+        cache.put(note(1))
+        cache.remove(note(1).guid)
+        self.assertEqual(cache.get(note(1).guid), None)
+
+    def testCompact(self):
+        compact = NoteCache(os.path.join(self.dir, "compact.cache"), protocol='compact')
+        compact.put(note(1))
+        self.cache.put(note(1))
+        self.assertEqual(compact.get(note(1).guid), note(1))
+        self.assertTrue(os.path.getsize(compact.path) < os.path.getsize(self.cache.path))
+
+        # a cache written in another protocol reads as empty
+        self.assertEqual(NoteCache(compact.path, protocol='binary').get(note(1).guid), None)
+
+
+class testNoteCacheContent(LocalFilesCase):
+
+    def setUp(self):
+        super(testNoteCacheContent, self).setUp()
+        self.geeknote = GeekNoteOver(NoteCache(os.path.join(self.dir, "notes.cache")))
+
+    def testLoadNoteContent(self):
+        first, second = note(1, usn=3), note(1, usn=3)
+        self.geeknote.loadNoteContent(first)
+        self.geeknote.loadNoteContent(second)
+        self.assertEqual(second.content, "<en-note>remote 1</en-note>")
+        self.assertEqual(self.geeknote.noteStore.calls, 1)
+
+        newer = note(1, usn=4)
+        self.geeknote.loadNoteContent(newer)
+        self.assertEqual(newer.content, "<en-note>remote 2</en-note>")
+
+    def testUpdateNote(self):
+        self.geeknote.loadNoteContent(note(1))
+        self.geeknote.updateNote(note(1))
+        self.assertEqual(self.geeknote.getNoteCache().get(note(1).guid), None)
+
+    def testEmptyCache(self):
+        GeekNote.noteCache = NoteCache(os.path.join(self.dir, "empty.cache"))
+        # not replaced by the default cache while it has no notes
+        self.assertTrue(GeekNote.__new__(GeekNote).getNoteCache() is GeekNote.noteCache)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testNoteCache))
+    suite.addTest(unittest.makeSuite(testNoteCacheContent))
+    return suite
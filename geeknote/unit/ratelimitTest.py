@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.standin import Standin
+from geeknote.ratelimit import RateLimiter, ScheduledClient
+import unittest
+import threading
+import tempfile
+import shutil
+import time
+import os
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class NoteStoreHandler(NoteStore.Iface):
+
+    def __init__(self, limited):
+        self.limited = limited
+        self.calls = 0
+
+    def getNote(self, authenticationToken, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        self.calls += 1
+        if self.calls <= self.limited:
+            raise Errors.EDAMSystemException(errorCode=Errors.EDAMErrorCode.RATE_LIMIT_REACHED,
+                                             rateLimitDuration=1)
+        return Types.Note(guid=guid)
+
+
+class testRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ratelimit.lock")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testBucket(self):
+        limiter = RateLimiter(self.path, rate=20, burst=2)
+        start = time.time()
+        for i in range(6):
+            limiter.acquire()
+        # two calls from the burst, four more at 20 per second
+        self.assertTrue(0.15 < time.time() - start < 1, time.time() - start)
+
+    def testThreads(self):
+        limiter = RateLimiter(self.path, rate=50, burst=1)
+        threads = [threading.Thread(target=lambda: [limiter.acquire() for i in range(5)])
+                   for j in range(4)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(time.time() - start > 0.3, time.time() - start)
+
+    def testSharedFile(self):
+        # two limiters on one file stand for two processes
+        first = RateLimiter(self.path, rate=100, burst=10)
+        second = RateLimiter(self.path, rate=100, burst=10)
+        first.park(1)
+        start = time.time()
+        second.acquire()
+        self.assertTrue(time.time() - start > 0.9, time.time() - start)
+
+    def testCall(self):
+        limiter = RateLimiter(self.path, rate=100, burst=10)
+        self.assertEqual(limiter.call(lambda x: x * 2, 21), 42)
+        self.assertRaises(ZeroDivisionError, limiter.call, lambda: 1 / 0)
+
+
+class testScheduledClient(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.handler = NoteStoreHandler(limited=1)
+        self.standin = Standin(NoteStore.Processor(self.handler), '/edam/note').start()
+        transport = THttpClient.THttpClient(self.standin.url)
+        self.client = NoteStore.Client(TBinaryProtocol.TBinaryProtocol(transport))
+
+    def tearDown(self):
+        self.standin.stop()
+        shutil.rmtree(self.dir)
+
+    def limiter(self, retries):
+        return RateLimiter(os.path.join(self.dir, "ratelimit.lock"), rate=100, burst=10,
+                           retries=retries)
+
+    def testResume(self):
+        parked = []
+        limiter = self.limiter(retries=3)
+        limiter.onPark = parked.append
+        client = ScheduledClient(self.client, limiter)
+
+        start = time.time()
+        self.assertEqual(client.getNote("token", "guid", False, False, False, False).guid, "guid")
+        self.assertTrue(time.time() - start > 0.9, time.time() - start)
+        self.assertEqual(self.handler.calls, 2)
+        self.assertEqual(parked, [1])
+
+    def testGiveUp(self):
+        client = ScheduledClient(self.client, self.limiter(retries=0))
+        try:
+            client.getNote("token", "guid", False, False, False, False)
+        except Errors.EDAMSystemException, e:
+            self.assertEqual(e.errorCode, Errors.EDAMErrorCode.RATE_LIMIT_REACHED)
+            self.assertEqual(e.rateLimitDuration, 1)
+        else:
+            self.fail("EDAMSystemException not raised")
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testRateLimiter))
+    suite.addTest(unittest.makeSuite(testScheduledClient))
+    return suite
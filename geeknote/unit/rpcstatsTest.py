@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.standin import Standin
+from geeknote.rpcstats import RpcStats, InstrumentedClient
+import unittest
+import tempfile
+import threading
+import shutil
+import json
+import os
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import THttpClient
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class NoteStoreHandler(NoteStore.Iface):
+
+    def getNote(self, authenticationToken, guid, withContent, withResourcesData,
+                withResourcesRecognition, withResourcesAlternateData):
+        if guid == "missing":
+            raise Errors.EDAMNotFoundException(identifier="Note.guid", key=guid)
+        if authenticationToken == "expired":
+            raise Errors.EDAMUserException(errorCode=Errors.EDAMErrorCode.AUTH_EXPIRED)
+        return Types.Note(guid=guid, content="x" * 1000)
+
+
+class testRpcStats(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.standin = Standin(NoteStore.Processor(NoteStoreHandler()), '/edam/note').start()
+        self.stats = RpcStats(os.path.join(self.dir, "rpcstats.json"),
+                              os.path.join(self.dir, "trace.jsonl"))
+        transport = THttpClient.THttpClient(self.standin.url)
+        self.client = InstrumentedClient(NoteStore.Client(TBinaryProtocol.TBinaryProtocol(transport)),
+                                         self.stats)
+
+    def tearDown(self):
+        self.standin.stop()
+        shutil.rmtree(self.dir)
+
+    def testCalls(self):
+        for i in range(3):
+            self.assertEqual(self.client.getNote("token", "guid", True, False, False, False).guid, "guid")
+
+        totals = self.stats.totals()['getNote']
+        self.assertEqual((totals['calls'], totals['errors'], totals['retries']), (3, 0, 0))
+        self.assertTrue(totals['bytesIn'] > 3000, totals['bytesIn'])
+        self.assertTrue(totals['bytesOut'] > 0)
+        self.assertTrue(0 < totals['maxSeconds'] <= totals['seconds'])
+
+    def testErrors(self):
+        self.assertRaises(Errors.EDAMNotFoundException,
+                          self.client.getNote, "token", "missing", False, False, False, False)
+        self.assertRaises(Errors.EDAMUserException,
+                          self.client.getNote, "expired", "guid", False, False, False, False)
+
+        totals = self.stats.totals()['getNote']
+        self.assertEqual(totals['errors'], 2)
+        self.assertEqual(totals['errorCodes'], {'EDAMNotFoundException': 1, 'AUTH_EXPIRED': 1})
+
+    def testPassThrough(self):
+        self.assertTrue(self.client._iprot is self.client._client._iprot)
+        self.client.send_getNote("token", "guid", False, False, False, False)
+        self.assertEqual(self.client.recv_getNote().guid, "guid")
+        self.assertEqual(self.stats.totals(), {})
+
+    def testTrace(self):
+        self.client.getNote("token", "guid", False, False, False, False)
+        self.assertRaises(Errors.EDAMNotFoundException,
+                          self.client.getNote, "token", "missing", False, False, False, False)
+
+        lines = [json.loads(line) for line in open(self.stats.tracePath)]
+        self.assertEqual([(line['method'], line['error']) for line in lines],
+                         [('getNote', None), ('getNote', 'EDAMNotFoundException')])
+
+    def testSave(self):
+        self.client.getNote("token", "guid", False, False, False, False)
+        self.stats.save()
+        self.client.getNote("token", "guid", False, False, False, False)
+        self.stats.save()
+
+        # a later run adds to the saved totals
+        stats = RpcStats(self.stats.path, '')
+        self.assertEqual(stats.totals()['getNote']['calls'], 2)
+        stats.record('getNote', 1.5, 10, 20, 1, 'RATE_LIMIT_REACHED')
+        totals = stats.totals()['getNote']
+        self.assertEqual((totals['calls'], totals['maxSeconds'], totals['retries']), (3, 1.5, 1))
+
+        stats.reset()
+        self.assertEqual(stats.totals(), {})
+
+    def testConcurrentSave(self):
+        # as several geeknote processes would, each saves its own totals
+        def run():
+            stats = RpcStats(self.stats.path, '')
+            for i in range(20):
+                stats.record('getNote', 0.1, 10, 20)
+                stats.save()
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stats.totals()['getNote']['calls'], 80)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testRpcStats))
+    return suite
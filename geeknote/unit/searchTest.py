@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote
+from geeknote.unit.bootstrapTest import GeekNoteCase
+from geeknote import out
+import unittest
+import threading
+
+import evernote.edam.notestore.NoteStore as NoteStore
+import evernote.edam.type.ttypes as Types
+import evernote.edam.error.ttypes as Errors
+
+
+class testSearch(GeekNoteCase):
+
+    def setUp(self):
+        GeekNoteCase.setUp(self)
+        self.fake.noteStore.createNote(self.fake.token, Types.Note(
+            title="Meeting agenda", content="<en-note>budget</en-note>", tagNames=["work"],
+            attributes=Types.NoteAttributes(author="geeknote")))
+
+    def testMetadata(self):
+        result = GeekNote().findNotes("agenda", 10)
+        self.assertTrue(isinstance(result, NoteStore.NotesMetadataList))
+        self.assertEqual(result.totalNotes, 1)
+
+        note = result.notes[0]
+        self.assertEqual(note.title, "Meeting agenda")
+        self.assertTrue(note.created and note.updated and note.updateSequenceNum)
+        self.assertEqual((note.notebookGuid, note.tagGuids, note.attributes), (None, None, None))
+
+    def testResultSpec(self):
+        resultSpec = NoteStore.NotesMetadataResultSpec(includeUpdated=True)
+        note = GeekNote().findNotes("agenda", 10, resultSpec=resultSpec).notes[0]
+        self.assertEqual((note.title, note.created), (None, None))
+        self.assertTrue(note.updated)
+
+    def testStoredSearch(self):
+        GeekNote.storage.setSearch(GeekNote().findNotes("agenda", 10))
+        note = GeekNote.storage.getSearch().notes[0]
+        self.assertTrue(isinstance(note, NoteStore.NoteMetadata))
+
+        GeekNote().loadNoteContent(note)
+        self.assertEqual(note.content, "<en-note>budget</en-note>")
+
+        # the content is cached for the USN of the search result
+        self.restart()
+        note = GeekNote.storage.getSearch().notes[0]
+        GeekNote().loadNoteContent(note)
+        self.assertEqual(note.content, "<en-note>budget</en-note>")
+        self.assertEqual(self.fake.calls, {})
+
+
+class testSearchPages(GeekNoteCase):
+
+    def setUp(self):
+        GeekNoteCase.setUp(self)
+        for i in range(7):
+            self.fake.noteStore.createNote(self.fake.token, Types.Note(title="Note %d" % i))
+
+    def testPages(self):
+        pages = list(GeekNote().findNotesPages("note", 6, pageSize=3))
+        self.assertEqual([len(page.notes) for page in pages], [3, 3])
+        self.assertEqual([page.startIndex for page in pages], [0, 3])
+        self.assertEqual(len(set(note.guid for page in pages for note in page.notes)), 6)
+
+        pages = list(GeekNote().findNotesPages("note", 100, pageSize=5))
+        self.assertEqual([len(page.notes) for page in pages], [5, 2])
+        self.assertEqual(list(GeekNote().findNotesPages("nothing", 100))[0].totalNotes, 0)
+
+    def testPrefetch(self):
+        asked = dict((offset, threading.Event()) for offset in (0, 3, 6))
+        answer = dict((offset, threading.Event()) for offset in (3, 6))
+
+        def hold(authenticationToken, noteFilter, offset, maxNotes, resultSpec):
+            asked[offset].set()
+            if offset in answer:
+                answer[offset].wait(5)
+        self.fake.latency = {'findNotesMetadata': hold}
+
+        pages = []
+        for page in GeekNote().findNotesPages("note", 7, pageSize=3):
+            following = page.startIndex + len(page.notes)
+            if following in asked:
+                # asked for while the caller has this page, answered only now
+                self.assertTrue(asked[following].wait(5))
+                answer[following].set()
+            pages.append(page.startIndex)
+        self.assertEqual(pages, [0, 3, 6])
+
+    def testError(self):
+        pages = GeekNote().findNotesPages("note", 7, pageSize=3)
+        next(pages)
+        self.fake.expire()
+        # the second page may have been fetched already, the third is asked for after expire
+        self.assertRaises(Errors.EDAMUserException, lambda: [next(pages) for i in range(2)])
+
+    def testPrintList(self):
+        pages = GeekNote().findNotesPages("note", 7, pageSize=3)
+        printed = []
+        printLine, out.printLine = out.printLine, lambda line, endLine="\n": printed.append(line)
+        try:
+            out.printList((note for page in pages for note in page.notes), total=7)
+        finally:
+            out.printLine = printLine
+        self.assertEqual(printed[0], "Total found: 7")
+        self.assertEqual(len([line for line in printed if "Note " in line]), 7)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testSearch))
+    suite.addTest(unittest.makeSuite(testSearchPages))
+    return suite
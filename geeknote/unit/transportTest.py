@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from thrift.transport import TTransport
+
+
+class ChunkedTransport(TTransport.TTransportBase):
+
+    def __init__(self, data, chunkSize):
+        self.data = data
+        self.chunkSize = chunkSize
+        self.pos = 0
+
+    def read(self, sz):
+        chunk = self.data[self.pos:self.pos + min(sz, self.chunkSize)]
+        self.pos += len(chunk)
+        return chunk
+
+
+class testTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.data = "".join(chr(i % 256) for i in range(100000))
+
+    def testReadAll(self):
+        trans = ChunkedTransport(self.data, 4096)
+        self.assertEqual(trans.readAll(10), self.data[:10])
+        self.assertEqual(trans.readAll(len(self.data) - 10), self.data[10:])
+        self.assertEqual(trans.readAll(0), "")
+        self.assertRaises(EOFError, trans.readAll, 1)
+
+    def testReadInto(self):
+        trans = ChunkedTransport(self.data, 1000)
+        buff = bytearray(len(self.data) + 5)
+        self.assertEqual(trans.readInto(memoryview(buff)[5:]), len(self.data))
+        self.assertEqual(str(buff[5:]), self.data)
+        self.assertRaises(EOFError, trans.readInto, bytearray(1))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testTransport))
+    return suite
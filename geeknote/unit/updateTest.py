@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from geeknote.geeknote import GeekNote, Notes
+from geeknote import geeknote
+from geeknote.unit.bootstrapTest import GeekNoteCase
+from geeknote import editor
+import unittest
+
+import evernote.edam.notestore.NoteStore as NoteStore
+
+
+class testUpdate(GeekNoteCase):
+
+    def setUp(self):
+        super(testUpdate, self).setUp()
+        self.content = editor.textToENML("Buy milk")
+        self.note = GeekNote().createNote("Shopping", self.content)
+
+        # the content of every updateNote the service gets
+        self.sent = []
+        updateNote = self.fake.noteStore.updateNote
+
+        def record(authenticationToken, note):
+            self.sent.append(note.content)
+            return updateNote(authenticationToken, note)
+        self.fake.noteStore.updateNote = record
+
+    def testUpdateNote(self):
+        note = GeekNote().getNote(self.note.guid)
+        note.content = self.content
+        note.title = "Groceries"
+        GeekNote().updateNote(note)
+        GeekNote().updateNote(self.note.guid, title="Groceries", content=self.content,
+                              contentHash=note.contentHash)
+        self.assertEqual(self.sent, [None, None])
+        self.assertEqual(note.content, self.content)
+
+        GeekNote().updateNote(self.note.guid, content=self.content)
+        GeekNote().updateNote(self.note.guid, content="<en-note>Buy bread</en-note>", contentHash=note.contentHash)
+        self.assertEqual(self.sent[2:], [self.content, "<en-note>Buy bread</en-note>"])
+
+    def testMetadata(self):
+        metadata = NoteStore.NoteMetadata(guid=self.note.guid, title="Groceries")
+        self.assertRaises(TypeError, GeekNote()._checkNote, metadata)
+        # reported as a failed operation, nothing is sent
+        self.assertRaises(Exception, GeekNote().updateNote, metadata)
+        self.assertEqual(self.sent, [])
+
+    def testUpdateNotes(self):
+        note = GeekNote().getNote(self.note.guid)
+        note.content = self.content
+        GeekNote().updateNotes([note, dict(guid=note.guid, content=self.content, contentHash=note.contentHash)])
+        self.assertEqual(self.sent, [None, None])
+
+    def testEdit(self):
+        Notes().edit("Shopping", content="Buy milk")
+        self.assertEqual(self.sent, [])
+
+        edit = editor.edit
+        editor.edit = lambda content: editor.ENMLtoText(content)
+        try:
+            Notes().edit("Shopping")
+        finally:
+            editor.edit = edit
+        self.assertEqual(self.sent, [])
+
+        # a new title alone doesn't send the content again
+        Notes().edit("Shopping", title="Groceries", content="Buy milk")
+        Notes().edit("Groceries", content="Buy bread")
+        self.assertEqual(self.sent, [None, editor.textToENML("Buy bread")])
+
+
+class testUpdateNoFastbinary(testUpdate):
+    """ the same without fastbinary, where getNote returns a LazyNote """
+
+    def setUp(self):
+        self.fastbinary = geeknote.fastbinary
+        geeknote.fastbinary = None
+        super(testUpdateNoFastbinary, self).setUp()
+
+    def tearDown(self):
+        super(testUpdateNoFastbinary, self).tearDown()
+        geeknote.fastbinary = self.fastbinary
+
+    def testLazyNote(self):
+        self.assertEqual(type(GeekNote().getNote(self.note.guid)).__name__, 'LazyNote')
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(testUpdate))
+    suite.addTest(unittest.makeSuite(testUpdateNoFastbinary))
+    return suite
@@ -1,10 +1,69 @@
-from distutils.core import setup                                                      
-                                                                                      
-DISTNAME='geeknote'                                                                 
-FULLVERSION='0.1'                                                                     
-                                                                                      
-setup(name=DISTNAME,                                                                  
-      version=FULLVERSION,                                                            
-      packages=['geeknote',
-               ]                                                         
-      )   
+import sys
+from distutils.core import setup, Extension
+from distutils.command.build_ext import build_ext
+from distutils.errors import CCompilerError, DistutilsExecError, DistutilsPlatformError
+
+DISTNAME='geeknote'
+FULLVERSION='0.1'
+
+# The fastbinary C module speeds up TBinaryProtocolAccelerated.
+# It is optional: if it can't be compiled geeknote runs in pure Python.
+fastbinary = Extension('geeknote.lib.thrift.protocol.fastbinary',
+                       sources=['geeknote/lib/thrift/protocol/fastbinary.c'])
+
+ext_errors = (CCompilerError, DistutilsExecError, DistutilsPlatformError)
+if sys.platform == 'win32':
+    ext_errors += (IOError,)
+
+class BuildFailed(Exception):
+    pass
+
+class optional_build_ext(build_ext):
+    def run(self):
+        try:
+            build_ext.run(self)
+        except DistutilsPlatformError:
+            raise BuildFailed()
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except ext_errors:
+            raise BuildFailed()
+
+def run_setup(with_binary):
+    extensions = dict(
+        ext_modules=[fastbinary],
+        cmdclass=dict(build_ext=optional_build_ext),
+    ) if with_binary else {}
+
+    setup(name=DISTNAME,
+          version=FULLVERSION,
+          packages=['geeknote',
+                    # geeknote diagnostics times a serialization benchmark
+                    'geeknote.benchmarks',
+                    'geeknote.lib',
+                    'geeknote.lib.thrift',
+                    'geeknote.lib.thrift.protocol',
+                    'geeknote.lib.thrift.transport',
+                    'geeknote.lib.thrift.server',
+                    'geeknote.lib.evernote',
+                    'geeknote.lib.evernote.edam',
+                    'geeknote.lib.evernote.edam.error',
+                    'geeknote.lib.evernote.edam.limits',
+                    'geeknote.lib.evernote.edam.notestore',
+                    'geeknote.lib.evernote.edam.type',
+                    'geeknote.lib.evernote.edam.userstore',
+                   ],
+          **extensions
+          )
+
+try:
+    run_setup(True)
+except BuildFailed:
+    print "*" * 80
+    print "The fastbinary C extension could not be compiled, geeknote will"
+    print "use the pure Python Thrift protocol instead. Run `geeknote diagnostics`"
+    print "to check which path is active."
+    print "*" * 80
+    run_setup(False)